@@ -0,0 +1,625 @@
+"""
+This script is used to run a local stand-in for the parts of the Google Drive v3 and Google Sheets v4 APIs the scripts
+use (files.copy, files.list, files.get, permissions.create, batch requests, and reading and writing worksheet values),
+for benchmarking and testing the copy paths without touching production Drive. Latency, errors, and rate limits can be
+configured.
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+from collections import Counter
+from email.parser import Parser
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# paths served, relative to the server root. Drive paths match the rootUrl and servicePath of the Drive discovery
+# document, and Sheets paths match the URLs gspread requests
+DRIVE_FILE_COPY_PATH = re.compile(r"^/drive/v3/files/([^/]+)/copy$")
+DRIVE_FILE_PATH = re.compile(r"^/drive/v3/files/([^/]+)$")
+DRIVE_PERMISSIONS_PATH = re.compile(r"^/drive/v3/files/([^/]+)/permissions$")
+DRIVE_FILES_PATH = re.compile(r"^/drive/v3/files$")
+DRIVE_BATCH_PATH = re.compile(r"^/batch/drive/v3$")
+SHEETS_VALUES_BATCH_PATH = re.compile(r"^/v4/spreadsheets/([^/]+)/values:batchGet$")
+SHEETS_VALUES_BATCH_UPDATE_PATH = re.compile(r"^/v4/spreadsheets/([^/]+)/values:batchUpdate$")
+SHEETS_VALUES_PATH = re.compile(r"^/v4/spreadsheets/([^/]+)/values/([^/]+)$")
+
+# first cell of an A1 range, e.g. D5 in 'Proj Info'!D5:E6
+A1_CELL = re.compile(r"^([A-Z]+)([0-9]+)")
+
+# parent folder a files.list query is for, e.g. "'<folder id>' in parents and trashed = false"
+PARENTS_QUERY = re.compile(r"'([^']+)' in parents")
+
+# file name a files.list query is for, e.g. "name = 'it\'s a file' and ...", with quotes and backslashes escaped
+NAME_QUERY = re.compile(r"name = '((?:[^'\\]|\\.)*)'")
+ESCAPED_CHARACTER = re.compile(r"\\(.)")
+
+# default and maximum page sizes of files.list
+DEFAULT_LIST_PAGE_SIZE = 100
+MAX_LIST_PAGE_SIZE = 1000
+
+
+class FakeGoogleState:
+    """
+    Files, spreadsheets, and request statistics of a fake server. Latency applies to every API call, and the error
+    rate and rate limit to Drive API calls. A batch request counts as one API call for each request inside it,
+    like Drive quota. Like Drive, each identity (Authorization header) has its own rate limit.
+    """
+
+    def __init__(self, latency=0.0, item_latency=0.0, error_rate=0.0, rate_limit=None, seed=None):
+        """
+        :param latency: float seconds to wait before responding to each HTTP request.
+        :param item_latency: float seconds to wait for each API call, including each request inside a batch request.
+        :param error_rate: float fraction of Drive API calls that fail with a 500 backendError.
+        :param rate_limit: optional float Drive API calls allowed per second for each identity. calls over the
+            limit fail with 429, or with a 403 userRateLimitExceeded inside a batch request.
+        :param seed: optional int seed for error injection, so runs are repeatable.
+        """
+        self.latency = latency
+        self.item_latency = item_latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+
+        # files by id, and the values of each worksheet of each spreadsheet by spreadsheet id
+        self.files = {}
+        self.spreadsheets = {}
+        self.file_ids = itertools.count(1)
+
+        # counts of API calls by method and status
+        self.stats = Counter()
+
+        # token bucket for the rate limit of each identity, as [tokens, time.monotonic() value last updated],
+        # allowing a burst of one second's worth of calls
+        self.token_buckets = {}
+
+        self.lock = threading.Lock()
+
+    def add_file(self, name, parents=(), file_id=None):
+        """
+        Adds a file, such as a template to copy.
+
+        :param name: string name of file.
+        :param parents: list of string ids of folders the file is in.
+        :param file_id: optional string id of file. generated if not given.
+        :return: string id of file.
+        """
+        with self.lock:
+            if file_id is None:
+                file_id = "fake-file-{}".format(next(self.file_ids))
+
+            self.files[file_id] = {
+                "id": file_id,
+                "name": name,
+                "parents": list(parents),
+                "version": "1",
+                "modifiedTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+            }
+
+        return file_id
+
+    def add_spreadsheet(self, name, worksheets, file_id=None):
+        """
+        Adds a spreadsheet, whose values can be read through the Sheets API and metadata through the Drive API.
+
+        :param name: string name of spreadsheet.
+        :param worksheets: dict of worksheet name to list of rows, each a list of string cell values.
+        :param file_id: optional string id of spreadsheet. generated if not given.
+        :return: string id of spreadsheet.
+        """
+        file_id = self.add_file(name, file_id=file_id)
+        with self.lock:
+            self.spreadsheets[file_id] = worksheets
+
+        return file_id
+
+    def list_folder(self, folder_id):
+        """
+        Lists the files in a folder.
+
+        :param folder_id: string id of folder.
+        :return: list of file dicts, in the order they were added.
+        """
+        with self.lock:
+            return [curr_file for curr_file in self.files.values() if folder_id in curr_file["parents"]]
+
+    def take_token(self, identity=None):
+        """
+        Takes a token from an identity's rate limit bucket for an API call.
+
+        :param identity: optional string identity making the call, e.g. its Authorization header.
+        :return: boolean true if the call is within the rate limit.
+        """
+        if self.rate_limit is None:
+            return True
+
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.token_buckets.setdefault(identity, [self.rate_limit, now])
+            bucket[0] = min(self.rate_limit, bucket[0] + (now - bucket[1]) * self.rate_limit)
+            bucket[1] = now
+
+            if bucket[0] < 1:
+                return False
+
+            bucket[0] -= 1
+            return True
+
+    def call(self, method, path, query, body, in_batch=False, identity=None):
+        """
+        Handles a single API call, applying the configured item latency, rate limit, and error rate.
+
+        :param method: string HTTP method.
+        :param path: string path of the call, without the query string.
+        :param query: dict of query parameter to list of values.
+        :param body: string request body, or empty.
+        :param in_batch: boolean true if the call is inside a batch request.
+        :param identity: optional string identity making the call, e.g. its Authorization header.
+        :return: (int status, dict response body, dict extra response headers).
+        """
+        if self.item_latency > 0:
+            time.sleep(self.item_latency)
+
+        # only Drive calls are rate limited and failed, since those are the copy paths being benchmarked
+        if not path.startswith("/drive/"):
+            return self.count(method, path, *self.route(method, path, query, body))
+
+        if not self.take_token(identity):
+            if in_batch:
+                status, response = get_error_response(403, "userRateLimitExceeded", "User rate limit exceeded.")
+            else:
+                status, response = get_error_response(429, "rateLimitExceeded", "Rate limit exceeded.")
+            return self.count(method, path, status, response, {"Retry-After": "1"})
+
+        with self.lock:
+            inject_error = self.error_rate > 0 and self.random.random() < self.error_rate
+        if inject_error:
+            status, response = get_error_response(500, "backendError", "Backend error.")
+            return self.count(method, path, status, response)
+
+        status, response = self.route(method, path, query, body)
+        return self.count(method, path, status, response)
+
+    def count(self, method, path, status, response, headers=None):
+        """
+        Records an API call in the request statistics.
+
+        :param method: string HTTP method.
+        :param path: string path of the call.
+        :param status: int response status.
+        :param response: dict response body.
+        :param headers: optional dict of extra response headers.
+        :return: (int status, dict response body, dict extra response headers).
+        """
+        # collapse ids out of paths, so calls are counted by endpoint
+        endpoint = re.sub(r"/(files|spreadsheets)/[^/]+", r"/\1/{id}", path)
+        with self.lock:
+            self.stats["{} {} {}".format(method, endpoint, status)] += 1
+
+        return status, response, headers or {}
+
+    def route(self, method, path, query, body):
+        """
+        Routes an API call to the fake Drive or Sheets endpoint for its path.
+
+        :param method: string HTTP method.
+        :param path: string path of the call, without the query string.
+        :param query: dict of query parameter to list of values.
+        :param body: string request body, or empty.
+        :return: (int status, dict response body).
+        """
+        copy_match = DRIVE_FILE_COPY_PATH.match(path)
+        if copy_match and method == "POST":
+            return self.copy_file(unquote(copy_match.group(1)), json.loads(body or "{}"))
+
+        if DRIVE_FILES_PATH.match(path) and method == "GET":
+            return self.list_files(query)
+
+        permissions_match = DRIVE_PERMISSIONS_PATH.match(path)
+        if permissions_match and method == "POST":
+            return self.create_permission(unquote(permissions_match.group(1)), query, json.loads(body or "{}"))
+
+        file_match = DRIVE_FILE_PATH.match(path)
+        if file_match and method == "GET":
+            return self.get_file(unquote(file_match.group(1)))
+
+        values_batch_match = SHEETS_VALUES_BATCH_PATH.match(path)
+        if values_batch_match and method == "GET":
+            return self.get_values(unquote(values_batch_match.group(1)), query.get("ranges", []))
+
+        values_batch_update_match = SHEETS_VALUES_BATCH_UPDATE_PATH.match(path)
+        if values_batch_update_match and method == "POST":
+            return self.update_values(unquote(values_batch_update_match.group(1)), json.loads(body or "{}"))
+
+        values_match = SHEETS_VALUES_PATH.match(path)
+        if values_match and method == "GET":
+            status, response = self.get_values(unquote(values_match.group(1)), [unquote(values_match.group(2))])
+            return (status, response["valueRanges"][0]) if status == 200 else (status, response)
+
+        return get_error_response(404, "notFound", "No fake endpoint for {} {}.".format(method, path))
+
+    def copy_file(self, file_id, body):
+        """
+        Fakes files.copy.
+
+        :param file_id: string id of file to copy.
+        :param body: dict request body, with the name and parents of the new file.
+        :return: (int status, dict response body).
+        """
+        with self.lock:
+            original = self.files.get(file_id)
+        if original is None:
+            return get_error_response(404, "notFound", "File not found: {}.".format(file_id))
+
+        new_file_id = self.add_file(body.get("name", "Copy of " + original["name"]), body.get("parents", []))
+        return 200, {"kind": "drive#file", "id": new_file_id, "name": self.files[new_file_id]["name"]}
+
+    def create_permission(self, file_id, query, body):
+        """
+        Fakes permissions.create. Permissions are stored on their file, with whether a notification email was sent.
+
+        :param file_id: string id of file to share.
+        :param query: dict of query parameter to list of values.
+        :param body: dict request body, with the type, role and email address of the permission.
+        :return: (int status, dict response body).
+        """
+        with self.lock:
+            curr_file = self.files.get(file_id)
+            if curr_file is None:
+                return get_error_response(404, "notFound", "File not found: {}.".format(file_id))
+
+            # Drive emails people by default
+            notified = query.get("sendNotificationEmail", ["true"])[0] == "true"
+            permissions = curr_file.setdefault("permissions", [])
+            permission_id = "fake-permission-{}".format(len(permissions) + 1)
+            permissions.append(dict(body, id=permission_id, notified=notified))
+
+        return 200, {"kind": "drive#permission", "id": permission_id}
+
+    def list_files(self, query):
+        """
+        Fakes files.list for queries on the files in a folder, optionally with a given name.
+
+        :param query: dict of query parameter to list of values.
+        :return: (int status, dict response body).
+        """
+        file_query = query.get("q", [""])[0]
+        parents_match = PARENTS_QUERY.search(NAME_QUERY.sub("", file_query))
+        if parents_match is None:
+            return get_error_response(400, "invalid", "Only queries on a parent folder are supported.")
+
+        page_size = min(int(query.get("pageSize", [DEFAULT_LIST_PAGE_SIZE])[0]), MAX_LIST_PAGE_SIZE)
+        page_start = int(query.get("pageToken", ["0"])[0])
+        folder_files = self.list_folder(parents_match.group(1))
+
+        name_match = NAME_QUERY.search(file_query)
+        if name_match is not None:
+            file_name = ESCAPED_CHARACTER.sub(r"\1", name_match.group(1))
+            folder_files = [curr_file for curr_file in folder_files if curr_file["name"] == file_name]
+
+        response = {
+            "kind": "drive#fileList",
+            "files": [{"id": curr_file["id"], "name": curr_file["name"]}
+                      for curr_file in folder_files[page_start:page_start + page_size]]
+        }
+        if page_start + page_size < len(folder_files):
+            response["nextPageToken"] = str(page_start + page_size)
+
+        return 200, response
+
+    def get_file(self, file_id):
+        """
+        Fakes files.get.
+
+        :param file_id: string id of file.
+        :return: (int status, dict response body).
+        """
+        with self.lock:
+            curr_file = self.files.get(file_id)
+        if curr_file is None:
+            return get_error_response(404, "notFound", "File not found: {}.".format(file_id))
+
+        return 200, dict(curr_file, kind="drive#file")
+
+    def get_values(self, spreadsheet_id, ranges):
+        """
+        Fakes spreadsheets.values.batchGet for ranges that are whole worksheets.
+
+        :param spreadsheet_id: string id of spreadsheet.
+        :param ranges: list of string ranges, each a quoted or unquoted worksheet name.
+        :return: (int status, dict response body).
+        """
+        with self.lock:
+            worksheets = self.spreadsheets.get(spreadsheet_id)
+        if worksheets is None:
+            return get_error_response(404, "notFound", "Spreadsheet not found: {}.".format(spreadsheet_id))
+
+        value_ranges = []
+        for curr_range in ranges:
+            sheet_name = curr_range.split("!")[0]
+            if sheet_name.startswith("'") and sheet_name.endswith("'"):
+                sheet_name = sheet_name[1:-1].replace("''", "'")
+
+            if sheet_name not in worksheets:
+                return get_error_response(400, "badRequest", "Unable to parse range: {}".format(curr_range))
+
+            # like the real API, trailing empty cells and rows are left out
+            rows = [list(row) for row in worksheets[sheet_name]]
+            for row in rows:
+                while len(row) > 0 and row[-1] == "":
+                    row.pop()
+            while len(rows) > 0 and len(rows[-1]) == 0:
+                rows.pop()
+
+            value_ranges.append({"range": curr_range, "majorDimension": "ROWS", "values": rows})
+
+        return 200, {"spreadsheetId": spreadsheet_id, "valueRanges": value_ranges}
+
+    def update_values(self, spreadsheet_id, body):
+        """
+        Fakes spreadsheets.values.batchUpdate for ranges that start at a single cell, e.g. 'Proj Info'!D5.
+
+        :param spreadsheet_id: string id of spreadsheet.
+        :param body: dict request body, with the data to write.
+        :return: (int status, dict response body).
+        """
+        with self.lock:
+            worksheets = self.spreadsheets.get(spreadsheet_id)
+            if worksheets is None:
+                return get_error_response(404, "notFound", "Spreadsheet not found: {}.".format(spreadsheet_id))
+
+            responses = []
+            for value_range in body.get("data", []):
+                sheet_name, _, cell = value_range["range"].rpartition("!")
+                if sheet_name.startswith("'") and sheet_name.endswith("'"):
+                    sheet_name = sheet_name[1:-1].replace("''", "'")
+
+                cell_match = A1_CELL.match(cell)
+                if sheet_name not in worksheets or cell_match is None:
+                    return get_error_response(400, "badRequest", "Unable to parse range: {}".format(
+                        value_range["range"]))
+
+                # convert the column letters to a 0-based column index, e.g. A to 0 and AA to 26
+                start_column = 0
+                for letter in cell_match.group(1):
+                    start_column = start_column * 26 + ord(letter) - ord("A") + 1
+                start_column -= 1
+                start_row = int(cell_match.group(2)) - 1
+
+                # write each value, growing the worksheet if needed
+                rows = worksheets[sheet_name]
+                for row_offset, values in enumerate(value_range.get("values", [])):
+                    while len(rows) <= start_row + row_offset:
+                        rows.append([])
+                    row = rows[start_row + row_offset]
+                    for column_offset, value in enumerate(values):
+                        while len(row) <= start_column + column_offset:
+                            row.append("")
+                        row[start_column + column_offset] = str(value)
+
+                responses.append({"spreadsheetId": spreadsheet_id, "updatedRange": value_range["range"],
+                                  "updatedCells": sum(len(values) for values in value_range.get("values", []))})
+
+        return 200, {"spreadsheetId": spreadsheet_id, "totalUpdatedCells": sum(r["updatedCells"] for r in responses),
+                     "responses": responses}
+
+
+def get_error_response(status, reason, message):
+    """
+    Creates an error response in the format Google APIs use.
+
+    :param status: int HTTP status.
+    :param reason: string reason for the error, e.g. notFound.
+    :param message: string description of the error.
+    :return: (int status, dict response body).
+    """
+    return status, {
+        "error": {
+            "code": status,
+            "message": message,
+            "errors": [{"domain": "global", "reason": reason, "message": message}]
+        }
+    }
+
+
+def handle_batch(state, content_type, body, identity=None):
+    """
+    Handles a Drive batch request: a multipart/mixed body with one application/http request in each part.
+
+    :param state: FakeGoogleState of the server.
+    :param content_type: string Content-Type of the batch request, including its boundary.
+    :param body: string body of the batch request.
+    :param identity: optional string identity making the batch request, e.g. its Authorization header.
+    :return: (string Content-Type, string body) of the multipart/mixed batch response.
+    """
+    batch_message = Parser().parsestr("Content-Type: {}\r\n\r\n{}".format(content_type, body))
+    boundary = "batch_fake_google_server"
+
+    response_parts = []
+    for part in batch_message.get_payload():
+        # each part holds an HTTP request: a request line, headers, a blank line, and a body
+        request_text = part.get_payload()
+        request_line, request_rest = request_text.split("\n", 1)
+        method, uri, _ = request_line.strip().split(" ", 2)
+        request_message = Parser().parsestr(request_rest)
+        split_uri = urlsplit(uri)
+
+        status, response, headers = state.call(method, split_uri.path, parse_qs(split_uri.query),
+                                               request_message.get_payload(), in_batch=True, identity=identity)
+
+        # the response to each part is matched to its request by Content-ID
+        response_json = json.dumps(response)
+        response_parts.append(
+            "--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+            "HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=UTF-8\r\n{headers}"
+            "Content-Length: {length}\r\n\r\n{body}\r\n".format(
+                boundary=boundary, content_id=part["Content-ID"][1:-1], status=status,
+                reason="OK" if status == 200 else "Error",
+                headers="".join("{}: {}\r\n".format(key, value) for key, value in headers.items()),
+                length=len(response_json), body=response_json))
+
+    response_parts.append("--{}--\r\n".format(boundary))
+    return "multipart/mixed; boundary={}".format(boundary), "".join(response_parts)
+
+
+class FakeGoogleRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles HTTP requests to a fake server, keeping connections alive like the real APIs.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.handle_api_request()
+
+    def do_POST(self):
+        self.handle_api_request()
+
+    def handle_api_request(self):
+        state = self.server.state
+        content_length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(content_length).decode("utf-8") if content_length > 0 else ""
+
+        if state.latency > 0:
+            time.sleep(state.latency)
+
+        # requests are rate limited by who sent them, like Drive
+        identity = self.headers.get("Authorization")
+
+        split_path = urlsplit(self.path)
+        if DRIVE_BATCH_PATH.match(split_path.path) and self.command == "POST":
+            content_type, response_body = handle_batch(state, self.headers.get("Content-Type"), body, identity)
+            self.send_body(200, content_type, response_body, {})
+            return
+
+        status, response, headers = state.call(self.command, split_path.path, parse_qs(split_path.query), body,
+                                               identity=identity)
+        self.send_body(status, "application/json; charset=UTF-8", json.dumps(response), headers)
+
+    def send_body(self, status, content_type, body, headers):
+        encoded_body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(encoded_body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def log_message(self, format, *args):
+        # requests are counted in the server state instead of logged, since benchmarks send thousands
+        pass
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    """
+    Threading HTTP server that accepts bursts of new connections from high-concurrency clients, instead of
+    refusing them once the default backlog of 5 is full.
+    """
+    request_queue_size = 1024
+
+
+class FakeGoogleServer:
+    """
+    Runs a fake Google Drive and Sheets server on a background thread.
+    """
+
+    def __init__(self, state=None, host="127.0.0.1", port=0):
+        """
+        :param state: optional FakeGoogleState with the server's files, latency, and limits.
+        :param host: string host to listen on.
+        :param port: int port to listen on. 0 picks a free port.
+        """
+        self.state = state if state is not None else FakeGoogleState()
+        self.httpd = FakeHTTPServer((host, port), FakeGoogleRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        :return: string root url of the server, e.g. http://127.0.0.1:8765
+        """
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        """
+        Starts serving requests on a background thread.
+
+        :return: the server, for chaining.
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving requests.
+
+        :return: None
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def get_drive_discovery_document(base_discovery_document, server_url):
+    """
+    Points a Google Drive v3 discovery document at a fake server, so services and batch requests built from it
+    are sent there.
+
+    :param base_discovery_document: dict of the real Google Drive v3 discovery document.
+    :param server_url: string root url of the fake server.
+    :return: dict of the discovery document pointed at the fake server.
+    """
+    discovery_document = dict(base_discovery_document)
+    discovery_document["rootUrl"] = server_url + "/"
+    discovery_document["baseUrl"] = server_url + "/" + discovery_document["servicePath"]
+    discovery_document.pop("mtlsRootUrl", None)
+
+    return discovery_document
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1", help="host to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds to wait before responding to each HTTP request (default: %(default)s)")
+    parser.add_argument("--item-latency", type=float, default=0.0,
+                        help="seconds to wait for each API call, including each call in a batch (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of Drive API calls that fail with a 500 (default: %(default)s)")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Drive API calls allowed per second for each identity")
+    parser.add_argument("--template-id", action="append", default=[],
+                        help="id of a template file that can be copied. can be given more than once")
+    args = parser.parse_args()
+
+    server_state = FakeGoogleState(latency=args.latency, item_latency=args.item_latency,
+                                   error_rate=args.error_rate, rate_limit=args.rate_limit)
+    for template_id in args.template_id:
+        server_state.add_file("Template {}".format(template_id), file_id=template_id)
+
+    server = FakeGoogleServer(server_state, host=args.host, port=args.port)
+    print("Serving fake Google Drive and Sheets APIs at {}".format(server.url))
+
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for curr_stat, count in sorted(server_state.stats.items()):
+            print("{}: {}".format(curr_stat, count))
+        server.httpd.server_close()
@@ -0,0 +1,136 @@
+"""
+This script is used to measure the cold-start cost of each entry point script, using python -X importtime.
+It reports the total import time of each script, its slowest imports, and how long `<script> --help` takes to run.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# root of the repo, where entry point scripts live
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# entry point scripts to measure, by module name
+ENTRY_POINTS = [
+    "studio_db_to_json",
+    "copy_gdrive_file",
+    "create_ipm",
+    "create_sprint_logs",
+    "create_the_weekly",
+    "create_mqc_individual",
+    "create_mqc_proj",
+    "create_research_canvases",
+    "create_eoq_checklist",
+    "create_eoq_assessment",
+    "rollover_quarter",
+    "query_studio_db",
+    "query_archive"
+]
+
+
+def measure_import_time(module_name):
+    """
+    Imports a module in a fresh interpreter with -X importtime, and parses the timing of every import.
+
+    :param module_name: string name of module to import.
+    :return: dict of imported module name to cumulative import time in microseconds.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {}".format(module_name)],
+                               cwd=REPO_ROOT, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    # each line looks like "import time:       self [us] |  cumulative | imported package"
+    import_times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative_us, imported_package = line[len("import time:"):].split("|")
+        import_times[imported_package.strip()] = int(cumulative_us)
+
+    return import_times
+
+
+def measure_help_time(module_name, repeat):
+    """
+    Runs `<script> --help` in a fresh interpreter several times, and keeps the fastest run.
+
+    :param module_name: string name of the entry point script's module.
+    :param repeat: int number of times to run the script.
+    :return: float fastest wall-clock time in milliseconds.
+    """
+    script_path = os.path.join(REPO_ROOT, module_name + ".py")
+    fastest_ms = None
+
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        subprocess.run([sys.executable, script_path, "--help"], cwd=REPO_ROOT, stdout=subprocess.DEVNULL, check=True)
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+        if fastest_ms is None or elapsed_ms < fastest_ms:
+            fastest_ms = elapsed_ms
+
+    return fastest_ms
+
+
+def main(repeat, top_count, max_import_ms, output_path):
+    """
+    Measures and prints the cold-start cost of every entry point.
+
+    :param repeat: int number of times to run each script with --help.
+    :param top_count: int number of slowest imports to print for each script.
+    :param max_import_ms: optional float import time in milliseconds that no entry point may exceed.
+    :param output_path: optional string filepath to write results to as json, for tracking over time.
+    :return: boolean true if every entry point is within max_import_ms.
+    """
+    results = {}
+    within_budget = True
+
+    for module_name in ENTRY_POINTS:
+        import_times = measure_import_time(module_name)
+        import_ms = import_times[module_name] / 1000
+        help_ms = measure_help_time(module_name, repeat)
+
+        # slowest imports other than the entry point itself
+        slowest_imports = sorted(((package, cumulative_us / 1000) for package, cumulative_us in import_times.items()
+                                  if package != module_name), key=lambda item: item[1], reverse=True)[:top_count]
+
+        results[module_name] = {
+            "import_ms": import_ms,
+            "help_ms": help_ms,
+            "slowest_imports": dict(slowest_imports)
+        }
+
+        print("{module}: import {import_ms:.1f} ms, --help {help_ms:.1f} ms".format(module=module_name,
+                                                                                  import_ms=import_ms,
+                                                                                  help_ms=help_ms))
+        for package, cumulative_ms in slowest_imports:
+            print("    {package}: {ms:.1f} ms".format(package=package, ms=cumulative_ms))
+
+        if max_import_ms is not None and import_ms > max_import_ms:
+            print("    exceeds the import budget of {:.1f} ms".format(max_import_ms))
+            within_budget = False
+
+    if output_path is not None:
+        with open(output_path, "w") as output_file:
+            json.dump(results, output_file, indent=4)
+
+    return within_budget
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of times to run each script with --help (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=5,
+                        help="number of slowest imports to print for each script (default: %(default)s)")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="fail if any entry point takes longer than this to import")
+    parser.add_argument("--output", default=None, help="filepath to write results to as json")
+    args = parser.parse_args()
+
+    if not main(args.repeat, args.top, args.max_import_ms, args.output):
+        sys.exit(1)
@@ -0,0 +1,401 @@
+"""
+This script is used to measure the throughput of fetching the Studio Database and of generating each artifact,
+against a local fake Google Drive and Sheets server and synthetic cohorts of students. It reports copies per second
+and the p50/p99 latency of the HTTP requests made, without touching production Drive.
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+import contextlib
+
+# entry point scripts live at the root of the repo
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import helpers.imports as helpers
+import helpers.metrics as metrics
+import helpers.artifacts as artifacts
+import studio_db_to_json as studio_db
+from helpers.async_drive import AsyncDriveEngine
+from helpers.credential_pool import CredentialPool
+from helpers.concurrency import AimdConcurrencyLimiter
+from helpers.sharing import ShareSettings, DEFAULT_SHARE_ROLE
+from copy_gdrive_file import DEFAULT_MAX_WORKERS, COPY_ENGINES, DEFAULT_COPY_ENGINE
+from fake_google_server import FakeGoogleServer, FakeGoogleState, get_drive_discovery_document
+
+# default cohort sizes to benchmark, in number of students
+DEFAULT_COHORTS = [50, 500, 5000]
+
+# shape of a synthetic cohort: students on each project, and projects in each SIG
+STUDENTS_PER_PROJECT = 5
+PROJECTS_PER_SIG = 5
+
+# names of the Studio Database worksheets in the synthetic spreadsheet
+SIG_INFO_SHEET_NAME = "SIG Info"
+PROJ_INFO_SHEET_NAME = "Proj Info"
+
+# quarter name used in generated filenames
+QUARTER_NAME = "F2020"
+
+class LatencyRecorder:
+    """
+    Records the latency of every HTTP request made through it. Thread-safe.
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def reset(self):
+        """
+        Clears recorded latencies.
+
+        :return: list of float latencies in seconds recorded since the last reset.
+        """
+        with self._lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def create_timed_http(recorder):
+    """
+    Creates an httplib2.Http that records the latency of each request it makes.
+
+    :param recorder: LatencyRecorder to record to.
+    :return: httplib2.Http object.
+    """
+    import httplib2
+
+    class TimedHttp(httplib2.Http):
+        def request(self, *args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return super().request(*args, **kwargs)
+            finally:
+                recorder.record(time.perf_counter() - started_at)
+
+    return TimedHttp(timeout=helpers.HTTP_TIMEOUT)
+
+
+def create_fake_gdrive_service_factory(server_url, recorder):
+    """
+    Creates a Google Drive v3 service factory for a fake server.
+
+    :param server_url: string root url of the fake server.
+    :param recorder: LatencyRecorder to record the latency of each request to.
+    :return: function that takes no arguments and returns a new Google Drive v3 service object.
+    """
+    from googleapiclient.discovery import build_from_document
+
+    discovery_document = get_drive_discovery_document(helpers.get_drive_discovery_document(), server_url)
+    return lambda: build_from_document(discovery_document, http=create_timed_http(recorder))
+
+
+def create_fake_async_engine(server_url, recorder):
+    """
+    Creates an async Drive engine for a fake server.
+
+    :param server_url: string root url of the fake server.
+    :param recorder: LatencyRecorder to record the latency of each request to.
+    :return: AsyncDriveEngine.
+    """
+    import aiohttp
+    from google.auth.credentials import AnonymousCredentials
+
+    async def on_request_start(session, context, params):
+        context.started_at = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        recorder.record(time.perf_counter() - context.started_at)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+
+    return AsyncDriveEngine(AnonymousCredentials(), base_url=server_url + "/drive/v3", trace_configs=[trace_config])
+
+
+def create_fake_credential_pool(server_url, recorder, credential_count):
+    """
+    Creates a pool of fake users for a fake server, which rate limits each of them separately.
+
+    :param server_url: string root url of the fake server.
+    :param recorder: LatencyRecorder to record the latency of each request to.
+    :param credential_count: int number of fake users in the pool.
+    :return: CredentialPool.
+    """
+    from google.oauth2.credentials import Credentials
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build_from_document
+
+    discovery_document = get_drive_discovery_document(helpers.get_drive_discovery_document(), server_url)
+    thread_state = threading.local()
+
+    # build each thread's service for each fake user once, like helpers.auth_gdrive
+    def build_service(creds):
+        services = thread_state.__dict__.setdefault("services", {})
+        if id(creds) not in services:
+            services[id(creds)] = build_from_document(
+                discovery_document, http=AuthorizedHttp(creds, http=create_timed_http(recorder)))
+        return services[id(creds)]
+
+    # tokens never expire, and identify each user to the fake server
+    credentials = [Credentials(token="fake-user-{}".format(index + 1)) for index in range(credential_count)]
+    return CredentialPool(credentials, build_service=build_service)
+
+
+def create_fake_gsheets_client(server_url, recorder):
+    """
+    Creates a gspread client that sends requests meant for the Google Sheets API to a fake server.
+
+    :param server_url: string root url of the fake server.
+    :param recorder: LatencyRecorder to record the latency of each request to.
+    :return: gspread authentication object.
+    """
+    import gspread
+    import requests
+    from google.auth.credentials import AnonymousCredentials
+
+    class FakeSheetsSession(requests.Session):
+        def request(self, method, url, *args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return super().request(method, url.replace("https://sheets.googleapis.com", server_url),
+                                       *args, **kwargs)
+            finally:
+                recorder.record(time.perf_counter() - started_at)
+
+    return gspread.Client(AnonymousCredentials(), session=FakeSheetsSession())
+
+
+def create_synthetic_cohort(student_count):
+    """
+    Creates the SIG and Project info worksheets of a synthetic Studio Database.
+
+    :param student_count: int number of students in the cohort.
+    :return: dict of worksheet name to list of rows, each a list of string cell values.
+    """
+    project_count = math.ceil(student_count / STUDENTS_PER_PROJECT)
+    sig_count = math.ceil(project_count / PROJECTS_PER_SIG)
+
+    sig_rows = [["SIG Name", "SIG Abbreviation", "SIG Heads", "Faculty Mentors", "SIG Time",
+                 "SIG Office Hours Time"]]
+    for sig_index in range(sig_count):
+        sig_rows.append(["SIG {}".format(sig_index), "S{}".format(sig_index), "Head{} Person".format(sig_index),
+                         "Mentor{} Person".format(sig_index), "Monday 1pm", "Tuesday 2pm"])
+
+    proj_rows = [["SIG Name", "Students", "Project Name", "Sprint Log Link", "PRC Link", "RRC Link", "Compass Link"]]
+    for project_index in range(project_count):
+        # student first names are unique, since some artifacts are named by first name only
+        student_indices = range(project_index * STUDENTS_PER_PROJECT,
+                                min(student_count, (project_index + 1) * STUDENTS_PER_PROJECT))
+        students = ", ".join("Student{0} Last{0}".format(student_index) for student_index in student_indices)
+        proj_rows.append(["SIG {}".format(project_index // PROJECTS_PER_SIG), students,
+                          "Project {}".format(project_index), "", "", "", ""])
+
+    return {SIG_INFO_SHEET_NAME: sig_rows, PROJ_INFO_SHEET_NAME: proj_rows}
+
+
+def create_synthetic_email_directory(studio_db_dict):
+    """
+    Creates an email directory with an address for every student and SIG head in a studio database.
+
+    :param studio_db_dict: dict of each SIG with all student and project information.
+    :return: dict of name to email address.
+    """
+    names = [name for sig_info in studio_db_dict.values() for name in sig_info["students"] + sig_info["sig_heads"]]
+    return {name: "{}@example.edu".format(name.replace(" ", ".").lower()) for name in names}
+
+
+def summarize_run(name, elapsed_seconds, copy_count, latencies):
+    """
+    Summarizes and prints a single benchmark run.
+
+    :param name: string name of the run.
+    :param elapsed_seconds: float wall-clock seconds the run took.
+    :param copy_count: int number of files copied.
+    :param latencies: list of float seconds each HTTP request took.
+    :return: dict of run results.
+    """
+    sorted_latencies = sorted(latencies)
+    p50_ms = metrics.get_percentile(sorted_latencies, 50)
+    p99_ms = metrics.get_percentile(sorted_latencies, 99)
+    result = {
+        "seconds": elapsed_seconds,
+        "copies": copy_count,
+        "copies_per_second": copy_count / elapsed_seconds if elapsed_seconds > 0 else None,
+        "requests": len(latencies),
+        "p50_ms": p50_ms * 1000 if p50_ms is not None else None,
+        "p99_ms": p99_ms * 1000 if p99_ms is not None else None
+    }
+
+    print("    {name}: {seconds:.2f} s, {copies} copies ({rate}/s), {requests} requests, p50 {p50}, p99 {p99}".format(
+        name=name, seconds=elapsed_seconds, copies=copy_count,
+        rate="{:.1f}".format(result["copies_per_second"]) if copy_count > 0 else "-",
+        requests=len(latencies),
+        p50="{:.1f} ms".format(result["p50_ms"]) if p50_ms is not None else "-",
+        p99="{:.1f} ms".format(result["p99_ms"]) if p99_ms is not None else "-"))
+
+    return result
+
+
+def benchmark_cohort(student_count, artifact_types, max_workers, server_state, engine=DEFAULT_COPY_ENGINE,
+                     credential_count=1, adaptive=False, share=False):
+    """
+    Benchmarks fetching the Studio Database and generating each artifact for a synthetic cohort, on a fresh fake server.
+
+    :param student_count: int number of students in the cohort.
+    :param artifact_types: list of string artifact types to benchmark, keys of helpers.artifacts.ARTIFACT_SPECS.
+    :param max_workers: int maximum number of files to copy concurrently.
+    :param server_state: FakeGoogleState to serve, with the latency and limits to benchmark under.
+    :param engine: string engine to copy files with, "threads" or "async".
+    :param credential_count: int number of fake users to spread copies across. more than one uses a CredentialPool.
+    :param adaptive: boolean true to adjust the number of files copied concurrently, up to max_workers, with an
+        AimdConcurrencyLimiter.
+    :param share: boolean true to share each copied file with its students and SIG heads after copying, as part of
+        each generator's run.
+    :return: dict of run name to run results.
+    """
+    results = {}
+    recorder = LatencyRecorder()
+
+    with FakeGoogleServer(server_state) as server:
+        spreadsheet_id = server_state.add_spreadsheet("Studio Database", create_synthetic_cohort(student_count))
+        spreadsheet_url = "https://docs.google.com/spreadsheets/d/{}/edit".format(spreadsheet_id)
+
+        gc = create_fake_gsheets_client(server.url, recorder)
+        gdrive_service_factory = create_fake_gdrive_service_factory(server.url, recorder)
+        async_engine = create_fake_async_engine(server.url, recorder) if engine == "async" else None
+        credential_pool = create_fake_credential_pool(server.url, recorder, credential_count) \
+            if credential_count > 1 else None
+
+        # fetch, parse and index the Studio Database
+        started_at = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            studio_db_dict = studio_db.main(spreadsheet_url, SIG_INFO_SHEET_NAME, PROJ_INFO_SHEET_NAME, gc=gc)
+            loaded_studio_db = studio_db.LoadedStudioDb(studio_db_dict, studio_db.StudioDbIndex(studio_db_dict))
+        results["studio_db"] = summarize_run("studio_db", time.perf_counter() - started_at, 0, recorder.reset())
+
+        share_settings = ShareSettings(create_synthetic_email_directory(studio_db_dict), DEFAULT_SHARE_ROLE, False) \
+            if share else None
+
+        # copy each artifact into an empty folder, so no files are skipped as already existing
+        for artifact_type in artifact_types:
+            template_id = server_state.add_file("{} template".format(artifact_type))
+            template_url = "https://docs.google.com/spreadsheets/d/{}/edit".format(template_id)
+            folder_url = "https://drive.google.com/drive/folders/{}-{}".format(artifact_type, student_count)
+
+            # each generator adapts from scratch, like a separate run
+            concurrency_limiter = AimdConcurrencyLimiter(max_workers) if adaptive else None
+
+            run_context = artifacts.RunContext(gdrive_service_factory, max_workers=max_workers,
+                                               async_engine=async_engine, credential_pool=credential_pool,
+                                               concurrency_limiter=concurrency_limiter, share_settings=share_settings)
+
+            # IPMs are generated from a list of student names, like create_ipm.py, instead of the Studio Database
+            artifact_studio_db = artifacts.load_studio_db_from_students(
+                [student for sig_info in studio_db_dict.values() for student in sig_info["students"]]) \
+                if artifact_type == "ipm" else loaded_studio_db
+
+            started_at = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                copy_results = artifacts.generate_artifacts(run_context, artifact_studio_db,
+                                                            [(artifact_type, template_url, folder_url)], QUARTER_NAME)
+            elapsed_seconds = time.perf_counter() - started_at
+
+            copy_count = len([result for result in copy_results
+                              if result.source == "copy" and result.file_id is not None])
+            results[artifact_type] = summarize_run(artifact_type, elapsed_seconds, copy_count, recorder.reset())
+            if credential_pool is not None:
+                print("        {}".format(credential_pool.summary()))
+            if concurrency_limiter is not None:
+                print("        {}".format(concurrency_limiter.summary()))
+            if share_settings is not None:
+                copied_file_ids = {result.file_id for result in copy_results if result.file_id is not None}
+                permission_count = sum(len(server_state.files[file_id].get("permissions", []))
+                                       for file_id in copied_file_ids)
+                print("        shared {files} files with {permissions} permissions".format(
+                    files=len(copied_file_ids), permissions=permission_count))
+
+    return results
+
+
+def main(cohorts, artifact_types, max_workers, latency, item_latency, error_rate, rate_limit, output_path,
+         engine=DEFAULT_COPY_ENGINE, credential_count=1, adaptive=False, share=False):
+    """
+    Benchmarks every cohort size and prints the results.
+
+    :param cohorts: list of int cohort sizes, in number of students.
+    :param artifact_types: list of string artifact types to benchmark, keys of helpers.artifacts.ARTIFACT_SPECS.
+    :param max_workers: int maximum number of files to copy concurrently.
+    :param latency: float seconds the fake server waits before responding to each HTTP request.
+    :param item_latency: float seconds the fake server takes for each API call, including calls inside batches.
+    :param error_rate: float fraction of Drive API calls the fake server fails with a 500.
+    :param rate_limit: optional float Drive API calls per second the fake server allows each user.
+    :param output_path: optional string filepath to write results to as json, for tracking over time.
+    :param engine: string engine to copy files with, "threads" or "async".
+    :param credential_count: int number of fake users to spread copies across.
+    :param adaptive: boolean true to adjust the number of files copied concurrently, up to max_workers.
+    :param share: boolean true to share each copied file with its students and SIG heads after copying.
+    :return: dict of cohort size to run results.
+    """
+    results = {}
+    for student_count in cohorts:
+        print("{} students:".format(student_count))
+        server_state = FakeGoogleState(latency=latency, item_latency=item_latency, error_rate=error_rate,
+                                       rate_limit=rate_limit, seed=student_count)
+        results[student_count] = benchmark_cohort(student_count, artifact_types, max_workers, server_state, engine,
+                                                  credential_count, adaptive, share)
+
+    if output_path is not None:
+        with open(output_path, "w") as output_file:
+            json.dump(results, output_file, indent=4)
+
+    return results
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cohorts", type=int, nargs="+", default=DEFAULT_COHORTS,
+                        help="cohort sizes to benchmark, in number of students (default: %(default)s)")
+    parser.add_argument("--artifacts", nargs="+", choices=sorted(artifacts.ARTIFACT_SPECS),
+                        default=list(artifacts.ARTIFACT_SPECS),
+                        help="artifact types to benchmark (default: all)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="maximum number of files to copy concurrently (default: %(default)s)")
+    parser.add_argument("--engine", choices=COPY_ENGINES, default=DEFAULT_COPY_ENGINE,
+                        help="engine to copy files with (default: %(default)s)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="adjust the number of files copied concurrently, up to --workers")
+    parser.add_argument("--share", action="store_true",
+                        help="share each copied file with its students and SIG heads after copying, as part of each "
+                             "generator's run")
+    parser.add_argument("--credentials", type=int, default=1,
+                        help="number of fake users to spread copies across, each rate limited separately "
+                             "(default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the fake server waits before each HTTP response (default: %(default)s)")
+    parser.add_argument("--item-latency", type=float, default=0.0,
+                        help="seconds the fake server takes for each API call, including calls in a batch "
+                             "(default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of Drive API calls the fake server fails with a 500 (default: %(default)s)")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Drive API calls per second the fake server allows each user")
+    parser.add_argument("--output", default=None, help="filepath to write results to as json")
+    args = parser.parse_args()
+
+    main(args.cohorts, args.artifacts, args.workers, args.latency, args.item_latency, args.error_rate,
+         args.rate_limit, args.output, engine=args.engine, credential_count=args.credentials,
+         adaptive=args.adaptive, share=args.share)
@@ -1,37 +1,316 @@
 """
 This script is used to copy a specified template file to a specified destination folder in Google Drive.
 """
-import sys
+import math
+import argparse
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 import helpers.imports as helpers
-from apiclient import errors
+import helpers.metrics as metrics
+import helpers.rate_limit as rate_limit
+from helpers.retry import RetryPolicy, RETRYABLE_EXCEPTIONS
+
+# maximum number of calls Google Drive accepts in a single batch request
+MAX_BATCH_SIZE = 100
+
+# default number of worker threads used to run copy jobs concurrently
+DEFAULT_MAX_WORKERS = 8
+
+# ways copy jobs can be run: on a pool of worker threads with batch requests, or with asyncio on a single thread
+COPY_ENGINES = ["threads", "async"]
+DEFAULT_COPY_ENGINE = "threads"
+
+# a single file to copy: id of the file to copy, id of the folder to copy it to, and name for the new file
+CopyJob = namedtuple("CopyJob", ["file_id", "folder_id", "file_name"])
+
+# maximum page size Google Drive allows for files.list
+MAX_LIST_PAGE_SIZE = 1000
+
+# only fetch the fields of copied files that are used, to keep responses small
+COPY_FIELDS = "id, name"
 
+# outcome of a copy job: the job, id of the copied file (None if failed), error (None if successful), and where the
+# file id came from: "copy" for a new copy, "journal" for a copy from a previous run, "folder" for an existing file
+CopyResult = namedtuple("CopyResult", ["job", "file_id", "error", "source"], defaults=["copy"])
 
-def copy_file_request(service, origin_file_id, file_parent_id, file_name):
+
+def copy_file_request(service, origin_file_id, file_parent_id, file_name, retry_policy=None):
     """
     Creates and executes a request to copy a file to a specified directory.
+    Requests that fail due to rate limits or server errors are retried according to retry_policy.
 
     :param service: Google Drive v3 authentication object.
     :param origin_file_id: string id of original file to copy.
     :param file_parent_id: string id of folder to copy file to.
     :param file_name: string name for newly copied file.
+    :param retry_policy: optional RetryPolicy to retry failed requests with. a default policy is used if not given.
     :return: copied file, if successful. none otherwise.
     """
+    from googleapiclient import errors
+
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
     # setup request body
     copy_request_body = {
         'name': file_name,
         'parents': [file_parent_id]
     }
 
-    # attempt to copy file
+    # attempt to copy file. a copy that failed with a network error may still have been made, so the folder is
+    # checked for it before it is sent again
     try:
-        return service.files().copy(fileId=origin_file_id, body=copy_request_body).execute()
-    except errors.HttpError as error:
+        copy_request = service.files().copy(fileId=origin_file_id, body=copy_request_body, fields=COPY_FIELDS)
+        return retry_policy.call(copy_request.execute, "drive.files.copy",
+                                 find_result=lambda: find_folder_file_request(service, file_parent_id, file_name))
+    except (errors.HttpError,) + RETRYABLE_EXCEPTIONS as error:
         print('An error occurred: {}'.format(error))
 
     # return none if file copy failed
     return None
 
 
+def get_file_name_query(folder_id, file_name):
+    """
+    Creates a Google Drive files.list query for the files in a folder with a given name.
+
+    :param folder_id: string id of folder to search.
+    :param file_name: string name of file to search for.
+    :return: string query.
+    """
+    # quotes and backslashes in names must be escaped in queries
+    escaped_name = file_name.replace("\\", "\\\\").replace("'", "\\'")
+    return "name = '{}' and '{}' in parents and trashed = false".format(escaped_name, folder_id)
+
+
+def find_folder_file_request(service, folder_id, file_name):
+    """
+    Creates and executes a single request to find a file in a folder by name. It is not retried, so it can be
+    used to check whether a failed request took effect before the request is retried.
+
+    :param service: Google Drive v3 authentication object.
+    :param folder_id: string id of folder to search.
+    :param file_name: string name of file to find.
+    :return: dict of the id and name of the first file found. none if there is no such file.
+    """
+    list_request = service.files().list(q=get_file_name_query(folder_id, file_name),
+                                        fields="files({})".format(COPY_FIELDS), pageSize=1)
+
+    rate_limit.acquire("drive.files.list")
+    with metrics.timed("drive.files.list"):
+        found_files = list_request.execute().get("files", [])
+
+    return found_files[0] if len(found_files) > 0 else None
+
+
+def execute_batch_calls(service, create_call, call_count, method_name, batch_size=MAX_BATCH_SIZE, retry_policy=None,
+                        credential_pool=None, concurrency_limiter=None, find_completed_calls=None):
+    """
+    Creates and executes batch requests to make a number of calls to the same Google Drive API method.
+    Calls are grouped into Google Drive batch requests of up to batch_size calls each. Calls that fail due to rate
+    limits, server errors, or dropped connections are retried together in a later batch, according to retry_policy.
+
+    :param service: Google Drive v3 authentication object.
+    :param create_call: function that takes a Google Drive v3 authentication object and the position of a call, and
+        returns the request for it, e.g. service.files().copy(...).
+    :param call_count: int number of calls to make.
+    :param method_name: string name of the API method called, e.g. "drive.files.copy", to rate limit, retry and
+        record calls by.
+    :param batch_size: int maximum number of calls to send in a single batch request.
+    :param retry_policy: optional RetryPolicy to retry failed calls with. a default policy is used if not given.
+    :param credential_pool: optional CredentialPool to send each batch request with the least loaded credential of,
+        instead of service.
+    :param concurrency_limiter: optional AimdConcurrencyLimiter to wait for before sending each batch request.
+    :param find_completed_calls: optional function that takes a list of positions of calls that failed with a network
+        error, and returns a dict of position to response for those that took effect anyway, for calls that are not
+        safe to repeat, e.g. copies. the rest are retried. if it fails, none of them are retried.
+    :return: tuple of (dict of position to response, dict of position to error) for each call.
+    """
+    from googleapiclient import errors
+
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
+    responses = {}
+    call_errors = {}
+
+    # errors from the current attempt, by position
+    attempt_errors = {}
+
+    # batch calls are identified by their position
+    def handle_response(request_id, response, exception):
+        if exception is not None:
+            attempt_errors[int(request_id)] = exception
+            metrics.record_call(method_name, metrics.get_status_label(exception))
+        else:
+            responses[int(request_id)] = response
+            metrics.record_call(method_name, 200)
+
+    started_at = time.monotonic()
+    attempt = 0
+    pending_indices = list(range(call_count))
+
+    while len(pending_indices) > 0:
+        attempt += 1
+        attempt_errors.clear()
+
+        # split pending calls into chunks that fit in a single batch request
+        for batch_start in range(0, len(pending_indices), batch_size):
+            batch_indices = pending_indices[batch_start:batch_start + batch_size]
+
+            # each call in the batch counts against the rate limit, and the batch against the concurrency limit
+            retry_policy.record("attempts", len(batch_indices))
+            rate_limit.acquire(method_name, len(batch_indices))
+            limiter_started_at = concurrency_limiter.acquire() if concurrency_limiter is not None else None
+            credential_index = None
+
+            # attempt the calls; if the batch request itself fails, or the connection drops or times out, every
+            # call in it failed
+            try:
+                # send each batch with the least loaded credential in the pool, so retries move off throttled ones.
+                # it is chosen after waiting on the limits above, so the wait isn't counted as load on it
+                if credential_pool is not None:
+                    credential_index = credential_pool.acquire(len(batch_indices))
+                batch_service = credential_pool.get_service(credential_index) if credential_pool is not None \
+                    else service
+                batch = batch_service.new_batch_http_request(callback=handle_response)
+
+                for index in batch_indices:
+                    batch.add(create_call(batch_service, index), request_id=str(index))
+
+                with metrics.timed("drive.batch"):
+                    batch.execute()
+            except (errors.HttpError,) + RETRYABLE_EXCEPTIONS as error:
+                for index in batch_indices:
+                    attempt_errors[index] = error
+            finally:
+                batch_errors = [attempt_errors.get(index) for index in batch_indices]
+                if credential_index is not None:
+                    credential_pool.release(credential_index, batch_errors)
+                if concurrency_limiter is not None:
+                    concurrency_limiter.release(limiter_started_at, batch_errors)
+
+        # the server may have made calls whose responses were lost with the connection, so look for them before
+        # they are sent again
+        network_failed_indices = [index for index, error in sorted(attempt_errors.items())
+                                  if isinstance(error, RETRYABLE_EXCEPTIONS)]
+        unchecked_indices = set()
+        if find_completed_calls is not None and len(network_failed_indices) > 0:
+            try:
+                for index, response in find_completed_calls(network_failed_indices).items():
+                    responses[index] = response
+                    del attempt_errors[index]
+            except (errors.HttpError,) + RETRYABLE_EXCEPTIONS as error:
+                # without knowing which calls were made, sending any of them again could repeat it
+                unchecked_indices.update(network_failed_indices)
+                print("Could not check which calls to {} were made before the connection failed, so {} of them "
+                      "will not be retried: {}".format(method_name, len(network_failed_indices), error))
+
+        retry_policy.record("succeeded", len(pending_indices) - len(attempt_errors))
+
+        # wait long enough to satisfy the slowest Retry-After, then retry everything that can be retried
+        delay = max([retry_policy.get_delay(attempt, error) for error in attempt_errors.values()], default=0.0)
+        pending_indices = []
+        for index, error in sorted(attempt_errors.items()):
+            if index not in unchecked_indices and retry_policy.should_retry(error, attempt, started_at, delay,
+                                                                            method_name):
+                pending_indices.append(index)
+            else:
+                call_errors[index] = error
+
+        if len(pending_indices) > 0:
+            time.sleep(delay)
+
+    return responses, call_errors
+
+
+def copy_files_request(service, origin_file_id, file_parent_id, file_names, batch_size=MAX_BATCH_SIZE,
+                       retry_policy=None, credential_pool=None, concurrency_limiter=None):
+    """
+    Creates and executes batch requests to copy a file to a specified directory once for each file name.
+    Copies are sent and retried with execute_batch_calls. Before copies that failed with a network error are sent
+    again, the folder is listed, and those that were made anyway are not.
+
+    :param service: Google Drive v3 authentication object.
+    :param origin_file_id: string id of original file to copy.
+    :param file_parent_id: string id of folder to copy files to.
+    :param file_names: list of string names for newly copied files.
+    :param batch_size: int maximum number of copy requests to send in a single batch request.
+    :param retry_policy: optional RetryPolicy to retry failed requests with. a default policy is used if not given.
+    :param credential_pool: optional CredentialPool to send each batch request with the least loaded credential of,
+        instead of service.
+    :param concurrency_limiter: optional AimdConcurrencyLimiter to wait for before sending each batch request.
+    :return: tuple of (dict of file name to copied file, dict of file name to error) for each requested file name.
+    """
+    def create_copy_call(batch_service, index):
+        copy_request_body = {
+            'name': file_names[index],
+            'parents': [file_parent_id]
+        }
+        return batch_service.files().copy(fileId=origin_file_id, body=copy_request_body, fields=COPY_FIELDS)
+
+    # copies that failed with a network error may still have been made, so the folder is listed for them before
+    # they are sent again
+    def find_created_copies(indices):
+        folder_index = list_folder_files_request(service, file_parent_id, retry_policy)
+        return {index: {"id": folder_index[file_names[index]], "name": file_names[index]}
+                for index in indices if file_names[index] in folder_index}
+
+    copied_files, copy_errors = execute_batch_calls(service, create_copy_call, len(file_names), "drive.files.copy",
+                                                    batch_size=batch_size, retry_policy=retry_policy,
+                                                    credential_pool=credential_pool,
+                                                    concurrency_limiter=concurrency_limiter,
+                                                    find_completed_calls=find_created_copies)
+
+    return ({file_names[index]: copied_file for index, copied_file in copied_files.items()},
+            {file_names[index]: error for index, error in copy_errors.items()})
+
+
+def list_folder_files_request(service, folder_id, retry_policy=None):
+    """
+    Creates and executes paginated requests to list every file in a folder, and indexes them by name.
+    Trashed files are excluded, and only the id and name of each file are fetched.
+
+    :param service: Google Drive v3 authentication object.
+    :param folder_id: string id of folder to list.
+    :param retry_policy: optional RetryPolicy to retry failed requests with. a default policy is used if not given.
+    :return: dict of file name to file id for every file in the folder.
+    """
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
+    folder_index = {}
+    duplicate_names = set()
+    page_token = None
+
+    while True:
+        list_request = service.files().list(q="'{}' in parents and trashed = false".format(folder_id),
+                                            fields="nextPageToken, files(id, name)",
+                                            pageSize=MAX_LIST_PAGE_SIZE,
+                                            pageToken=page_token)
+        response = retry_policy.call(list_request.execute, "drive.files.list")
+
+        # keep the first file seen with each name, and track names used by more than one file
+        for curr_file in response.get("files", []):
+            if curr_file["name"] in folder_index:
+                duplicate_names.add(curr_file["name"])
+            else:
+                folder_index[curr_file["name"]] = curr_file["id"]
+
+        page_token = response.get("nextPageToken")
+        if page_token is None:
+            break
+
+    if len(duplicate_names) > 0:
+        print("The following file names are used by more than one file in folder {}: {}"
+              .format(folder_id, sorted(duplicate_names)))
+
+    return folder_index
+
+
 def copy_file(service, file_url, folder_url, file_name):
     """
     Copies a file to a specified direction given a file and folder url.
@@ -49,6 +328,173 @@ def copy_file(service, file_url, folder_url, file_name):
     return copy_file_request(service, file_id, folder_id, file_name)
 
 
+def copy_files(service, file_url, folder_url, file_names):
+    """
+    Copies a file to a specified directory once for each file name given a file and folder url, using batch requests.
+
+    :param service: Google Drive v3 authentication object.
+    :param file_url: string url of original file to copy.
+    :param folder_url: string url of folder to copy files to.
+    :param file_names: list of string names for newly copied files.
+    :return: dict of file name to copied file id for each successful copy.
+    """
+    # parse out file and folder ids for specified URLs
+    file_id = helpers.get_file_id_from_url(file_url)
+    folder_id = helpers.get_folder_id_from_url(folder_url)
+
+    copied_files, copy_errors = copy_files_request(service, file_id, folder_id, file_names)
+
+    # report any files that could not be copied
+    for file_name, error in copy_errors.items():
+        print('An error occurred copying {}: {}'.format(file_name, error))
+
+    return {file_name: copied_file["id"] for file_name, copied_file in copied_files.items()}
+
+
+def chunk_copy_jobs(jobs, job_indices, max_workers=DEFAULT_MAX_WORKERS, batch_size=MAX_BATCH_SIZE):
+    """
+    Splits copy jobs into the chunks run_copy_jobs sends as batch requests. Jobs are grouped by the file and folder
+    they copy between, and each group is split into chunks that fit in a batch request and spread evenly over the
+    workers.
+
+    :param jobs: list of CopyJob.
+    :param job_indices: list of int indices of the jobs to split.
+    :param max_workers: int maximum number of worker threads.
+    :param batch_size: int maximum number of copy requests to send in a single batch request.
+    :return: list of chunks, each a list of int job indices.
+    """
+    # group jobs by the file and folder they copy between, keeping job order within each group
+    job_groups = {}
+    for index in job_indices:
+        job_groups.setdefault((jobs[index].file_id, jobs[index].folder_id), []).append(index)
+
+    # split each group into chunks that fit in a batch request and spread evenly over the workers
+    chunks = []
+    for group_indices in job_groups.values():
+        chunk_size = max(1, min(batch_size, math.ceil(len(group_indices) / max_workers)))
+        chunks.extend(group_indices[start:start + chunk_size] for start in range(0, len(group_indices), chunk_size))
+
+    return chunks
+
+
+def run_copy_jobs(jobs, service_factory, max_workers=DEFAULT_MAX_WORKERS, batch_size=MAX_BATCH_SIZE,
+                  retry_policy=None, journal=None, skip_existing=False, async_engine=None, credential_pool=None,
+                  concurrency_limiter=None):
+    """
+    Runs a list of copy jobs on a pool of worker threads, using batch requests within each worker.
+    Jobs that share a file and folder are split into chunks, so work is spread across all workers.
+    If a journal is given, jobs it has already recorded are skipped without any Drive requests, and
+    every new copy is recorded as soon as its chunk finishes.
+    If skip_existing is set, each destination folder is listed once and jobs whose file name already exists
+    in their folder are skipped.
+
+    :param jobs: list of CopyJob to run.
+    :param service_factory: function that returns a new Google Drive v3 service object. called once per worker.
+    :param max_workers: int maximum number of worker threads.
+    :param batch_size: int maximum number of copy requests to send in a single batch request.
+    :param retry_policy: optional RetryPolicy shared by all workers. a default policy is used if not given.
+    :param journal: optional CopyJournal of completed copies to resume from and record to.
+    :param skip_existing: boolean true to skip jobs whose file name already exists in the destination folder.
+    :param async_engine: optional AsyncDriveEngine to run the jobs with on this thread, with up to max_workers
+        requests in flight, instead of on worker threads.
+    :param credential_pool: optional CredentialPool to spread copy requests across.
+    :param concurrency_limiter: optional AimdConcurrencyLimiter to adjust the number of copy requests in flight with,
+        up to max_workers.
+    :return: list of CopyResult, in the same order as jobs.
+    """
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
+    # fill in results for jobs completed in a previous run, and only run the rest
+    results = [None] * len(jobs)
+    completed_file_ids = journal.get_completed(jobs) if journal is not None else {}
+    pending_indices = []
+    for index, job in enumerate(jobs):
+        if job in completed_file_ids:
+            results[index] = CopyResult(job, completed_file_ids[job], None, "journal")
+        else:
+            pending_indices.append(index)
+
+    # the async engine lists folders and copies files itself, with single requests instead of batches
+    if async_engine is not None:
+        engine_results = async_engine.run_copy_jobs([jobs[index] for index in pending_indices],
+                                                    max_concurrency=max_workers, retry_policy=retry_policy,
+                                                    journal=journal, skip_existing=skip_existing,
+                                                    credential_pool=credential_pool,
+                                                    concurrency_limiter=concurrency_limiter)
+        for index, result in zip(pending_indices, engine_results):
+            results[index] = result
+
+        return results
+
+    # list each destination folder once, and fill in results for files that already exist
+    if skip_existing and len(pending_indices) > 0:
+        list_service = service_factory()
+        folder_indexes = {folder_id: list_folder_files_request(list_service, folder_id, retry_policy)
+                          for folder_id in {jobs[index].folder_id for index in pending_indices}}
+
+        remaining_indices = []
+        for index in pending_indices:
+            existing_file_id = folder_indexes[jobs[index].folder_id].get(jobs[index].file_name)
+            if existing_file_id is not None:
+                results[index] = CopyResult(jobs[index], existing_file_id, None, "folder")
+            else:
+                remaining_indices.append(index)
+        pending_indices = remaining_indices
+
+    # each worker thread builds and reuses its own service, since service objects are not thread-safe
+    thread_state = threading.local()
+
+    def run_chunk(job_indices):
+        if not hasattr(thread_state, "service"):
+            thread_state.service = service_factory()
+
+        first_job = jobs[job_indices[0]]
+        file_names = [jobs[index].file_name for index in job_indices]
+        copied_files, copy_errors = copy_files_request(thread_state.service, first_job.file_id,
+                                                       first_job.folder_id, file_names, batch_size, retry_policy,
+                                                       credential_pool, concurrency_limiter)
+
+        chunk_results = []
+        for index in job_indices:
+            curr_copied_file = copied_files.get(jobs[index].file_name)
+            curr_file_id = curr_copied_file["id"] if curr_copied_file is not None else None
+            chunk_results.append(CopyResult(jobs[index], curr_file_id, copy_errors.get(jobs[index].file_name)))
+
+        # record successful copies right away, so they are skipped if the run is interrupted and resumed
+        if journal is not None:
+            journal.record([(result.job, result.file_id) for result in chunk_results if result.file_id is not None])
+
+        return chunk_results
+
+    chunks = chunk_copy_jobs(jobs, pending_indices, max_workers, batch_size)
+
+    # run chunks concurrently, then put results back in job order
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for job_indices, chunk_results in zip(chunks, executor.map(run_chunk, chunks)):
+            for index, result in zip(job_indices, chunk_results):
+                results[index] = result
+
+    return results
+
+
+def report_copy_results(copy_results, retry_policy):
+    """
+    Prints any files that could not be copied or already existed, and a summary of the Drive requests made.
+
+    :param copy_results: list of CopyResult from run_copy_jobs.
+    :param retry_policy: RetryPolicy the copy jobs were run with.
+    :return: None
+    """
+    for result in copy_results:
+        if result.error is not None:
+            print('An error occurred copying {}: {}'.format(result.job.file_name, result.error))
+        elif result.source == "folder":
+            print('{} already exists in the destination folder, so it was not copied'.format(result.job.file_name))
+
+    print('Drive requests: {}'.format(retry_policy.summary()))
+
+
 def main(file_url, folder_url, file_name):
     """
     Generates auth token and copies file.
@@ -66,18 +512,23 @@ def main(file_url, folder_url, file_name):
 
 
 if __name__ == '__main__':
-    # get command line args
-    arg_count = len(sys.argv) - 1
+    # parse command line args
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("file_url", help="url of original file to copy")
+    parser.add_argument("folder_url", help="url of folder to copy file to")
+    parser.add_argument("file_name", help="name for newly copied file")
+    parser.add_argument("--rate-limiter", default=rate_limit.DEFAULT_RATE_LIMIT_PATH,
+                        help="filepath of the token buckets Drive calls are rate limited by, shared with other "
+                             "scripts. an empty string disables rate limiting (default: %(default)s)")
+    args = parser.parse_args()
 
-    # check for correct number of arguments
-    if arg_count != 3:
-        raise Exception("Invalid number of arguments. Expected 3 (file URL, folder URL, file name) got {}."
-                        .format(arg_count))
+    # share the Drive quota with other scripts running in this directory
+    rate_limit.configure(args.rate_limiter)
 
     # parse each argument
-    input_file_url = sys.argv[1]
-    input_folder_url = sys.argv[2]
-    input_file_name = sys.argv[3]
+    input_file_url = args.file_url
+    input_folder_url = args.folder_url
+    input_file_name = args.file_name
 
     # copy file to destination
     main(input_file_url, input_folder_url, input_file_name)
@@ -0,0 +1,212 @@
+"""
+This module includes a local SQLite archive of every Studio Database snapshot and every generated file, across
+quarters, so historical questions (e.g. every Sprint Log a project has had) can be answered without searching Drive.
+"""
+
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from collections import namedtuple
+
+# default location of the archive, relative to the directory scripts are run from
+DEFAULT_ARCHIVE_PATH = "studio_archive.db"
+
+# a generated file to archive: its artifact type, scope, the SIG and student or project it is for, and the file
+ArchivedFile = namedtuple("ArchivedFile", ["artifact_type", "scope", "sig_name", "subject", "file_name", "file_id",
+                                           "url"])
+
+
+class StudioArchive:
+    """
+    Records every Studio Database a run was generated from, and every file it generated. Names are compared without
+    case, and students, projects, SIGs, and quarters are indexed. Safe to share between worker threads.
+    """
+
+    def __init__(self, archive_path=DEFAULT_ARCHIVE_PATH):
+        """
+        :param archive_path: string filepath of the SQLite archive. created if it does not exist.
+        """
+        self.archive_path = archive_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(archive_path, check_same_thread=False)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                quarter TEXT COLLATE NOCASE,
+                fetched_at TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                studio_db TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS snapshots_by_quarter ON snapshots (quarter, content_hash);
+
+            CREATE TABLE IF NOT EXISTS members (
+                snapshot_id INTEGER NOT NULL REFERENCES snapshots (snapshot_id),
+                quarter TEXT COLLATE NOCASE,
+                sig_name TEXT NOT NULL COLLATE NOCASE,
+                abbreviation TEXT NOT NULL COLLATE NOCASE,
+                project_name TEXT COLLATE NOCASE,
+                student TEXT COLLATE NOCASE
+            );
+            CREATE INDEX IF NOT EXISTS members_by_student ON members (student);
+            CREATE INDEX IF NOT EXISTS members_by_project ON members (project_name);
+            CREATE INDEX IF NOT EXISTS members_by_sig ON members (sig_name);
+            CREATE INDEX IF NOT EXISTS members_by_quarter ON members (quarter);
+
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                quarter TEXT COLLATE NOCASE,
+                snapshot_id INTEGER NOT NULL REFERENCES snapshots (snapshot_id),
+                started_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS files (
+                file_id TEXT PRIMARY KEY,
+                run_id INTEGER NOT NULL REFERENCES runs (run_id),
+                quarter TEXT COLLATE NOCASE,
+                artifact_type TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                sig_name TEXT NOT NULL COLLATE NOCASE,
+                subject TEXT NOT NULL COLLATE NOCASE,
+                file_name TEXT NOT NULL,
+                url TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_by_subject ON files (subject);
+            CREATE INDEX IF NOT EXISTS files_by_sig ON files (sig_name);
+            CREATE INDEX IF NOT EXISTS files_by_quarter ON files (quarter);
+            CREATE INDEX IF NOT EXISTS files_by_type ON files (artifact_type);
+        """)
+        self._connection.commit()
+
+    def _record_snapshot(self, quarter, studio_db_dict, fetched_at):
+        """
+        Records a Studio Database snapshot, unless the latest snapshot of the quarter is identical.
+        Must be called with the lock held.
+
+        :param quarter: optional string name of quarter.
+        :param studio_db_dict: dict of each SIG with all student and project information.
+        :param fetched_at: string ISO time the snapshot was fetched.
+        :return: int id of the new or identical snapshot.
+        """
+        studio_db_json = json.dumps(studio_db_dict, sort_keys=True)
+        content_hash = hashlib.sha256(studio_db_json.encode("utf-8")).hexdigest()
+
+        latest_snapshot = self._connection.execute(
+            "SELECT snapshot_id, content_hash FROM snapshots WHERE quarter IS ? ORDER BY snapshot_id DESC LIMIT 1",
+            (quarter,)).fetchone()
+        if latest_snapshot is not None and latest_snapshot[1] == content_hash:
+            return latest_snapshot[0]
+
+        snapshot_id = self._connection.execute(
+            "INSERT INTO snapshots (quarter, fetched_at, content_hash, studio_db) VALUES (?, ?, ?, ?)",
+            (quarter, fetched_at, content_hash, studio_db_json)).lastrowid
+
+        # one row for each student on each project. students not on a project, and projects without students,
+        # get a row with no project or no student
+        member_rows = []
+        for sig_name, sig_info in studio_db_dict.items():
+            project_students = set()
+            for proj in sig_info["projects"]:
+                students = [student for student in proj["students"] if student.strip() != ""] or [None]
+                for student in students:
+                    member_rows.append((snapshot_id, quarter, sig_name, sig_info["abbreviation"],
+                                        proj["project_name"], student))
+                project_students.update(students)
+
+            for student in dict.fromkeys(sig_info["students"]):
+                if student.strip() != "" and student not in project_students:
+                    member_rows.append((snapshot_id, quarter, sig_name, sig_info["abbreviation"], None, student))
+
+        self._connection.executemany(
+            "INSERT INTO members (snapshot_id, quarter, sig_name, abbreviation, project_name, student) "
+            "VALUES (?, ?, ?, ?, ?, ?)", member_rows)
+
+        return snapshot_id
+
+    def record_run(self, quarter, studio_db_dict, archived_files, fetched_at=None):
+        """
+        Records a run: the Studio Database it was generated from, and the files it generated. Files already in the
+        archive, e.g. found by a later run in the journal, keep the run that first generated them.
+
+        :param quarter: optional string name of quarter the run generated files for.
+        :param studio_db_dict: dict of each SIG with all student and project information.
+        :param archived_files: list of ArchivedFile generated by the run.
+        :param fetched_at: optional float time the Studio Database was fetched from the spreadsheet, in seconds since
+            the epoch. a cached copy was fetched by an earlier run. the time the run is recorded if not given.
+        :return: int id of the run.
+        """
+        now = datetime.now().isoformat()
+        snapshot_fetched_at = datetime.fromtimestamp(fetched_at).isoformat() if fetched_at is not None else now
+        with self._lock:
+            snapshot_id = self._record_snapshot(quarter, studio_db_dict, snapshot_fetched_at)
+            run_id = self._connection.execute(
+                "INSERT INTO runs (quarter, snapshot_id, started_at) VALUES (?, ?, ?)",
+                (quarter, snapshot_id, now)).lastrowid
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO files (file_id, run_id, quarter, artifact_type, scope, sig_name, subject, "
+                "file_name, url, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(archived.file_id, run_id, quarter, archived.artifact_type, archived.scope, archived.sig_name,
+                  archived.subject, archived.file_name, archived.url, now) for archived in archived_files])
+            self._connection.commit()
+
+        return run_id
+
+    def find_files(self, artifact_type=None, subject=None, sig_name=None, quarter=None):
+        """
+        Looks up archived files. Every filter that is given must match.
+
+        :param artifact_type: optional string artifact type, e.g. sprint_logs.
+        :param subject: optional string name of the student or project a file is for.
+        :param sig_name: optional string name of SIG.
+        :param quarter: optional string name of quarter.
+        :return: list of dicts of archived files, oldest first.
+        """
+        return self._query("SELECT quarter, artifact_type, sig_name, subject, file_name, file_id, url, created_at, "
+                           "run_id FROM files", [("artifact_type", artifact_type), ("subject", subject),
+                                                 ("sig_name", sig_name), ("quarter", quarter)],
+                           "ORDER BY created_at, file_name")
+
+    def find_members(self, student=None, project_name=None, sig_name=None, quarter=None):
+        """
+        Looks up which students were on which projects in which SIGs, across every archived snapshot.
+        Every filter that is given must match.
+
+        :param student: optional string name of student.
+        :param project_name: optional string name of project.
+        :param sig_name: optional string name of SIG.
+        :param quarter: optional string name of quarter.
+        :return: list of distinct dicts of quarter, sig_name, abbreviation, project_name, and student.
+        """
+        return self._query("SELECT DISTINCT quarter, sig_name, abbreviation, project_name, student FROM members",
+                           [("student", student), ("project_name", project_name), ("sig_name", sig_name),
+                            ("quarter", quarter)],
+                           "ORDER BY quarter, sig_name, project_name, student")
+
+    def _query(self, select, filters, order_by):
+        """
+        Runs a query with a WHERE clause for each given filter.
+
+        :param select: string SELECT clause.
+        :param filters: list of (column name, optional value) tuples. filters without a value are left out.
+        :param order_by: string ORDER BY clause.
+        :return: list of dicts, one for each row.
+        """
+        conditions = [(column, value) for column, value in filters if value is not None]
+        where = " WHERE " + " AND ".join("{} = ?".format(column) for column, _ in conditions) \
+            if len(conditions) > 0 else ""
+
+        with self._lock:
+            cursor = self._connection.execute(select + where + " " + order_by, [value for _, value in conditions])
+            column_names = [description[0] for description in cursor.description]
+            return [dict(zip(column_names, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        """
+        Closes the connection to the archive.
+
+        :return: None
+        """
+        with self._lock:
+            self._connection.close()
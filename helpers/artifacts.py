@@ -0,0 +1,785 @@
+"""
+This module includes the declarative specs for every artifact the scripts generate (Sprint Logs, The Weekly, etc.),
+and an engine that compiles them into a flat plan of copy jobs and runs it, with everything a script's run shares.
+"""
+
+import os
+import math
+from collections import namedtuple, Counter
+
+import helpers.imports as helpers
+import helpers.metrics as metrics
+import helpers.rate_limit as rate_limit
+import helpers.snapshot as snapshot
+import helpers.sharing as sharing
+import studio_db_to_json as studio_db
+from helpers.journal import CopyJournal
+from helpers.snapshot import StudioDbSnapshots
+from helpers.archive import StudioArchive, ArchivedFile
+from helpers.credential_pool import CredentialPool
+from helpers.concurrency import AimdConcurrencyLimiter
+from helpers.sharing import ShareSettings, load_email_directory
+from helpers.retry import RetryPolicy
+from helpers.rate_limit import DRIVE_QUERIES_PER_MINUTE, DRIVE_WRITES_PER_SECOND
+from copy_gdrive_file import CopyJob, run_copy_jobs, report_copy_results, chunk_copy_jobs, DEFAULT_MAX_WORKERS, \
+    MAX_BATCH_SIZE
+
+# scopes of an artifact: one file for each student, or one file for each project
+PER_STUDENT = "student"
+PER_PROJECT = "project"
+
+# URL formats for links to copied files, by the kind of document the template is
+DOCUMENT_URL_FORMATS = {
+    "spreadsheet": "https://docs.google.com/spreadsheets/d/{id}/edit",
+    "document": "https://docs.google.com/document/d/{id}/edit"
+}
+
+# an artifact: its display name, scope, filename template, document kind, and the column of the Studio Database
+# project information worksheet links to its files are written to, if it has one.
+# per-project filename templates can use {sig_name}, {abbreviation}, {project_name} and {qtr}.
+# per-student filename templates can use {sig_name}, {abbreviation}, {name}, {first_name}, {last_initial} and {qtr}.
+ArtifactSpec = namedtuple("ArtifactSpec", ["display_name", "scope", "filename_template", "document_kind",
+                                           "proj_info_column"], defaults=[None])
+
+# every artifact that can be generated, by artifact type
+ARTIFACT_SPECS = {
+    "sprint_logs": ArtifactSpec("Sprint Log", PER_PROJECT,
+                                "[{abbreviation}] {project_name} {qtr} Sprint Log", "spreadsheet", "Sprint Log Link"),
+    "research_canvases": ArtifactSpec("Research Canvas", PER_PROJECT,
+                                      "[{abbreviation}] {project_name} Practical/Conceptual Research Canvas",
+                                      "spreadsheet", "PRC Link"),
+    "mqc_proj": ArtifactSpec("Project Mid-Quarter Check-in", PER_PROJECT,
+                             "[{abbreviation}] {project_name} {qtr} Mid-Quarter Check-in", "spreadsheet"),
+    "eoq_checklist": ArtifactSpec("End-of-Quarter Checklist", PER_PROJECT,
+                                  "[{abbreviation}] {project_name} {qtr} End-of-Quarter Checklist", "document"),
+    "the_weekly": ArtifactSpec("The Weekly", PER_STUDENT,
+                               "{first_name} -- The Weekly {qtr}", "spreadsheet"),
+    "mqc_individual": ArtifactSpec("Mid-Quarter Check-In", PER_STUDENT,
+                                   "{first_name} {last_initial}. -- Mid-Quarter Check-In {qtr}", "spreadsheet"),
+    "eoq_assessment": ArtifactSpec("End-of-Quarter Self-Assessment", PER_STUDENT,
+                                   "{first_name} -- {qtr} EOQ Self-Assessment", "spreadsheet"),
+    "ipm": ArtifactSpec("Individual Progress Map", PER_STUDENT,
+                        "{first_name} {last_initial}. -- Individual Progress Map", "spreadsheet")
+}
+
+# a single file in a plan: its artifact type, the SIG and student or project it is for, and its copy job
+PlannedCopy = namedtuple("PlannedCopy", ["artifact_type", "sig_name", "subject", "job"])
+
+# typical time Google Drive takes to copy a single file, and to return a page of files in a folder
+COPY_LATENCY_SECONDS = 1.5
+LIST_LATENCY_SECONDS = 0.5
+
+# estimated cost of running a plan: files planned, files a previous run already copied, Drive folder listings,
+# batch requests and copies, Sheets requests, Drive quota units, and runtime in seconds
+PlanEstimate = namedtuple("PlanEstimate", ["file_count", "journal_count", "list_requests", "batch_requests",
+                                           "copy_requests", "sheets_requests", "quota_units", "runtime_seconds"])
+
+
+def studio_db_from_students(student_list):
+    """
+    Creates a minimal studio database dict with a single unnamed SIG, for generating per-student artifacts from a
+    list of student names instead of the Studio Database.
+
+    :param student_list: list of student names.
+    :return: dict in the same format as a studio database dict.
+    """
+    return {
+        "": {
+            "abbreviation": "",
+            "students": list(student_list),
+            "projects": []
+        }
+    }
+
+
+def load_studio_db_from_students(student_list):
+    """
+    Creates and indexes a minimal studio database from a list of student names, like studio_db.load_studio_db.
+
+    :param student_list: list of student names.
+    :return: LoadedStudioDb of a studio database dict from studio_db_from_students, and its StudioDbIndex.
+    """
+    studio_db_dict = studio_db_from_students(student_list)
+    return studio_db.LoadedStudioDb(studio_db_dict, studio_db.StudioDbIndex(studio_db_dict))
+
+
+def get_subject_fields(scope, studio_db_dict):
+    """
+    Lists the students or projects in a studio database, with the fields filename templates can use for each.
+    Students who work on several projects in a SIG, and blank student names, are only listed once and not at all.
+
+    :param scope: PER_STUDENT or PER_PROJECT.
+    :param studio_db_dict: dict of each SIG with all student and project information.
+    :return: list of (sig_name, subject name, dict of filename template fields) tuples.
+    """
+    output = []
+    for sig_name, sig_info in studio_db_dict.items():
+        sig_fields = {"sig_name": sig_name, "abbreviation": sig_info["abbreviation"]}
+
+        if scope == PER_PROJECT:
+            for proj in sig_info["projects"]:
+                output.append((sig_name, proj["project_name"], dict(sig_fields, project_name=proj["project_name"])))
+            continue
+
+        for curr_student in dict.fromkeys(sig_info["students"]):
+            # split name into first name and last initial
+            student_name_split = curr_student.strip().split(" ")
+            if student_name_split[0] == "":
+                continue
+
+            output.append((sig_name, curr_student, dict(sig_fields,
+                                                        name=curr_student,
+                                                        first_name=student_name_split[0],
+                                                        last_initial=student_name_split[-1][0].upper())))
+
+    return output
+
+
+def get_file_names(spec, studio_db_dict, qtr):
+    """
+    Names the file of every student or project in a studio database for an artifact. Different students or projects
+    whose files would have the same name, e.g. two students named Alex for The Weekly, also get the student or
+    project name, and the SIG name if that is shared too, added to their filenames, so each gets its own file.
+
+    :param spec: ArtifactSpec to name files for.
+    :param studio_db_dict: dict of each SIG with all student and project information.
+    :param qtr: string name of quarter to generate artifacts for.
+    :return: tuple of (dict of (sig name, subject name) to string filename, set of (sig name, subject name) whose
+        filenames were made unique).
+    """
+    file_names = {(sig_name, subject): spec.filename_template.format(qtr=qtr, **fields)
+                  for sig_name, subject, fields in get_subject_fields(spec.scope, studio_db_dict)}
+
+    # count the students or projects each filename is for, and how many of those share a subject name
+    file_name_counts = Counter(file_names.values())
+    subject_counts = Counter((file_name, subject) for (sig_name, subject), file_name in file_names.items())
+
+    renamed_subjects = set()
+    for (sig_name, subject), file_name in file_names.items():
+        if file_name_counts[file_name] == 1:
+            continue
+
+        renamed_subjects.add((sig_name, subject))
+        if subject_counts[(file_name, subject)] == 1:
+            file_names[(sig_name, subject)] = "{} ({})".format(file_name, subject)
+        else:
+            file_names[(sig_name, subject)] = "{} ({}, {})".format(file_name, subject, sig_name)
+
+    return file_names, renamed_subjects
+
+
+def plan_artifacts(studio_db_dict, artifacts, qtr, snapshots=None):
+    """
+    Compiles artifact specs and a studio database into one flat plan of every file to copy.
+    The same file for the same student or project is only planned once, e.g. if an artifact is listed twice.
+    Files of different students or projects never share a filename (see get_file_names), and the files that had to be
+    renamed for that are printed.
+
+    :param studio_db_dict: dict of each SIG with all student and project information.
+    :param artifacts: list of (artifact type, template url, folder url) tuples to plan.
+    :param qtr: string name of quarter to generate artifacts for.
+    :param snapshots: optional StudioDbSnapshots. artifacts with a snapshot are only planned for the students and
+        projects added or renamed since it was recorded.
+    :return: list of PlannedCopy, in the order artifacts are listed.
+    """
+    plan = []
+    planned_copies = set()
+
+    for artifact_type, template_url, folder_url in artifacts:
+        spec = ARTIFACT_SPECS[artifact_type]
+        template_id = helpers.get_file_id_from_url(template_url)
+        folder_id = helpers.get_folder_id_from_url(folder_url)
+
+        # files are named from the whole studio database, so students and projects added by an incremental run
+        # can't take the name of a file an earlier run already created
+        file_names, renamed_subjects = get_file_names(spec, studio_db_dict, qtr)
+
+        # only plan the students and projects that changed since the last run, if there was one
+        curr_studio_db_dict = studio_db_dict
+        previous_studio_db_dict = snapshots.get(snapshot.get_snapshot_key(artifact_type, template_id, folder_id)) \
+            if snapshots is not None else None
+        if previous_studio_db_dict is not None:
+            diff = snapshot.diff_studio_db(previous_studio_db_dict, studio_db_dict)
+            snapshot.print_diff(spec.display_name, diff)
+            curr_studio_db_dict = snapshot.get_delta_studio_db(studio_db_dict, diff)
+
+        renamed_files = []
+        for sig_name, subject, fields in get_subject_fields(spec.scope, curr_studio_db_dict):
+            curr_copy = PlannedCopy(artifact_type, sig_name, subject,
+                                    CopyJob(template_id, folder_id, file_names[(sig_name, subject)]))
+            if curr_copy in planned_copies:
+                continue
+
+            planned_copies.add(curr_copy)
+            plan.append(curr_copy)
+            if (sig_name, subject) in renamed_subjects:
+                renamed_files.append(curr_copy.job.file_name)
+
+        if len(renamed_files) > 0:
+            print("{name}: {count} files would have had the same name as another {scope}'s, so their names also "
+                  "include who they are for: {files}".format(name=spec.display_name, count=len(renamed_files),
+                                                             scope=spec.scope, files=", ".join(renamed_files)))
+
+    return plan
+
+
+def record_snapshots(snapshots, studio_db_dict, artifacts, plan, copy_results):
+    """
+    Records the studio database as the snapshot of each artifact whose files were all copied, so the next
+    incremental run only generates files for students and projects added after this one. Artifacts with failed
+    copies keep their previous snapshot, so the next run tries them again.
+
+    :param snapshots: StudioDbSnapshots to record to.
+    :param studio_db_dict: dict of each SIG with all student and project information the plan was made from.
+    :param artifacts: list of (artifact type, template url, folder url) tuples that were planned.
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param copy_results: list of CopyResult from run_copy_jobs, in the same order as plan.
+    :return: None
+    """
+    failed_keys = {snapshot.get_snapshot_key(planned.artifact_type, planned.job.file_id, planned.job.folder_id)
+                   for planned, result in zip(plan, copy_results) if result.file_id is None}
+
+    studio_db_dicts = {}
+    for artifact_type, template_url, folder_url in artifacts:
+        snapshot_key = snapshot.get_snapshot_key(artifact_type, helpers.get_file_id_from_url(template_url),
+                                                 helpers.get_folder_id_from_url(folder_url))
+        if snapshot_key in failed_keys:
+            print("{}: some files failed to copy, so the next incremental run will try them again."
+                  .format(ARTIFACT_SPECS[artifact_type].display_name))
+            continue
+
+        studio_db_dicts[snapshot_key] = studio_db_dict
+
+    snapshots.record(studio_db_dicts)
+
+
+def archive_run(archive, studio_db_dict, qtr, plan, copy_results, fetched_at=None):
+    """
+    Records a run in the archive: the studio database it was generated from, and every file that was copied.
+
+    :param archive: StudioArchive to record the run to.
+    :param studio_db_dict: dict of each SIG with all student and project information the plan was made from.
+    :param qtr: optional string name of quarter files were generated for.
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param copy_results: list of CopyResult from run_copy_jobs, in the same order as plan.
+    :param fetched_at: optional float time the studio database was fetched, in seconds since the epoch.
+    :return: int id of the archived run.
+    """
+    archived_files = [ArchivedFile(planned.artifact_type, ARTIFACT_SPECS[planned.artifact_type].scope,
+                                   planned.sig_name, planned.subject, planned.job.file_name, result.file_id,
+                                   get_file_url(planned.artifact_type, result.file_id))
+                      for planned, result in zip(plan, copy_results) if result.file_id is not None]
+
+    return archive.record_run(qtr, studio_db_dict, archived_files, fetched_at=fetched_at)
+
+
+def get_share_recipients(planned, studio_db_index):
+    """
+    Lists the people a planned file is for: its student, or every student on its project, and the heads of its SIG.
+
+    :param planned: PlannedCopy from plan_artifacts.
+    :param studio_db_index: StudioDbIndex of the studio database the plan was made from.
+    :return: list of string names, without blank names.
+    """
+    if ARTIFACT_SPECS[planned.artifact_type].scope == PER_PROJECT:
+        # the index ignores case, so only the project with this exact name in this SIG is the file's project
+        recipient_names = [student for membership in studio_db_index.find_project(planned.subject)
+                           if membership.sig_name == planned.sig_name and membership.project_name == planned.subject
+                           for student in membership.students]
+    else:
+        recipient_names = [planned.subject]
+
+    # studio databases built from a student list have no SIG heads
+    recipient_names += studio_db_index.studio_db_dict.get(planned.sig_name, {}).get("sig_heads", [])
+
+    return [name for name in recipient_names if name.strip() != ""]
+
+
+def plan_share_grants(plan, file_ids, studio_db_index, share_settings):
+    """
+    Compiles one permission grant for each planned file and each person it is for (see get_share_recipients).
+    People are only granted each file once, even if they are both a student and a head of its SIG.
+
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param file_ids: list of the id of each planned file, in the same order as plan. None for files that were not
+        copied, which are not shared.
+    :param studio_db_index: StudioDbIndex of the studio database the plan was made from.
+    :param share_settings: ShareSettings with each person's email address and the role to give them.
+    :return: tuple of (list of ShareGrant, sorted list of names with no email address, which were not granted).
+    """
+    # names are looked up like in a StudioDbIndex, ignoring case and surrounding whitespace. names that are already
+    # email addresses are used as they are
+    directory_index = {studio_db.get_index_key(name): email_address
+                       for name, email_address in share_settings.email_directory.items()}
+
+    grants = []
+    missing_names = set()
+    for planned, file_id in zip(plan, file_ids):
+        if file_id is None:
+            continue
+
+        # email addresses are compared without case, so nobody is granted the same file twice
+        email_addresses = {}
+        for name in get_share_recipients(planned, studio_db_index):
+            email_address = name.strip() if "@" in name else directory_index.get(studio_db.get_index_key(name))
+            if email_address is None:
+                missing_names.add(name.strip())
+                continue
+
+            email_addresses.setdefault(email_address.casefold(), email_address)
+
+        grants.extend(sharing.ShareGrant(file_id, email_address, share_settings.role)
+                      for email_address in email_addresses.values())
+
+    return grants, sorted(missing_names)
+
+
+def print_missing_share_names(missing_names):
+    """
+    Prints the people files could not be shared with, so they can be added to the email directory.
+
+    :param missing_names: list of string names with no email address, from plan_share_grants.
+    :return: None
+    """
+    if len(missing_names) > 0:
+        print("No email address for {count} people, so files were not shared with them: {names}".format(
+            count=len(missing_names), names=", ".join(missing_names)))
+
+
+def print_share_plan(plan, studio_db_index, share_settings, batch_size=MAX_BATCH_SIZE):
+    """
+    Prints the permissions sharing a plan's files will create, and the batch requests they will be sent in.
+
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param studio_db_index: StudioDbIndex of the studio database the plan was made from.
+    :param share_settings: ShareSettings files will be shared with.
+    :param batch_size: int maximum number of permission requests to send in a single batch request.
+    :return: None
+    """
+    # files have no ids until they are copied, so each copy job stands in for its file's id
+    grants, missing_names = plan_share_grants(plan, [planned.job for planned in plan], studio_db_index,
+                                              share_settings)
+    batch_requests = sum(math.ceil(len(round_indices) / batch_size)
+                         for round_indices in sharing.get_share_rounds(grants))
+
+    print("\nSharing: {grants} permissions as {role} for {files} files, in {batches} batch requests "
+          "(notification emails {notify})".format(grants=len(grants), role=share_settings.role,
+                                                   files=len({grant.file_id for grant in grants}),
+                                                   batches=batch_requests,
+                                                   notify="on" if share_settings.send_notification_email else "off"))
+    print_missing_share_names(missing_names)
+
+
+def share_run(share_settings, studio_db_index, plan, copy_results, gdrive_service_factory,
+              max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Shares every copied file with the people it is for, in batch requests, and prints any that could not be shared.
+    Files copied by a previous run are shared again, which leaves existing permissions as they are.
+
+    :param share_settings: ShareSettings to share files with.
+    :param studio_db_index: StudioDbIndex of the studio database the plan was made from.
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param copy_results: list of CopyResult from run_copy_jobs, in the same order as plan.
+    :param gdrive_service_factory: function that returns a new Google Drive v3 authentication object.
+    :param max_workers: int maximum number of batch requests to send concurrently.
+    :return: list of ShareResult, one for each grant.
+    """
+    grants, missing_names = plan_share_grants(plan, [result.file_id for result in copy_results], studio_db_index,
+                                              share_settings)
+    print_missing_share_names(missing_names)
+
+    retry_policy = RetryPolicy()
+    share_results = sharing.share_files(grants, gdrive_service_factory, max_workers=max_workers,
+                                        retry_policy=retry_policy,
+                                        send_notification_email=share_settings.send_notification_email)
+    sharing.report_share_results(share_results, retry_policy)
+
+    return share_results
+
+
+def get_file_url(artifact_type, file_id):
+    """
+    Generates a URL for a file copied for an artifact.
+
+    :param artifact_type: string artifact type the file was copied for.
+    :param file_id: string id of the copied file.
+    :return: string url of the copied file.
+    """
+    return DOCUMENT_URL_FORMATS[ARTIFACT_SPECS[artifact_type].document_kind].format(id=file_id)
+
+
+def get_proj_info_links(plan, copy_results):
+    """
+    Lists links to the copied files of artifacts that have a column in the Studio Database project information
+    worksheet, for write_proj_info_links.
+
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param copy_results: list of CopyResult from run_copy_jobs, in the same order as plan.
+    :return: dict of (sig name, project name) to dict of column header to link.
+    """
+    proj_links = {}
+    for planned, result in zip(plan, copy_results):
+        # skip artifacts without a column, and files that failed to copy
+        proj_info_column = ARTIFACT_SPECS[planned.artifact_type].proj_info_column
+        if proj_info_column is None or result.file_id is None:
+            continue
+
+        proj_links.setdefault((planned.sig_name, planned.subject), {})[proj_info_column] = \
+            get_file_url(planned.artifact_type, result.file_id)
+
+    return proj_links
+
+
+def estimate_plan(plan, max_workers=DEFAULT_MAX_WORKERS, batch_size=MAX_BATCH_SIZE, journal=None, write_links=False,
+                  credential_count=1):
+    """
+    Estimates the requests, quota, and runtime needed to run a plan, without making any requests.
+    Files that already exist in their destination folder can only be found by listing it, so the estimate
+    assumes none do.
+
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param max_workers: int maximum number of files to copy concurrently.
+    :param batch_size: int maximum number of copy requests to send in a single batch request.
+    :param journal: optional CopyJournal of files copied by a previous run, which will be skipped.
+    :param write_links: boolean true if links to copied files will be written back into the Studio Database.
+    :param credential_count: int number of credentials copies are spread across, each with its own write throttle
+        and quota.
+    :return: PlanEstimate for the plan.
+    """
+    jobs = [planned.job for planned in plan]
+    completed_file_ids = journal.get_completed(jobs) if journal is not None else {}
+    pending_indices = [index for index, job in enumerate(jobs) if job not in completed_file_ids]
+
+    # each destination folder is listed once, then copies are sent in the same chunks run_copy_jobs uses
+    list_requests = len({jobs[index].folder_id for index in pending_indices})
+    chunks = chunk_copy_jobs(jobs, pending_indices, max_workers, batch_size)
+    copy_requests = len(pending_indices)
+    quota_units = list_requests + copy_requests
+
+    # runtime is bound by the slowest of: concurrent workers, the write throttle, and the per-minute quota. the rate
+    # limiter holds copies to the same write throttle for each credential
+    active_workers = max(1, min(max_workers, len(chunks)))
+    copy_seconds = max(copy_requests * COPY_LATENCY_SECONDS / active_workers,
+                       copy_requests / (DRIVE_WRITES_PER_SECOND * credential_count),
+                       quota_units / (DRIVE_QUERIES_PER_MINUTE * credential_count) * 60)
+    runtime_seconds = list_requests * LIST_LATENCY_SECONDS + copy_seconds
+
+    # copying never reads or writes the Studio Database. writing links back re-reads the project information
+    # worksheet, then writes every link in one request
+    has_links = any(ARTIFACT_SPECS[planned.artifact_type].proj_info_column is not None for planned in plan)
+    sheets_requests = 2 if write_links and has_links else 0
+
+    return PlanEstimate(len(jobs), len(completed_file_ids), list_requests, len(chunks), copy_requests,
+                        sheets_requests, quota_units, runtime_seconds)
+
+
+def print_plan(plan, max_workers=DEFAULT_MAX_WORKERS, journal=None, write_links=False, credential_count=1):
+    """
+    Prints the files a plan will create, counted by artifact type and by SIG, and its estimated cost.
+
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param max_workers: int maximum number of files to copy concurrently.
+    :param journal: optional CopyJournal of files copied by a previous run, which will be skipped.
+    :param write_links: boolean true if links to copied files will be written back into the Studio Database.
+    :param credential_count: int number of credentials copies are spread across.
+    :return: PlanEstimate for the plan.
+    """
+    print("Plan: {} files".format(len(plan)))
+
+    # count files by artifact type, with an example filename and the template and folder each is copied between
+    print("\nBy artifact type:")
+    artifact_counts = Counter(planned.artifact_type for planned in plan)
+    for artifact_type, count in artifact_counts.items():
+        first_planned = next(planned for planned in plan if planned.artifact_type == artifact_type)
+        print("    {name} ({type}): {count} files, e.g. \"{filename}\"".format(
+            name=ARTIFACT_SPECS[artifact_type].display_name, type=artifact_type, count=count,
+            filename=first_planned.job.file_name))
+        print("        template {file_id} -> folder {folder_id}".format(file_id=first_planned.job.file_id,
+                                                                        folder_id=first_planned.job.folder_id))
+
+    print("\nBy SIG:")
+    sig_counts = Counter(planned.sig_name for planned in plan)
+    for sig_name, count in sig_counts.items():
+        print("    {sig}: {count} files".format(sig=sig_name or "(no SIG)", count=count))
+
+    estimate = estimate_plan(plan, max_workers=max_workers, journal=journal, write_links=write_links,
+                             credential_count=credential_count)
+    runtime_minutes, runtime_seconds = divmod(math.ceil(estimate.runtime_seconds), 60)
+
+    print("\nEstimated cost with {} workers:".format(max_workers))
+    if journal is not None:
+        print("    {count} files already copied by a previous run (journal: {path})".format(
+            count=estimate.journal_count, path=journal.journal_path))
+    print("    Drive requests: {total} ({lists} folder listings, {batches} batch requests of {copies} copies)".format(
+        total=estimate.list_requests + estimate.batch_requests, lists=estimate.list_requests,
+        batches=estimate.batch_requests, copies=estimate.copy_requests))
+    print("    Sheets requests: {}".format(estimate.sheets_requests))
+    print("    Drive quota units: {units} (limit {limit} per minute per user)".format(
+        units=estimate.quota_units, limit=DRIVE_QUERIES_PER_MINUTE))
+    print("    Copies are limited to {writes} per second per user, across {credentials} credential(s)".format(
+        writes=DRIVE_WRITES_PER_SECOND, credentials=credential_count))
+    print("    Runtime: about {minutes}m {seconds}s".format(minutes=runtime_minutes, seconds=runtime_seconds))
+    print("\nDry run: no files were copied.")
+
+    return estimate
+
+
+def run_plan(plan, gdrive_service_factory, max_workers=DEFAULT_MAX_WORKERS, journal=None, skip_existing=True,
+             proj_info_sheet=None, async_engine=None, credential_pool=None, concurrency_limiter=None):
+    """
+    Copies every file in a plan on one shared pool of workers, and prints a URL for each copied file.
+
+    :param plan: list of PlannedCopy from plan_artifacts.
+    :param gdrive_service_factory: function that returns a new Google Drive v3 authentication object.
+    :param max_workers: int maximum number of files to copy concurrently.
+    :param journal: optional CopyJournal to skip files copied by a previous run, and record new copies to.
+    :param skip_existing: boolean true to skip files whose name already exists in the destination folder.
+    :param proj_info_sheet: optional (studio db url, project information sheet name) tuple to write links to
+        copied files back into, for artifacts that have a column there.
+    :param async_engine: optional AsyncDriveEngine to copy files with on this thread, instead of on worker threads.
+    :param credential_pool: optional CredentialPool to spread copies across several credentials, instead of the
+        credentials gdrive_service_factory and async_engine were created with.
+    :param concurrency_limiter: optional AimdConcurrencyLimiter to adjust the number of files copied concurrently
+        with, up to max_workers.
+    :return: list of CopyResult, in the same order as plan.
+    """
+    retry_policy = RetryPolicy()
+    copy_results = run_copy_jobs([planned.job for planned in plan], gdrive_service_factory, max_workers=max_workers,
+                                 retry_policy=retry_policy, journal=journal, skip_existing=skip_existing,
+                                 async_engine=async_engine, credential_pool=credential_pool,
+                                 concurrency_limiter=concurrency_limiter)
+    report_copy_results(copy_results, retry_policy)
+    if credential_pool is not None:
+        print("Credentials: {}".format(credential_pool.summary()))
+    if concurrency_limiter is not None:
+        print("Concurrency: {}".format(concurrency_limiter.summary()))
+
+    # generate a file URL for each copied file, and print out grouped by artifact type
+    artifact_types = list(dict.fromkeys(planned.artifact_type for planned in plan))
+    for artifact_type in artifact_types:
+        if len(artifact_types) > 1:
+            print("\n{}:".format(ARTIFACT_SPECS[artifact_type].display_name))
+
+        for planned, result in zip(plan, copy_results):
+            # skip files from other artifacts, or that failed to copy
+            if planned.artifact_type != artifact_type or result.file_id is None:
+                continue
+
+            print("{filename}: {url}".format(filename=planned.job.file_name,
+                                             url=get_file_url(artifact_type, result.file_id)))
+
+    # write links back into the Studio Database, instead of pasting each one in by hand
+    if proj_info_sheet is not None:
+        studio_db_url, proj_info_sheet_name = proj_info_sheet
+        studio_db.write_proj_info_links(studio_db_url, proj_info_sheet_name, get_proj_info_links(plan, copy_results))
+
+    return copy_results
+
+
+def generate_artifacts(run_context, loaded_studio_db, artifacts, qtr):
+    """
+    Generates one or more artifact types for every student or project in a studio database, running all copies
+    through one shared pool of workers.
+
+    :param run_context: RunContext to copy, share and record files with.
+    :param loaded_studio_db: LoadedStudioDb of the studio database to generate files from, and its index.
+    :param artifacts: list of (artifact type, template url, folder url) tuples to generate. artifact types are keys
+        of ARTIFACT_SPECS.
+    :param qtr: optional string name of quarter to generate files for.
+    :return: list of CopyResult, one for each planned file. empty for a dry run.
+    """
+    # plan every file to copy for every artifact
+    studio_db_dict = loaded_studio_db.studio_db
+    plan = plan_artifacts(studio_db_dict, artifacts, qtr, snapshots=run_context.snapshots)
+
+    if run_context.dry_run:
+        print_plan(plan, max_workers=run_context.max_workers, journal=run_context.journal,
+                   write_links=run_context.proj_info_sheet is not None, credential_count=run_context.credential_count)
+        if run_context.share_settings is not None:
+            print_share_plan(plan, loaded_studio_db.index, run_context.share_settings)
+        return []
+
+    if len(artifacts) > 1:
+        planned_counts = Counter(planned.artifact_type for planned in plan)
+        for artifact_type, count in planned_counts.items():
+            print("{type}: {count} files".format(type=artifact_type, count=count))
+
+    # copy every file and print a URL for each copied file
+    copy_results = run_plan(plan, run_context.gdrive_service_factory, max_workers=run_context.max_workers,
+                            journal=run_context.journal, proj_info_sheet=run_context.proj_info_sheet,
+                            async_engine=run_context.async_engine, credential_pool=run_context.credential_pool,
+                            concurrency_limiter=run_context.concurrency_limiter)
+
+    # share every copied file with the people it is for, in as few batch requests as possible
+    if run_context.share_settings is not None:
+        share_run(run_context.share_settings, loaded_studio_db.index, plan, copy_results,
+                  run_context.gdrive_service_factory, max_workers=run_context.max_workers)
+
+    if run_context.snapshots is not None:
+        record_snapshots(run_context.snapshots, studio_db_dict, artifacts, plan, copy_results)
+
+    if run_context.archive is not None:
+        archive_run(run_context.archive, studio_db_dict, qtr, plan, copy_results,
+                    fetched_at=loaded_studio_db.fetched_at)
+
+    return copy_results
+
+
+class RunContext:
+    """
+    Everything a run generates artifacts with besides the studio database: the Drive services and options files are
+    copied and shared with, and the journal, snapshots and archive the run is recorded to.
+    Closes the journal and archive when used as a context manager.
+    """
+
+    def __init__(self, gdrive_service_factory=None, max_workers=DEFAULT_MAX_WORKERS, journal=None, dry_run=False,
+                 proj_info_sheet=None, snapshots=None, archive=None, async_engine=None, credential_pool=None,
+                 concurrency_limiter=None, share_settings=None, credential_count=1):
+        """
+        :param gdrive_service_factory: function that returns a new Google Drive v3 authentication object.
+        :param max_workers: int maximum number of files to copy concurrently.
+        :param journal: optional CopyJournal to skip files copied by a previous run, and record new copies to.
+        :param dry_run: boolean true to print the plan and its estimated cost instead of copying any files.
+        :param proj_info_sheet: optional (studio db url, project information sheet name) tuple to write links to
+            copied files back into, for artifacts that have a column there.
+        :param snapshots: optional StudioDbSnapshots to only generate files for students and projects added since
+            the last incremental run, and record this run to.
+        :param archive: optional StudioArchive to record the studio database and every copied file to.
+        :param async_engine: optional AsyncDriveEngine to copy files with on this thread, instead of on worker
+            threads.
+        :param credential_pool: optional CredentialPool to spread copies across several credentials, instead of the
+            credentials gdrive_service_factory and async_engine were created with.
+        :param concurrency_limiter: optional AimdConcurrencyLimiter to adjust the number of files copied
+            concurrently with, up to max_workers.
+        :param share_settings: optional ShareSettings to share each copied file with the people it is for.
+        :param credential_count: int number of credentials copies are spread across, to estimate a dry run with.
+        """
+        self.gdrive_service_factory = gdrive_service_factory
+        self.max_workers = max_workers
+        self.journal = journal
+        self.dry_run = dry_run
+        self.proj_info_sheet = proj_info_sheet
+        self.snapshots = snapshots
+        self.archive = archive
+        self.async_engine = async_engine
+        self.credential_pool = credential_pool
+        self.concurrency_limiter = concurrency_limiter
+        self.share_settings = share_settings
+        self.credential_count = credential_count
+
+    @classmethod
+    def from_args(cls, args, proj_info_sheet=None):
+        """
+        Authenticates and opens everything a run needs, from a script's command line arguments. A dry run is
+        neither authenticated nor recorded: it loads no Drive credentials, and only reads the journal and snapshots.
+
+        :param args: argparse.Namespace from a parser with helpers.cli.add_copy_arguments.
+        :param proj_info_sheet: optional (studio db url, project information sheet name) tuple to write links to
+            copied files back into, for artifacts that have a column there.
+        :return: RunContext for the run.
+        """
+        # share each copied file with its students and SIG heads, if given their email addresses
+        share_settings = ShareSettings(load_email_directory(args.share), args.share_role, args.notify) \
+            if args.share else None
+
+        # load the studio database each artifact was last generated from, so only what changed since is generated
+        snapshots = StudioDbSnapshots() if args.incremental else None
+
+        # a dry run only plans from the studio database, so it never loads credentials, or creates or writes to the
+        # journal or archive. the journal is only read, if a previous run left one, to count files it already copied
+        if args.dry_run:
+            journal = CopyJournal(args.journal, read_only=True) if os.path.exists(args.journal) else None
+            return cls(max_workers=args.workers, journal=journal, dry_run=True, proj_info_sheet=proj_info_sheet,
+                       snapshots=snapshots, share_settings=share_settings,
+                       credential_count=len(args.credentials) if args.credentials else 1)
+
+        # load the pool of credentials to spread copies across, if given. the first one is used for everything else
+        credential_pool = CredentialPool.from_files(args.credentials) if args.credentials else None
+        creds = credential_pool.credentials[0] if credential_pool is not None else helpers.get_gdrive_credentials()
+
+        # copy as many files concurrently as Drive sustains, up to max_workers, if asked to
+        concurrency_limiter = AimdConcurrencyLimiter(args.workers, latency_target=args.latency_target) \
+            if args.adaptive else None
+
+        # authenticate for Google Drive v3 API. the Google Spreadsheets API is only authenticated if the
+        # studio database needs to be downloaded
+        gdrive_service_factory = helpers.gdrive_service_factory(creds)
+
+        # copy files with asyncio on this thread instead of on worker threads, if asked to
+        async_engine = None
+        if args.engine == "async":
+            # the async engine and asyncio are only imported for runs that use them
+            from helpers.async_drive import AsyncDriveEngine
+
+            async_engine = AsyncDriveEngine(creds)
+
+        # open the copy journal, so an interrupted run can be resumed
+        journal = CopyJournal(args.journal)
+
+        # open the archive, so the studio database and files of every run can be looked up later
+        archive = StudioArchive(args.archive) if args.archive else None
+
+        return cls(gdrive_service_factory, max_workers=args.workers, journal=journal, dry_run=args.dry_run,
+                   proj_info_sheet=proj_info_sheet, snapshots=snapshots, archive=archive, async_engine=async_engine,
+                   credential_pool=credential_pool, concurrency_limiter=concurrency_limiter,
+                   share_settings=share_settings, credential_count=len(args.credentials) if args.credentials else 1)
+
+    def close(self):
+        """
+        Closes the journal and archive, if they are open.
+
+        :return: None
+        """
+        if self.journal is not None:
+            self.journal.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def run_artifacts(args, artifacts, qtr, studio_db_sheets=None, student_list=None):
+    """
+    Generates artifacts from a script's command line arguments, so each script only names what it generates.
+    Fetches the studio database, opens a RunContext, generates every artifact, and writes metrics once the run ends,
+    even if it failed, since that is when they are most useful. A dry run writes no local files: it is not rate
+    limited, doesn't write metrics, and doesn't write the Studio Database cache.
+
+    :param args: argparse.Namespace from a parser with helpers.cli.add_copy_arguments, add_rate_limit_arguments and
+        add_metrics_arguments. add_studio_db_arguments and add_write_links_arguments are optional.
+    :param artifacts: list of (artifact type, template url, folder url) tuples to generate.
+    :param qtr: optional string name of quarter to generate files for.
+    :param studio_db_sheets: optional (studio db url, SIG information sheet name, project information sheet name)
+        tuple of the Studio Database to generate files from.
+    :param student_list: optional list of student names to generate files from, instead of the Studio Database.
+    :return: list of CopyResult, one for each planned file. empty for a dry run.
+    """
+    # share the Drive and Sheets quota with other scripts running in this directory. a dry run makes too few
+    # requests to need it, and would otherwise create the shared file
+    if not args.dry_run:
+        rate_limit.configure(args.rate_limiter, args.credentials)
+
+    try:
+        # generate studio database. a dry run uses a cached copy as is, and doesn't cache what it fetches
+        proj_info_sheet = None
+        if studio_db_sheets is not None:
+            studio_db_url, sig_info_sheet_name, proj_info_sheet_name = studio_db_sheets
+            loaded_studio_db = studio_db.load_studio_db(studio_db_url, sig_info_sheet_name, proj_info_sheet_name,
+                                                        force_refresh=args.refresh_studio_db,
+                                                        read_only=args.dry_run)
+
+            # write links back into the same Studio Database the projects came from. only some scripts can
+            if getattr(args, "write_links", False):
+                proj_info_sheet = (studio_db_url, proj_info_sheet_name)
+        else:
+            loaded_studio_db = load_studio_db_from_students(student_list)
+
+        with RunContext.from_args(args, proj_info_sheet=proj_info_sheet) as run_context:
+            return generate_artifacts(run_context, loaded_studio_db, artifacts, qtr)
+    finally:
+        if not args.dry_run:
+            metrics.export_metrics(args.metrics)
@@ -0,0 +1,347 @@
+"""
+This module includes an asyncio engine for the Google Drive v3 API. It calls the REST endpoints directly over one
+pooled aiohttp session instead of through googleapiclient service objects, which are synchronous and not thread-safe,
+so thousands of copies can be in flight on a single thread.
+aiohttp is imported inside the functions that use it, since only runs that choose this engine need it.
+"""
+
+import json
+import asyncio
+
+from googleapiclient import errors
+
+import helpers.metrics as metrics
+import helpers.rate_limit as rate_limit
+from helpers.imports import HTTP_TIMEOUT, USER_AGENT
+from helpers.retry import RetryPolicy, RETRYABLE_EXCEPTIONS
+from copy_gdrive_file import CopyResult, COPY_FIELDS, MAX_LIST_PAGE_SIZE, MAX_BATCH_SIZE, DEFAULT_MAX_WORKERS, \
+    get_file_name_query
+
+# root of the Google Drive v3 REST endpoints
+DRIVE_API_URL = "https://www.googleapis.com/drive/v3"
+
+
+def get_http_error(status, headers, content, url):
+    """
+    Creates the same error googleapiclient raises for a failed response, so retries, Retry-After headers, and
+    metrics treat both engines alike.
+
+    :param status: int HTTP status code of the response.
+    :param headers: dict of response headers.
+    :param content: bytes body of the response.
+    :param url: string url of the request.
+    :return: googleapiclient HttpError.
+    """
+    import httplib2
+
+    resp = httplib2.Response(dict(headers, status=str(status)))
+    return errors.HttpError(resp, content, uri=url)
+
+
+class AsyncDriveClient:
+    """
+    Calls Google Drive v3 REST endpoints over a shared aiohttp session. At most max_concurrency requests, including
+    their retries, are in flight at once. Must be created and used inside a running event loop.
+    """
+
+    def __init__(self, session, creds, max_concurrency=DEFAULT_MAX_WORKERS, retry_policy=None,
+                 base_url=DRIVE_API_URL, credential_pool=None, concurrency_limiter=None):
+        """
+        :param session: aiohttp.ClientSession to send requests with.
+        :param creds: credentials to authorize requests with. refreshed when they expire.
+        :param max_concurrency: int maximum number of requests in flight at once.
+        :param retry_policy: optional RetryPolicy to retry failed requests with. a default policy is used if not given.
+        :param base_url: string root of the Google Drive v3 REST endpoints.
+        :param credential_pool: optional CredentialPool to send each attempt with the least loaded credential of,
+            instead of creds.
+        :param concurrency_limiter: optional AimdConcurrencyLimiter to wait for before sending each attempt, so fewer
+            than max_concurrency requests may be in flight.
+        """
+        self.session = session
+        self.creds = creds
+        self.credential_pool = credential_pool
+        self.concurrency_limiter = concurrency_limiter
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.base_url = base_url
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._refresh_lock = asyncio.Lock()
+
+    async def get_auth_headers(self, creds):
+        """
+        Creates the headers that authorize a request, refreshing the credentials first if they have expired.
+        Only one request refreshes them; the rest wait for it.
+
+        :param creds: credentials to authorize the request with.
+        :return: dict of headers.
+        """
+        if not creds.valid:
+            async with self._refresh_lock:
+                if not creds.valid:
+                    from google.auth.transport.requests import Request
+
+                    # refreshing is a blocking request, so keep it off the event loop
+                    await asyncio.get_running_loop().run_in_executor(None, creds.refresh, Request())
+
+        headers = {}
+        creds.apply(headers)
+        return headers
+
+    async def send(self, method, path, params=None, body=None):
+        """
+        Sends a single attempt of a request to a Drive endpoint, without retrying it.
+
+        :param method: string HTTP method.
+        :param path: string path of the endpoint, relative to base_url.
+        :param params: optional dict of query parameters.
+        :param body: optional json-serializable request body.
+        :return: dict of the json response. empty if the response has no body.
+        :raises exception: googleapiclient HttpError, or ConnectionError for network errors, if the attempt failed.
+        """
+        import aiohttp
+
+        url = self.base_url + path
+
+        async def send_with(creds):
+            headers = await self.get_auth_headers(creds)
+            try:
+                async with self.session.request(method, url, params=params, json=body, headers=headers) as response:
+                    content = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # network errors are retried like the ones httplib2 raises
+                raise ConnectionError("{} {} failed: {!r}".format(method, url, error)) from error
+
+            if response.status >= 400:
+                raise get_http_error(response.status, response.headers, content, url)
+
+            return json.loads(content) if len(content) > 0 else {}
+
+        async def send_attempt():
+            if self.credential_pool is None:
+                return await send_with(self.creds)
+
+            # send each attempt with the least loaded credential in the pool, so retries move off throttled ones.
+            # it is released even if the attempt is cancelled, so it is never left counted as in flight
+            credential_index = self.credential_pool.acquire()
+            attempt_error = None
+            try:
+                return await send_with(self.credential_pool.credentials[credential_index])
+            except BaseException as error:
+                attempt_error = error
+                raise
+            finally:
+                self.credential_pool.release(credential_index, [attempt_error])
+
+        if self.concurrency_limiter is None:
+            return await send_attempt()
+
+        # time each attempt against the adaptive concurrency limit, which grows while attempts are fast and is
+        # cut when they are rate limited
+        limiter_started_at = await self.concurrency_limiter.acquire_async()
+        attempt_error = None
+        try:
+            return await send_attempt()
+        except BaseException as error:
+            attempt_error = error
+            raise
+        finally:
+            self.concurrency_limiter.release(limiter_started_at, [attempt_error])
+
+    async def request(self, method, path, operation, params=None, body=None, find_result=None):
+        """
+        Sends a request to a Drive endpoint, retrying it according to the retry policy.
+
+        :param method: string HTTP method.
+        :param path: string path of the endpoint, relative to base_url.
+        :param operation: string name of the operation, e.g. drive.files.copy, to record each attempt in the run
+            metrics under.
+        :param params: optional dict of query parameters.
+        :param body: optional json-serializable request body.
+        :param find_result: optional function that returns a coroutine that looks up whether the request took
+            effect, for requests that are not safe to repeat. see RetryPolicy.call.
+        :return: dict of the json response. empty if the response has no body.
+        :raises exception: googleapiclient HttpError, or ConnectionError for network errors, if every attempt failed.
+        """
+        async with self._semaphore:
+            return await self.retry_policy.call_async(lambda: self.send(method, path, params, body), operation,
+                                                      find_result=find_result)
+
+    async def copy_file(self, file_id, folder_id, file_name):
+        """
+        Copies a file into a folder (files.copy). If an attempt fails with a network error, the folder is checked for
+        the copy before it is sent again, since Drive may have created it before the connection dropped.
+
+        :param file_id: string id of original file to copy.
+        :param folder_id: string id of folder to copy file to.
+        :param file_name: string name for newly copied file.
+        :return: dict of the copied file's id and name.
+        """
+        async def find_copy():
+            # rate limited and timed like every request, but only retried along with the copy
+            await rate_limit.acquire_async("drive.files.list")
+            with metrics.timed("drive.files.list"):
+                response = await self.send("GET", "/files", params={"q": get_file_name_query(folder_id, file_name),
+                                                                    "fields": "files({})".format(COPY_FIELDS),
+                                                                    "pageSize": 1})
+            found_files = response.get("files", [])
+            return found_files[0] if len(found_files) > 0 else None
+
+        return await self.request("POST", "/files/{}/copy".format(file_id), "drive.files.copy",
+                                  params={"fields": COPY_FIELDS}, body={"name": file_name, "parents": [folder_id]},
+                                  find_result=find_copy)
+
+    async def list_folder_files(self, folder_id):
+        """
+        Lists every file in a folder (files.list), and indexes them by name. Trashed files are excluded.
+
+        :param folder_id: string id of folder to list.
+        :return: dict of file name to file id for every file in the folder. the first file seen with a name is kept.
+        """
+        folder_index = {}
+        duplicate_names = set()
+        params = {"q": "'{}' in parents and trashed = false".format(folder_id),
+                  "fields": "nextPageToken, files(id, name)",
+                  "pageSize": str(MAX_LIST_PAGE_SIZE)}
+
+        while True:
+            response = await self.request("GET", "/files", "drive.files.list", params=params)
+
+            for curr_file in response.get("files", []):
+                if curr_file["name"] in folder_index:
+                    duplicate_names.add(curr_file["name"])
+                else:
+                    folder_index[curr_file["name"]] = curr_file["id"]
+
+            if response.get("nextPageToken") is None:
+                break
+            params = dict(params, pageToken=response["nextPageToken"])
+
+        if len(duplicate_names) > 0:
+            print("The following file names are used by more than one file in folder {}: {}"
+                  .format(folder_id, sorted(duplicate_names)))
+
+        return folder_index
+
+    async def get_file(self, file_id, fields="id, name"):
+        """
+        Fetches the metadata of a file (files.get).
+
+        :param file_id: string id of file.
+        :param fields: string fields of the file to fetch.
+        :return: dict of the requested fields of the file.
+        """
+        return await self.request("GET", "/files/{}".format(file_id), "drive.files.get", params={"fields": fields})
+
+    async def create_permission(self, file_id, permission, send_notification_email=False):
+        """
+        Shares a file (permissions.create).
+
+        :param file_id: string id of file to share.
+        :param permission: dict of the permission to create, e.g. {"type": "user", "role": "writer",
+            "emailAddress": "someone@example.com"}.
+        :param send_notification_email: boolean true to email the people the file is shared with.
+        :return: dict of the created permission's id.
+        """
+        return await self.request("POST", "/files/{}/permissions".format(file_id), "drive.permissions.create",
+                                  params={"sendNotificationEmail": str(send_notification_email).lower(),
+                                          "fields": "id"},
+                                  body=permission)
+
+
+class AsyncDriveEngine:
+    """
+    Runs copy jobs with asyncio on the calling thread, instead of on a pool of worker threads with batch requests.
+    Each copy is its own request, and up to max_concurrency of them are in flight at once over one connection pool.
+    """
+
+    def __init__(self, creds, base_url=DRIVE_API_URL, trace_configs=None):
+        """
+        :param creds: credentials to authorize requests with, e.g. from helpers.get_gdrive_credentials.
+        :param base_url: string root of the Google Drive v3 REST endpoints.
+        :param trace_configs: optional list of aiohttp.TraceConfig to instrument every request with, e.g. to time
+            requests in benchmarks.
+        """
+        self.creds = creds
+        self.base_url = base_url
+        self.trace_configs = trace_configs
+
+    def run_copy_jobs(self, jobs, max_concurrency=DEFAULT_MAX_WORKERS, retry_policy=None, journal=None,
+                      skip_existing=False, credential_pool=None, concurrency_limiter=None):
+        """
+        Runs a list of copy jobs, blocking until every job has finished.
+        If a journal is given, every new copy is recorded to it within MAX_BATCH_SIZE copies of finishing.
+        If skip_existing is set, each destination folder is listed once and jobs whose file name already exists
+        in their folder are skipped.
+
+        :param jobs: list of CopyJob to run.
+        :param max_concurrency: int maximum number of requests in flight at once.
+        :param retry_policy: optional RetryPolicy to retry failed requests with. a default policy is used if not given.
+        :param journal: optional CopyJournal to record new copies to.
+        :param skip_existing: boolean true to skip jobs whose file name already exists in the destination folder.
+        :param credential_pool: optional CredentialPool to spread requests across, instead of the engine's credentials.
+        :param concurrency_limiter: optional AimdConcurrencyLimiter to adjust the number of requests in flight with, up
+            to max_concurrency.
+        :return: list of CopyResult, in the same order as jobs.
+        """
+        return asyncio.run(self.run_copy_jobs_async(jobs, max_concurrency, retry_policy, journal, skip_existing,
+                                                    credential_pool, concurrency_limiter))
+
+    async def run_copy_jobs_async(self, jobs, max_concurrency=DEFAULT_MAX_WORKERS, retry_policy=None, journal=None,
+                                  skip_existing=False, credential_pool=None, concurrency_limiter=None):
+        """
+        Runs a list of copy jobs inside a running event loop. See run_copy_jobs.
+
+        :return: list of CopyResult, in the same order as jobs.
+        """
+        import aiohttp
+
+        results = [None] * len(jobs)
+        pending_indices = list(range(len(jobs)))
+
+        # one connection pool for every request, sized to the number of requests in flight
+        connector = aiohttp.TCPConnector(limit=max_concurrency)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+                                         headers={"User-Agent": USER_AGENT},
+                                         trace_configs=self.trace_configs) as session:
+            client = AsyncDriveClient(session, self.creds, max_concurrency, retry_policy, self.base_url,
+                                      credential_pool, concurrency_limiter)
+
+            # list each destination folder once, concurrently, and fill in results for files that already exist
+            if skip_existing and len(jobs) > 0:
+                folder_ids = list(dict.fromkeys(job.folder_id for job in jobs))
+                folder_indexes = dict(zip(folder_ids, await asyncio.gather(
+                    *[client.list_folder_files(folder_id) for folder_id in folder_ids])))
+
+                pending_indices = []
+                for index, job in enumerate(jobs):
+                    existing_file_id = folder_indexes[job.folder_id].get(job.file_name)
+                    if existing_file_id is not None:
+                        results[index] = CopyResult(job, existing_file_id, None, "folder")
+                    else:
+                        pending_indices.append(index)
+
+            # copies not yet recorded in the journal. recorded in groups, rather than committing once per copy
+            unrecorded_copies = []
+
+            async def copy_job(index):
+                job = jobs[index]
+                try:
+                    copied_file = await client.copy_file(job.file_id, job.folder_id, job.file_name)
+                except (errors.HttpError,) + RETRYABLE_EXCEPTIONS as error:
+                    results[index] = CopyResult(job, None, error)
+                    return
+
+                results[index] = CopyResult(job, copied_file["id"], None)
+                if journal is not None:
+                    unrecorded_copies.append((job, copied_file["id"]))
+                    if len(unrecorded_copies) >= MAX_BATCH_SIZE:
+                        journal.record(unrecorded_copies)
+                        unrecorded_copies.clear()
+
+            try:
+                await asyncio.gather(*[copy_job(index) for index in pending_indices])
+            finally:
+                # record what finished even if the run was interrupted, so it is skipped when resumed
+                if journal is not None and len(unrecorded_copies) > 0:
+                    journal.record(unrecorded_copies)
+
+        return results
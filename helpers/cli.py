@@ -0,0 +1,128 @@
+"""
+This module includes command line argument parsing shared by the scripts.
+Parsing happens before any Google client library is imported, so --help and invalid arguments return immediately.
+"""
+
+import argparse
+
+from helpers.journal import DEFAULT_JOURNAL_PATH
+from helpers.archive import DEFAULT_ARCHIVE_PATH
+from helpers.metrics import DEFAULT_METRICS_PATH
+from helpers.rate_limit import DEFAULT_RATE_LIMIT_PATH
+from helpers.sharing import SHARE_ROLES, DEFAULT_SHARE_ROLE
+from copy_gdrive_file import DEFAULT_MAX_WORKERS, COPY_ENGINES, DEFAULT_COPY_ENGINE
+
+
+def add_studio_db_arguments(parser):
+    """
+    Adds the arguments needed to fetch the Studio Database to a parser.
+
+    :param parser: argparse.ArgumentParser to add arguments to.
+    :return: None
+    """
+    parser.add_argument("studio_db_url", help="url of Studio Database Google Spreadsheet")
+    parser.add_argument("sig_info_sheet_name", help="name of sheet where SIG information is stored")
+    parser.add_argument("proj_info_sheet_name", help="name of sheet where Project information is stored")
+    parser.add_argument("--refresh-studio-db", action="store_true",
+                        help="re-fetch the Studio Database even if a cached copy is current")
+
+
+def add_copy_arguments(parser):
+    """
+    Adds the arguments that control how files are copied to a parser.
+
+    :param parser: argparse.ArgumentParser to add arguments to.
+    :return: None
+    """
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="maximum number of files to copy concurrently (default: %(default)s)")
+    parser.add_argument("--engine", choices=COPY_ENGINES, default=DEFAULT_COPY_ENGINE,
+                        help="copy files on --workers threads with batch requests, or with asyncio on a single thread "
+                             "with up to --workers requests in flight, e.g. --engine async --workers 200 "
+                             "(default: %(default)s)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="adjust the number of files copied concurrently while copying, up to --workers: grow it "
+                             "while copies are fast, and halve it when Drive rate limits them")
+    parser.add_argument("--latency-target", type=float, default=None, metavar="SECONDS",
+                        help="seconds each copy may take for --adaptive to copy more files concurrently (default: "
+                             "twice the fastest copy seen)")
+    parser.add_argument("--credentials", nargs="+", metavar="PATH",
+                        help="spread copies across several credentials, each a service account key (.json) or a "
+                             "user's token file (e.g. token.pickle), which Drive rate limits separately. requests "
+                             "move away from credentials that are being rate limited (default: token.pickle)")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH,
+                        help="filepath of the copy journal used to resume interrupted runs (default: %(default)s)")
+    parser.add_argument("--plan", "--dry-run", dest="dry_run", action="store_true",
+                        help="print the files that would be created and the estimated API calls and runtime, "
+                             "without copying anything")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only create files for students and projects added since the last incremental run "
+                             "into the same folder, by comparing the Studio Database to a snapshot saved by that run")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_PATH,
+                        help="filepath of the archive the Studio Database and every created file are recorded to, "
+                             "for query_archive.py. an empty string disables the archive (default: %(default)s)")
+    parser.add_argument("--share", metavar="EMAIL_DIRECTORY",
+                        help="after copying, share each file with its students and SIG heads, in batch requests. "
+                             "EMAIL_DIRECTORY is a json file of each person's name to their email address, e.g. "
+                             "{\"Jane Doe\": \"jdoe@example.edu\"}, since the Studio Database only lists names")
+    parser.add_argument("--share-role", choices=SHARE_ROLES, default=DEFAULT_SHARE_ROLE,
+                        help="role --share gives each person (default: %(default)s)")
+    parser.add_argument("--notify", action="store_true",
+                        help="have Drive email each person a file is shared with by --share (default: no emails)")
+
+
+def add_write_links_arguments(parser):
+    """
+    Adds the argument to write links to copied files back into the Studio Database to a parser.
+
+    :param parser: argparse.ArgumentParser to add arguments to.
+    :return: None
+    """
+    parser.add_argument("--write-links", action="store_true",
+                        help="write the link to each copied Sprint Log or Research Canvas into its project's row of "
+                             "the project information sheet, in a single request")
+
+
+def add_rate_limit_arguments(parser):
+    """
+    Adds the argument that controls the rate limit shared with other scripts to a parser.
+
+    :param parser: argparse.ArgumentParser to add arguments to.
+    :return: None
+    """
+    parser.add_argument("--rate-limiter", default=DEFAULT_RATE_LIMIT_PATH,
+                        help="filepath of the token buckets Drive and Sheets calls are rate limited by, shared with "
+                             "every script using the same file so scripts run at the same time share the quota. an "
+                             "empty string disables rate limiting (default: %(default)s)")
+
+
+def add_metrics_arguments(parser):
+    """
+    Adds the arguments that control where run metrics are written to a parser.
+
+    :param parser: argparse.ArgumentParser to add arguments to.
+    :return: None
+    """
+    parser.add_argument("--metrics", default=DEFAULT_METRICS_PATH,
+                        help="filepath prefix to write API call metrics to at the end of the run, as PREFIX.json and "
+                             "PREFIX.prom. an empty string disables metrics (default: %(default)s)")
+
+
+def create_artifact_parser(description, artifact_name):
+    """
+    Creates a parser for scripts that copy a template for each student or project in the Studio Database.
+
+    :param description: string description of the script, shown by --help.
+    :param artifact_name: string name of the artifact the script creates, e.g. "Sprint Log".
+    :return: argparse.ArgumentParser for the script.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("template_url", help="url of the {} template to copy".format(artifact_name))
+    parser.add_argument("folder_url", help="url of the folder to copy each {} to".format(artifact_name))
+    parser.add_argument("quarter_name", help="name of the quarter to create files for, e.g. F2020")
+    add_studio_db_arguments(parser)
+    add_copy_arguments(parser)
+    add_rate_limit_arguments(parser)
+    add_metrics_arguments(parser)
+
+    return parser
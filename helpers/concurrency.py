@@ -0,0 +1,231 @@
+"""
+This module includes an adaptive limit on the number of copy requests in flight. It grows while requests succeed within
+a latency target, and is cut in half when Drive rate limits them (AIMD, like TCP congestion control), so a run settles
+near the most concurrency Drive will sustain instead of depending on a fixed number of workers.
+"""
+
+import time
+import threading
+from collections import deque, Counter
+
+from helpers.retry import is_rate_limit_error
+
+# requests allowed in flight when a run starts. runs start at half the maximum at most, so the limit has room to grow
+# even when the maximum is the default number of workers
+INITIAL_CONCURRENCY = 8
+
+# growth of the limit over each window of successful requests, once past slow start, and the factor it is cut by when
+# requests are rate limited
+ADDITIVE_INCREASE = 1.0
+MULTIPLICATIVE_DECREASE = 0.5
+
+# without a latency target, requests are within target if they take at most this many times the fastest one seen
+LATENCY_TOLERANCE = 2.0
+
+
+class AimdConcurrencyLimiter:
+    """
+    Limits the number of requests in flight, adjusting the limit from the outcome of each request:
+    - a request that succeeds within the latency target grows the limit. until the limit is first cut it grows by one
+      for each such request, doubling every window of requests (slow start), and after that by ADDITIVE_INCREASE
+      each window.
+    - a rate limited request cuts the limit by MULTIPLICATIVE_DECREASE, once for all requests sent before the cut,
+      since they were sent at the old limit.
+    - slower successful requests and other errors leave the limit as it is.
+    The limit counts requests in flight, not individual copies: with the threads engine, each request is a batch
+    request of up to MAX_BATCH_SIZE copies, and with the async engine, each request is a single copy.
+    Waits with acquire on threads, or acquire_async on an event loop. Thread-safe.
+    """
+
+    def __init__(self, max_concurrency, min_concurrency=1, initial_concurrency=INITIAL_CONCURRENCY,
+                 latency_target=None):
+        """
+        :param max_concurrency: int most requests allowed in flight.
+        :param min_concurrency: int fewest requests allowed in flight.
+        :param initial_concurrency: int requests allowed in flight to start with. capped at half of max_concurrency.
+        :param latency_target: optional float seconds each request may take for the limit to grow. for batch requests,
+            this is the time per request in the batch. LATENCY_TOLERANCE times the fastest request seen if not given.
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.initial_concurrency = max(self.min_concurrency, min(initial_concurrency, self.max_concurrency // 2))
+        self.latency_target = latency_target
+
+        # current limit. fractional, so additive increase can grow it by less than one request at a time
+        self.limit = float(self.initial_concurrency)
+        self.peak_limit = self.limit
+
+        # limit until which the limit grows by slow start, lowered to the limit at each cut
+        self._slow_start_threshold = float(self.max_concurrency)
+
+        self.in_flight = 0
+        self._fastest_latency = None
+        self._last_decrease_at = None
+
+        # requests, rate limited requests, and cuts, and when the first request was sent and the last one finished
+        self.counters = Counter()
+        self.started_at = None
+        self.finished_at = None
+
+        # threads wait on the condition. coroutines wait on a future each, woken in the order they started waiting
+        self._condition = threading.Condition()
+        self._async_waiters = deque()
+
+    def get_limit(self):
+        """
+        Retrieves the number of requests currently allowed in flight.
+
+        :return: int limit.
+        """
+        return max(self.min_concurrency, int(self.limit))
+
+    def acquire(self):
+        """
+        Waits until another request is allowed in flight, and counts it as in flight until it is released.
+
+        :return: float time.monotonic() value the request was allowed at, to pass to release.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < self.get_limit())
+            return self._start()
+
+    async def acquire_async(self):
+        """
+        Waits until another request is allowed in flight, like acquire, without blocking the event loop.
+
+        :return: float time.monotonic() value the request was allowed at, to pass to release.
+        """
+        import asyncio
+
+        with self._condition:
+            if self.in_flight < self.get_limit() and len(self._async_waiters) == 0:
+                return self._start()
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._async_waiters.append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # give back the slot if it was handed over just as the wait was cancelled
+            if waiter.done() and not waiter.cancelled():
+                with self._condition:
+                    self.in_flight -= 1
+                    self._wake()
+            raise
+
+        return waiter.result()
+
+    def release(self, started_at, request_errors):
+        """
+        Records the outcome of a request, adjusts the limit, and lets the next waiting request in.
+
+        :param started_at: float time.monotonic() value returned by acquire.
+        :param request_errors: list with the exception raised by each call in the request (one, or each call in a
+            batch request), or None for each one that succeeded.
+        :return: None
+        """
+        with self._condition:
+            now = time.monotonic()
+            self.in_flight -= 1
+            self.finished_at = now
+            self.counters["requests"] += len(request_errors)
+
+            throttled_count = len([error for error in request_errors
+                                   if error is not None and is_rate_limit_error(error)])
+            if throttled_count > 0:
+                self.counters["throttled"] += throttled_count
+                self._decrease(started_at, now)
+            elif all(error is None for error in request_errors):
+                self._increase((now - started_at) / max(1, len(request_errors)))
+
+            self._wake()
+
+    def _start(self):
+        """
+        Counts a request as in flight. Must be called with the lock held.
+
+        :return: float time.monotonic() value the request was allowed at.
+        """
+        now = time.monotonic()
+        self.in_flight += 1
+        if self.started_at is None:
+            self.started_at = now
+
+        return now
+
+    def _wake(self):
+        """
+        Lets waiting requests in, up to the limit. Must be called with the lock held.
+
+        :return: None
+        """
+        self._condition.notify_all()
+
+        while len(self._async_waiters) > 0 and self.in_flight < self.get_limit():
+            waiter = self._async_waiters.popleft()
+            if waiter.done():
+                continue
+
+            waiter.set_result(self._start())
+
+    def _increase(self, latency):
+        """
+        Grows the limit after a request succeeded, if it was within the latency target. Must be called with the lock
+        held.
+
+        :param latency: float seconds the request took, per call in it.
+        :return: None
+        """
+        if self._fastest_latency is None or latency < self._fastest_latency:
+            self._fastest_latency = latency
+
+        latency_target = self.latency_target if self.latency_target is not None else \
+            self._fastest_latency * LATENCY_TOLERANCE
+        if latency > latency_target:
+            return
+
+        # only grow while the limit is being used, so a run that sends few requests doesn't grow it forever
+        if self.in_flight + 1 < self.get_limit():
+            return
+
+        if self.limit < self._slow_start_threshold:
+            self.limit += 1
+        else:
+            self.limit += ADDITIVE_INCREASE / self.limit
+
+        self.limit = min(float(self.max_concurrency), self.limit)
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self, started_at, now):
+        """
+        Cuts the limit after a request was rate limited, unless it was sent before the last cut. Must be called with
+        the lock held.
+
+        :param started_at: float time.monotonic() value the request was sent at.
+        :param now: float time.monotonic() value.
+        :return: None
+        """
+        if self._last_decrease_at is not None and started_at < self._last_decrease_at:
+            return
+
+        self.limit = max(float(self.min_concurrency), self.limit * MULTIPLICATIVE_DECREASE)
+        self._slow_start_threshold = self.limit
+        self._last_decrease_at = now
+        self.counters["decreases"] += 1
+
+    def summary(self):
+        """
+        Formats the limit the run settled at and its throughput, for printing at the end of a run.
+
+        :return: string summary of the concurrency limit and throughput.
+        """
+        with self._condition:
+            elapsed_seconds = self.finished_at - self.started_at if self.started_at is not None else 0.0
+            return ("settled at {limit} requests in flight (started at {initial}, peaked at {peak}, cut {decreases} "
+                    "times for {throttled} rate limited calls), {requests} calls in {seconds:.1f} s "
+                    "({rate:.1f} calls/s)".format(
+                        limit=self.get_limit(), initial=self.initial_concurrency, peak=int(self.peak_limit),
+                        decreases=self.counters["decreases"], throttled=self.counters["throttled"],
+                        requests=self.counters["requests"], seconds=elapsed_seconds,
+                        rate=self.counters["requests"] / elapsed_seconds if elapsed_seconds > 0 else 0.0))
@@ -0,0 +1,176 @@
+"""
+This module includes a pool of Google Drive credentials that copies are spread across. Drive rate limits each user
+separately, so every credential added to the pool adds its own quota. Requests are routed away from credentials that
+have recently been rate limited.
+"""
+
+import time
+import threading
+from collections import deque, Counter
+
+import helpers.imports as helpers
+from helpers.retry import is_rate_limit_error, get_retry_after
+
+# seconds of recent requests each credential's share of rate limited requests is computed over
+THROTTLE_WINDOW_SECONDS = 60.0
+
+# least weight a rate limited credential keeps, so it still gets a trickle of requests and the pool notices when it
+# recovers
+MIN_CREDENTIAL_WEIGHT = 0.05
+
+# scope of credentials loaded from service account keys
+SERVICE_ACCOUNT_SCOPES = ["https://www.googleapis.com/auth/drive"]
+
+
+def load_credentials(credential_path):
+    """
+    Loads credentials for the Google Drive v3 API from a service account key (a .json file), or from a user's
+    tokens (any other file, like token.pickle), logging in to create them if the file does not exist yet.
+
+    :param credential_path: string filepath of the credentials.
+    :return: credentials object for the Google Drive v3 API.
+    """
+    if credential_path.endswith(".json"):
+        from google.oauth2 import service_account
+
+        return service_account.Credentials.from_service_account_file(credential_path, scopes=SERVICE_ACCOUNT_SCOPES)
+
+    return helpers.get_gdrive_credentials(credential_path)
+
+
+class CredentialPool:
+    """
+    Spreads Google Drive requests across several credentials. Each request goes to the credential with the least
+    in-flight requests for its weight, where a credential's weight is the share of its recent requests that were not
+    rate limited. Credentials a server asked to wait (Retry-After) get no requests until then, unless every
+    credential is waiting. Thread-safe.
+    """
+
+    def __init__(self, credentials, names=None, build_service=helpers.auth_gdrive):
+        """
+        :param credentials: list of credentials to spread requests across.
+        :param names: optional list of string names to report each credential by, e.g. its filepath.
+        :param build_service: function that takes credentials and returns a Google Drive v3 service object for the
+            calling thread.
+        :raises exception: exception if credentials is empty.
+        """
+        if len(credentials) == 0:
+            raise Exception("Invalid credential pool: expected at least one credential.")
+
+        self.credentials = list(credentials)
+        self.names = list(names) if names is not None else \
+            ["credential {}".format(index + 1) for index in range(len(credentials))]
+        self.build_service = build_service
+
+        # (time.monotonic(), rate limited) of each credential's requests in the last THROTTLE_WINDOW_SECONDS, and how
+        # many of them were rate limited
+        self._outcomes = [deque() for _ in self.credentials]
+        self._throttled_counts = [0] * len(self.credentials)
+
+        # requests sent and not yet released, and the time.monotonic() value each credential may be used again at
+        self._in_flight = [0] * len(self.credentials)
+        self._paused_until = [0.0] * len(self.credentials)
+
+        # requests and rate limited requests of each credential over the whole run, for the summary
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_files(cls, credential_paths, build_service=helpers.auth_gdrive):
+        """
+        Loads a pool from credential files. See load_credentials.
+
+        :param credential_paths: list of string filepaths of credentials.
+        :param build_service: function that takes credentials and returns a Google Drive v3 service object for the
+            calling thread.
+        :return: CredentialPool of the credentials, named by filepath.
+        """
+        return cls([load_credentials(credential_path) for credential_path in credential_paths],
+                   names=credential_paths, build_service=build_service)
+
+    def get_weight(self, index, now):
+        """
+        Computes the weight of a credential from the share of its recent requests that were rate limited.
+        Must be called with the lock held.
+
+        :param index: int index of credential.
+        :param now: float time.monotonic() value.
+        :return: float weight, from MIN_CREDENTIAL_WEIGHT to 1.
+        """
+        outcomes = self._outcomes[index]
+        while len(outcomes) > 0 and outcomes[0][0] < now - THROTTLE_WINDOW_SECONDS:
+            _, throttled = outcomes.popleft()
+            self._throttled_counts[index] -= throttled
+
+        if len(outcomes) == 0:
+            return 1.0
+
+        return max(MIN_CREDENTIAL_WEIGHT, 1.0 - self._throttled_counts[index] / len(outcomes))
+
+    def acquire(self, request_count=1):
+        """
+        Chooses the credential to send requests with, and counts them as in flight until they are released.
+
+        :param request_count: int number of requests that will be sent, e.g. the size of a batch request.
+        :return: int index of the chosen credential.
+        """
+        with self._lock:
+            now = time.monotonic()
+            indices = [index for index in range(len(self.credentials)) if self._paused_until[index] <= now] or \
+                list(range(len(self.credentials)))
+
+            # least weighted load wins. ties go to the credential that has sent the fewest requests, so requests are
+            # spread round-robin when nothing is in flight
+            index = min(indices, key=lambda curr_index: (
+                (self._in_flight[curr_index] + request_count) / self.get_weight(curr_index, now),
+                self.counters[(curr_index, "requests")]))
+
+            self._in_flight[index] += request_count
+            self.counters[(index, "requests")] += request_count
+            return index
+
+    def release(self, index, request_errors):
+        """
+        Records the outcome of requests sent with a credential, and counts them as no longer in flight.
+
+        :param index: int index of the credential the requests were sent with.
+        :param request_errors: list with the exception raised by each request, or None for each one that succeeded.
+        :return: None
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._in_flight[index] -= len(request_errors)
+
+            for error in request_errors:
+                throttled = error is not None and is_rate_limit_error(error)
+                self._outcomes[index].append((now, throttled))
+                if not throttled:
+                    continue
+
+                self._throttled_counts[index] += 1
+                self.counters[(index, "throttled")] += 1
+
+                # leave the credential alone for as long as the server asked
+                retry_after = get_retry_after(error)
+                if retry_after is not None:
+                    self._paused_until[index] = max(self._paused_until[index], now + retry_after)
+
+    def get_service(self, index):
+        """
+        Retrieves a Google Drive v3 service object for a credential, for the calling thread.
+
+        :param index: int index of credential.
+        :return: Service object with authentication for Google Drive v3 API.
+        """
+        return self.build_service(self.credentials[index])
+
+    def summary(self):
+        """
+        Formats the requests sent with each credential for printing at the end of a run.
+
+        :return: string summary of requests and rate limited requests by credential.
+        """
+        with self._lock:
+            return ", ".join("{name}: {requests} requests, {throttled} rate limited".format(
+                name=name, requests=self.counters[(index, "requests")], throttled=self.counters[(index, "throttled")])
+                for index, name in enumerate(self.names))
@@ -1,51 +1,188 @@
 """
 This module includes library functions that are useful for other scripts.
+Google client libraries are imported inside the functions that use them, since they take hundreds of milliseconds
+to import and many invocations (e.g. --help, or scripts that only use one API) never need all of them.
 """
 
 import pickle
 import os.path
 import re
+import json
+import threading
+from collections import OrderedDict
 
-import gspread
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import helpers.metrics as metrics
 
 # scopes for data access: https://developers.google.com/drive/api/v3/about-auth
 # if you modify these, delete token.pickle
 SCOPES = ['https://www.googleapis.com/auth/drive'
           'https://www.googleapis.com/auth/drive.appdata']
 
+# discovery document for the Google Drive v3 API, only fetched if the installed client library doesn't bundle it
+DRIVE_DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/drive/v3/rest"
 
-def auth_gdrive():
+# default file the user's Google Drive access and refresh tokens are stored in
+DEFAULT_TOKEN_PATH = "token.pickle"
+
+# timeout in seconds for each HTTP request made by a Google Drive service object
+HTTP_TIMEOUT = 60
+
+# Google APIs only gzip responses for clients whose user agent includes "gzip"
+USER_AGENT = "dtr-orchestration-scripts (gzip)"
+
+# Drive discovery document, loaded once per process
+_drive_discovery_document = None
+_drive_discovery_lock = threading.Lock()
+
+# credentials loaded by get_gdrive_credentials, by token filepath, and by auth_gdrive_service_account, loaded once
+# per process so every service built with them is reused rather than rebuilt for new credentials
+_gdrive_credentials = {}
+_service_account_credentials = None
+_credentials_lock = threading.Lock()
+
+# Drive service objects built by auth_gdrive for each thread, by credentials. each thread keeps the most recently used
+# MAX_THREAD_SERVICES, so credentials the caller builds and discards are not kept alive for the life of the thread
+MAX_THREAD_SERVICES = 32
+_thread_state = threading.local()
+
+
+def get_gdrive_credentials(token_path=DEFAULT_TOKEN_PATH):
     """
-    Authenticates client to use the Google Drive v3 API.
+    Loads (and refreshes, if needed) the user credentials used for the Google Drive v3 API.
+
+    Credentials are loaded once per process for each token file, and refreshed by the services that use them.
+
+    :param token_path: string filepath the user's tokens are stored in. created by logging in if it does not exist.
+    :return: google.oauth2 credentials object for the Google Drive v3 API.
+    """
+    with _credentials_lock:
+        token_key = os.path.abspath(token_path)
+        if token_key not in _gdrive_credentials:
+            _gdrive_credentials[token_key] = load_gdrive_credentials(token_path)
+
+        return _gdrive_credentials[token_key]
+
+
+def load_gdrive_credentials(token_path=DEFAULT_TOKEN_PATH):
+    """
+    Loads (and refreshes, if needed) the user credentials used for the Google Drive v3 API from a token file.
+
+    :param token_path: string filepath the user's tokens are stored in. created by logging in if it does not exist.
+    :return: google.oauth2 credentials object for the Google Drive v3 API.
+    """
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    # time loading credentials, which can include refreshing them or a browser login
+    with metrics.timed("auth.gdrive.credentials", "ok"):
+        # store credentials
+        creds = None
+
+        # the file token.pickle stores the user's access and refresh tokens, and is created automatically when the
+        # authorization flow completes for the first time.
+        if os.path.exists(token_path):
+            with open(token_path, 'rb') as token:
+                creds = pickle.load(token)
+
+        # if there are no (valid) credentials available, let the user log in.
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
+                creds = flow.run_local_server(port=0)
+
+            # Save the credentials for the next run
+            with open(token_path, 'wb') as token:
+                pickle.dump(creds, token)
+
+    return creds
+
+
+def get_drive_discovery_document():
+    """
+    Loads the Google Drive v3 discovery document once per process. Uses the copy bundled with
+    google-api-python-client 2.x when available, so building a service needs no network request.
+
+    :return: dict of the Google Drive v3 discovery document.
+    """
+    import httplib2
+    from googleapiclient import discovery_cache
+
+    global _drive_discovery_document
+
+    with _drive_discovery_lock:
+        if _drive_discovery_document is None:
+            get_static_doc = getattr(discovery_cache, "get_static_doc", None)
+            static_document = get_static_doc("drive", "v3") if get_static_doc is not None else None
+
+            # older client libraries don't bundle discovery documents, so fetch it instead
+            if static_document is None:
+                _, static_document = httplib2.Http(timeout=HTTP_TIMEOUT).request(DRIVE_DISCOVERY_URL)
 
+            _drive_discovery_document = json.loads(static_document)
+
+    return _drive_discovery_document
+
+
+def build_gdrive_service(creds):
+    """
+    Builds a new Google Drive v3 service object with its own HTTP connection, which is kept alive between
+    requests and asks for gzipped responses.
+
+    :param creds: credentials to build the service with.
     :return: Service object with authentication for Google Drive v3 API.
     """
-    # store credentials
-    creds = None
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.http import set_user_agent
+
+    with metrics.timed("auth.gdrive", "ok"):
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        http = set_user_agent(http, USER_AGENT)
 
-    # the file token.pickle stores the user's access and refresh tokens, and is created automatically when the
-    # authorization flow completes for the first time.
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
+        return build_from_document(get_drive_discovery_document(), http=http)
 
-    # if there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
 
-        # Save the credentials for the next run
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+def auth_gdrive(creds=None):
+    """
+    Authenticates client to use the Google Drive v3 API.
+    Service objects are reused for each set of credentials within a thread, since they are not thread-safe.
+
+    :param creds: optional credentials to build the service with. loaded from token.pickle if not given.
+    :return: Service object with authentication for Google Drive v3 API.
+    """
+    if creds is None:
+        creds = get_gdrive_credentials()
+
+    # reuse this thread's service for these credentials, if one was already built
+    services = _thread_state.__dict__.setdefault("services", OrderedDict())
+    if id(creds) not in services or services[id(creds)][0] is not creds:
+        services[id(creds)] = (creds, build_gdrive_service(creds))
+    services.move_to_end(id(creds))
+
+    # forget the least recently used services past the limit
+    while len(services) > MAX_THREAD_SERVICES:
+        services.popitem(last=False)
 
     # auth user and return the authentication service for other functions
-    return build('drive', 'v3', credentials=creds)
+    return services[id(creds)][1]
+
+
+def gdrive_service_factory(creds=None):
+    """
+    Creates a function that returns a Google Drive v3 service object for the thread that calls it.
+    Service objects are not thread-safe, so each worker thread gets its own, built once and then reused.
+    Credentials are loaded once and shared by every service the factory builds.
+
+    :param creds: optional credentials to build services with. loaded from token.pickle if not given.
+    :return: function that takes no arguments and returns a Google Drive v3 service object for the calling thread.
+    """
+    if creds is None:
+        creds = get_gdrive_credentials()
+
+    return lambda: auth_gdrive(creds)
 
 
 def auth_gsheets():
@@ -54,7 +191,31 @@ def auth_gsheets():
 
     :return: gspread authentication object.
     """
-    return gspread.service_account("service_account.json")
+    import gspread
+
+    with metrics.timed("auth.gsheets", "ok"):
+        return gspread.service_account("service_account.json")
+
+
+def auth_gdrive_service_account():
+    """
+    Authenticates client to read file metadata with the Google Drive v3 API, using the same service account as
+    auth_gsheets. Useful for checking whether a spreadsheet has changed without opening it.
+
+    :return: Service object with read-only metadata access for Google Drive v3 API.
+    """
+    global _service_account_credentials
+
+    from google.oauth2 import service_account
+
+    with _credentials_lock:
+        if _service_account_credentials is None:
+            with metrics.timed("auth.gdrive.service_account", "ok"):
+                _service_account_credentials = service_account.Credentials.from_service_account_file(
+                    "service_account.json", scopes=['https://www.googleapis.com/auth/drive.metadata.readonly'])
+
+    return auth_gdrive(_service_account_credentials)
+
 
 def get_file_id_from_url(file_url):
     """
@@ -0,0 +1,89 @@
+"""
+This module includes a local SQLite journal of completed file copies, so interrupted runs can be resumed without
+copying files that were already created.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+from urllib.parse import quote
+
+# default location of the copy journal, relative to the directory scripts are run from
+DEFAULT_JOURNAL_PATH = "copy_journal.db"
+
+
+class CopyJournal:
+    """
+    Records every completed copy, keyed by (template file id, destination folder id, file name).
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, journal_path=DEFAULT_JOURNAL_PATH, read_only=False):
+        """
+        :param journal_path: string filepath of the SQLite journal. created if it does not exist.
+        :param read_only: boolean true to only look up completed copies, e.g. for a dry run. the journal must exist,
+            and is never created or written to.
+        """
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+
+        if read_only:
+            self._connection = sqlite3.connect("file:{}?mode=ro".format(quote(journal_path)), uri=True,
+                                               check_same_thread=False)
+            return
+
+        self._connection = sqlite3.connect(journal_path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS copies (
+                template_id TEXT NOT NULL,
+                folder_id TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                copied_at TEXT NOT NULL,
+                PRIMARY KEY (template_id, folder_id, file_name)
+            )
+        """)
+        self._connection.commit()
+
+    def get_completed(self, jobs):
+        """
+        Looks up which copy jobs were already completed in a previous run.
+
+        :param jobs: list of CopyJob to look up.
+        :return: dict of CopyJob to copied file id, for each job that was already completed.
+        """
+        # fetch completed copies once for each template and folder pair
+        completed_file_ids = {}
+        with self._lock:
+            for template_id, folder_id in {(job.file_id, job.folder_id) for job in jobs}:
+                rows = self._connection.execute(
+                    "SELECT file_name, file_id FROM copies WHERE template_id = ? AND folder_id = ?",
+                    (template_id, folder_id))
+                for file_name, file_id in rows:
+                    completed_file_ids[(template_id, folder_id, file_name)] = file_id
+
+        return {job: completed_file_ids[tuple(job)] for job in jobs if tuple(job) in completed_file_ids}
+
+    def record(self, copied_files):
+        """
+        Records completed copies. Each call is committed immediately, so progress survives a crash.
+
+        :param copied_files: list of (CopyJob, copied file id) tuples.
+        :return: None
+        """
+        copied_at = datetime.now().isoformat()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO copies (template_id, folder_id, file_name, file_id, copied_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(job.file_id, job.folder_id, job.file_name, file_id, copied_at) for job, file_id in copied_files])
+            self._connection.commit()
+
+    def close(self):
+        """
+        Closes the connection to the journal.
+
+        :return: None
+        """
+        with self._lock:
+            self._connection.close()
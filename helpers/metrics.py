@@ -0,0 +1,264 @@
+"""
+This module includes instrumentation for the Google API calls, authentication, and parsing done during a run.
+It records call counts, HTTP statuses, retries, and latencies for each operation, and exports them at the end of a
+run as a JSON summary and a Prometheus text-format file.
+"""
+
+import json
+import math
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# default filepath prefix metrics are exported to, as <prefix>.json and <prefix>.prom
+DEFAULT_METRICS_PATH = "run_metrics"
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# prefix of every exported Prometheus metric name
+PROMETHEUS_PREFIX = "dtr"
+
+
+def get_status_label(error):
+    """
+    Labels a failed operation with its HTTP status, or the type of error if it was not an HTTP error.
+
+    :param error: exception raised by the operation.
+    :return: string status label, e.g. "429" or "ConnectionError".
+    """
+    # googleapiclient errors carry an httplib2 response, and gspread errors carry a requests response
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+
+    return str(status) if status is not None else type(error).__name__
+
+
+def get_percentile(values, percentile):
+    """
+    Computes a percentile with the nearest-rank method.
+
+    :param values: sorted list of numbers.
+    :param percentile: float percentile to compute, from 0 to 100.
+    :return: number at the percentile, or None if values is empty.
+    """
+    if len(values) == 0:
+        return None
+
+    return values[max(0, math.ceil(percentile / 100 * len(values)) - 1)]
+
+
+def format_labels(labels):
+    """
+    Formats labels for a Prometheus sample, e.g. {operation="drive.files.copy",status="200"}.
+
+    :param labels: list of (name, value) tuples.
+    :return: string labels.
+    """
+    escaped_labels = ['{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                      for name, value in labels]
+    return "{" + ",".join(escaped_labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    Records metrics for operations during a run. Operations are named by what they call, e.g. drive.files.copy,
+    sheets.values.batchGet, or auth.gsheets. Thread-safe.
+    """
+
+    def __init__(self):
+        # calls by (operation, status), retries by operation, and latencies of each call by operation
+        self.calls = Counter()
+        self.retries = Counter()
+        self.latencies = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def record_call(self, operation, status, seconds=None):
+        """
+        Records a call made by an operation.
+
+        :param operation: string name of operation.
+        :param status: string or int status of the call, e.g. 200, "429", or "ok" for calls that aren't HTTP requests.
+        :param seconds: optional float seconds the call took. calls inside a batch request have no latency of their
+            own, and are only counted.
+        :return: None
+        """
+        with self._lock:
+            self.calls[(operation, str(status))] += 1
+            if seconds is not None:
+                self.latencies.setdefault(operation, []).append(seconds)
+
+    def record_retry(self, operation, count=1):
+        """
+        Records that calls made by an operation failed and will be retried.
+
+        :param operation: string name of operation.
+        :param count: int number of calls that will be retried.
+        :return: None
+        """
+        with self._lock:
+            self.retries[operation] += count
+
+    @contextmanager
+    def timed(self, operation, success_status=200):
+        """
+        Times a call made by an operation, recording its status and latency when it finishes.
+
+        :param operation: string name of operation.
+        :param success_status: status to record if the call succeeds. 200 for HTTP requests, "ok" for anything else.
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        except Exception as error:
+            self.record_call(operation, get_status_label(error), time.perf_counter() - started_at)
+            raise
+
+        self.record_call(operation, success_status, time.perf_counter() - started_at)
+
+    def summary(self):
+        """
+        Summarizes the metrics recorded so far.
+
+        :return: dict with the duration of the run, and the calls, statuses, retries, and latency of each operation.
+        """
+        with self._lock:
+            operations = sorted({operation for operation, _ in self.calls} | set(self.retries))
+            output = {
+                "started_at": self.started_at,
+                "duration_seconds": time.time() - self.started_at,
+                "operations": {}
+            }
+
+            for operation in operations:
+                statuses = {status: count for (curr_operation, status), count in sorted(self.calls.items())
+                            if curr_operation == operation}
+                latencies = sorted(self.latencies.get(operation, []))
+
+                output["operations"][operation] = {
+                    "calls": sum(statuses.values()),
+                    "statuses": statuses,
+                    "retries": self.retries[operation],
+                    "latency_seconds": {
+                        "count": len(latencies),
+                        "sum": sum(latencies),
+                        "p50": get_percentile(latencies, 50),
+                        "p99": get_percentile(latencies, 99),
+                        "max": latencies[-1] if len(latencies) > 0 else None
+                    }
+                }
+
+        return output
+
+    def to_prometheus(self):
+        """
+        Formats the metrics recorded so far in the Prometheus text format.
+
+        :return: string of Prometheus metrics.
+        """
+        with self._lock:
+            lines = [
+                "# HELP {}_api_calls_total Calls made by each operation, by status.".format(PROMETHEUS_PREFIX),
+                "# TYPE {}_api_calls_total counter".format(PROMETHEUS_PREFIX)
+            ]
+            for (operation, status), count in sorted(self.calls.items()):
+                lines.append("{}_api_calls_total{} {}".format(
+                    PROMETHEUS_PREFIX, format_labels([("operation", operation), ("status", status)]), count))
+
+            lines.extend([
+                "# HELP {}_api_retries_total Failed calls retried by each operation.".format(PROMETHEUS_PREFIX),
+                "# TYPE {}_api_retries_total counter".format(PROMETHEUS_PREFIX)
+            ])
+            for operation, count in sorted(self.retries.items()):
+                lines.append("{}_api_retries_total{} {}".format(
+                    PROMETHEUS_PREFIX, format_labels([("operation", operation)]), count))
+
+            lines.extend([
+                "# HELP {}_api_call_duration_seconds Latency of calls made by each operation.".format(
+                    PROMETHEUS_PREFIX),
+                "# TYPE {}_api_call_duration_seconds histogram".format(PROMETHEUS_PREFIX)
+            ])
+            for operation, latencies in sorted(self.latencies.items()):
+                # histogram buckets are cumulative, ending with a bucket for every call
+                for bucket in LATENCY_BUCKETS + (math.inf,):
+                    bucket_label = "+Inf" if bucket == math.inf else repr(bucket)
+                    bucket_count = len([latency for latency in latencies if latency <= bucket])
+                    lines.append("{}_api_call_duration_seconds_bucket{} {}".format(
+                        PROMETHEUS_PREFIX, format_labels([("operation", operation), ("le", bucket_label)]),
+                        bucket_count))
+
+                operation_labels = format_labels([("operation", operation)])
+                lines.append("{}_api_call_duration_seconds_sum{} {}".format(PROMETHEUS_PREFIX, operation_labels,
+                                                                            sum(latencies)))
+                lines.append("{}_api_call_duration_seconds_count{} {}".format(PROMETHEUS_PREFIX, operation_labels,
+                                                                              len(latencies)))
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, path_prefix):
+        """
+        Writes the metrics recorded so far as a JSON summary and a Prometheus text-format file.
+
+        :param path_prefix: string filepath prefix to write <prefix>.json and <prefix>.prom to.
+        :return: None
+        """
+        with open(path_prefix + ".json", "w") as json_file:
+            json.dump(self.summary(), json_file, indent=4)
+
+        with open(path_prefix + ".prom", "w") as prometheus_file:
+            prometheus_file.write(self.to_prometheus())
+
+
+# metrics for the current run, shared by every module
+METRICS = MetricsRegistry()
+
+
+def timed(operation, success_status=200):
+    """
+    Times a call made by an operation, recording it in the metrics for the current run.
+
+    :param operation: string name of operation.
+    :param success_status: status to record if the call succeeds. 200 for HTTP requests, "ok" for anything else.
+    :return: context manager that times the call.
+    """
+    return METRICS.timed(operation, success_status)
+
+
+def record_call(operation, status, seconds=None):
+    """
+    Records a call made by an operation in the metrics for the current run.
+
+    :param operation: string name of operation.
+    :param status: string or int status of the call.
+    :param seconds: optional float seconds the call took.
+    :return: None
+    """
+    METRICS.record_call(operation, status, seconds)
+
+
+def record_retry(operation, count=1):
+    """
+    Records retried calls made by an operation in the metrics for the current run.
+
+    :param operation: string name of operation.
+    :param count: int number of calls that will be retried.
+    :return: None
+    """
+    METRICS.record_retry(operation, count)
+
+
+def export_metrics(path_prefix):
+    """
+    Writes the metrics for the current run as <prefix>.json and <prefix>.prom, and prints where they were written.
+
+    :param path_prefix: optional string filepath prefix. nothing is written if not given.
+    :return: None
+    """
+    if not path_prefix:
+        return
+
+    METRICS.export(path_prefix)
+    print("Run metrics written to {prefix}.json and {prefix}.prom".format(prefix=path_prefix))
@@ -0,0 +1,212 @@
+"""
+This module includes a rate limiter for Google API calls that is shared by every script running in the same working
+directory. Each API has a token bucket stored in a SQLite file, so scripts started at the same time draw from the same
+quota instead of each sending as fast as it can and all of them being rate limited. Drive rate limits each user
+separately, so each Drive credential has its own buckets.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+import helpers.metrics as metrics
+from helpers.imports import DEFAULT_TOKEN_PATH
+
+# default file the token buckets are stored in
+DEFAULT_RATE_LIMIT_PATH = "rate_limit.db"
+
+# Google Drive v3 queries allowed per minute per user, counting each request inside a batch request
+DRIVE_QUERIES_PER_MINUTE = 12000
+
+# Google Drive throttles sustained writes, including copies, to a few per second for each user
+DRIVE_WRITES_PER_SECOND = 3
+
+# Drive operations that count against the write throttle as well as the per-minute quota
+DRIVE_WRITE_OPERATIONS = {"drive.files.copy"}
+
+# Google Sheets v4 requests allowed per minute per user, for reads and for writes
+SHEETS_REQUESTS_PER_MINUTE = 60
+
+# requests allowed per second by each API's token bucket, and how many can be sent at once after a pause
+RateLimit = namedtuple("RateLimit", ["rate", "burst"])
+
+# token buckets by API, the prefix of an operation name (e.g. drive for drive.files.copy), and for Drive writes. Drive
+# requests and writes are spread evenly, with a burst of one second's worth. a run only makes a couple of Sheets
+# requests, so they can use a whole minute's quota at once
+RATE_LIMITS = {
+    "drive": RateLimit(DRIVE_QUERIES_PER_MINUTE / 60, DRIVE_QUERIES_PER_MINUTE / 60),
+    "drive.writes": RateLimit(DRIVE_WRITES_PER_SECOND, DRIVE_WRITES_PER_SECOND),
+    "sheets": RateLimit(SHEETS_REQUESTS_PER_MINUTE / 60, SHEETS_REQUESTS_PER_MINUTE)
+}
+
+# APIs whose buckets are kept for each credential, since they rate limit each user separately. Sheets is only used
+# with the service account
+PER_CREDENTIAL_APIS = {"drive"}
+
+# the rate limiter for this process, and the names of the Drive credentials it sends with, set by configure. calls
+# are not rate limited until then
+_rate_limiter = None
+_credential_names = [DEFAULT_TOKEN_PATH]
+
+
+class SharedRateLimiter:
+    """
+    Token buckets for Google API calls, stored in a SQLite file so every process using the same file shares them.
+    Calls reserve their tokens up front, and wait until the bucket has refilled enough to cover them, so calls from
+    every process are sent at the bucket's rate in the order they were made. Thread-safe.
+    """
+
+    def __init__(self, rate_limit_path=DEFAULT_RATE_LIMIT_PATH, rate_limits=None):
+        """
+        :param rate_limit_path: string filepath of the SQLite file the token buckets are stored in.
+        :param rate_limits: optional dict of API name to RateLimit. RATE_LIMITS is used if not given.
+        """
+        self.rate_limit_path = rate_limit_path
+        self.rate_limits = rate_limits if rate_limits is not None else RATE_LIMITS
+
+        # wait for other processes to finish taking tokens, rather than failing
+        self.conn = sqlite3.connect(rate_limit_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock:
+            # write-ahead logging without syncing keeps taking tokens fast. buckets are refilled from the clock, so
+            # losing the last few writes in a crash only lets a few extra calls through
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS buckets (
+                                     name TEXT PRIMARY KEY,
+                                     tokens REAL NOT NULL,
+                                     updated_at REAL NOT NULL
+                                 )""")
+
+    def reserve(self, limit_names, count=1, scopes=(None,)):
+        """
+        Takes tokens from the buckets of one or more rate limits, going into debt if there are not enough. If several
+        scopes are given, e.g. the credentials a run spreads requests across, each has its own buckets, and the
+        tokens are taken from the scope whose buckets can send soonest.
+
+        :param limit_names: list of string names of the rate limits the requests count against, keys of rate_limits.
+        :param count: int number of requests that will be sent.
+        :param scopes: list of string names of the scopes the requests can be sent in. None for buckets that are not
+            scoped.
+        :return: float seconds to wait before sending the requests.
+        """
+        with self._lock:
+            # lock the database for writing before reading, so no other process takes the same tokens
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # processes share the buckets, so they are refilled from the wall clock rather than time.monotonic()
+                now = time.time()
+                best_delay, best_buckets = None, None
+                for scope in scopes:
+                    scope_delay, scope_buckets = 0.0, []
+                    for limit_name in limit_names:
+                        rate_limit = self.rate_limits[limit_name]
+                        bucket_name = limit_name if scope is None else "{}:{}".format(limit_name, scope)
+                        row = self.conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?",
+                                                (bucket_name,)).fetchone()
+                        tokens, updated_at = row if row is not None else (rate_limit.burst, now)
+
+                        tokens = min(rate_limit.burst, tokens + max(0.0, now - updated_at) * rate_limit.rate) - count
+                        scope_delay = max(scope_delay, -tokens / rate_limit.rate)
+                        scope_buckets.append((bucket_name, tokens))
+
+                    if best_delay is None or scope_delay < best_delay:
+                        best_delay, best_buckets = scope_delay, scope_buckets
+
+                self.conn.executemany("INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                                      [(bucket_name, tokens, now) for bucket_name, tokens in best_buckets])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        return max(0.0, best_delay)
+
+    def close(self):
+        """
+        Closes the database connection.
+
+        :return: None
+        """
+        with self._lock:
+            self.conn.close()
+
+
+def configure(rate_limit_path=DEFAULT_RATE_LIMIT_PATH, credential_paths=None):
+    """
+    Rate limits every Google API call this process makes through the helpers, with token buckets shared by every
+    process that uses the same file. Drive calls are limited by the buckets of the credentials they can be sent with,
+    so a run that spreads requests across several credentials gets each one's quota, and shares each with other runs
+    that use it.
+
+    :param rate_limit_path: string filepath of the SQLite file the token buckets are stored in. empty to not rate
+        limit calls.
+    :param credential_paths: optional list of string filepaths of the Drive credentials calls are spread across.
+        the default token file is used if not given.
+    :return: None
+    """
+    global _rate_limiter, _credential_names
+
+    if _rate_limiter is not None:
+        _rate_limiter.close()
+
+    _rate_limiter = SharedRateLimiter(rate_limit_path) if rate_limit_path else None
+
+    # credentials are named by absolute filepath, so runs that name the same file differently share its buckets
+    _credential_names = [os.path.abspath(credential_path)
+                         for credential_path in (credential_paths or [DEFAULT_TOKEN_PATH])]
+
+
+def get_wait(operation, count):
+    """
+    Reserves tokens for calls of an operation from the shared rate limiter, and records how long they must wait.
+
+    :param operation: string name of the operation, e.g. drive.files.copy. its API is the part before the first dot.
+    :param count: int number of calls that will be made.
+    :return: float seconds to wait before making the calls.
+    """
+    api_name = operation.split(".", 1)[0]
+    if _rate_limiter is None or api_name not in _rate_limiter.rate_limits:
+        return 0.0
+
+    # Drive writes also count against the write throttle
+    limit_names = [api_name]
+    if operation in DRIVE_WRITE_OPERATIONS and "drive.writes" in _rate_limiter.rate_limits:
+        limit_names.append("drive.writes")
+
+    scopes = _credential_names if api_name in PER_CREDENTIAL_APIS else [None]
+    delay = _rate_limiter.reserve(limit_names, count, scopes)
+    metrics.record_call("rate_limit.{}".format(api_name), "ok", delay)
+    return delay
+
+
+def acquire(operation, count=1):
+    """
+    Waits until calls of an operation are within the shared rate limit. Returns immediately if the rate limiter has
+    not been configured, or the operation's API is not rate limited.
+
+    :param operation: string name of the operation, e.g. drive.files.copy or sheets.values.batchGet.
+    :param count: int number of calls that will be made, e.g. the size of a batch request.
+    :return: None
+    """
+    delay = get_wait(operation, count)
+    if delay > 0:
+        time.sleep(delay)
+
+
+async def acquire_async(operation, count=1):
+    """
+    Waits until calls of an operation are within the shared rate limit, like acquire, without blocking the event loop.
+
+    :param operation: string name of the operation, e.g. drive.files.copy.
+    :param count: int number of calls that will be made.
+    :return: None
+    """
+    import asyncio
+
+    delay = get_wait(operation, count)
+    if delay > 0:
+        await asyncio.sleep(delay)
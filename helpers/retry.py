@@ -0,0 +1,290 @@
+"""
+This module includes a retry policy for Google API requests that fail due to rate limits or server errors.
+"""
+
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+
+import helpers.metrics as metrics
+import helpers.rate_limit as rate_limit
+
+# HTTP statuses that are always worth retrying: rate limited, or a transient server error
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# reasons Google Drive gives for a 403 that is a rate limit rather than a permission problem
+RETRYABLE_403_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "sharingRateLimitExceeded"}
+
+# network errors that are worth retrying
+RETRYABLE_EXCEPTIONS = (ConnectionError, TimeoutError, socket.timeout)
+
+
+def get_error_status(error):
+    """
+    Retrieves the HTTP status code for an error raised by a Google API request.
+
+    :param error: exception raised by a request.
+    :return: int HTTP status code, or None if error is not an HTTP error.
+    """
+    from googleapiclient import errors
+
+    if isinstance(error, errors.HttpError) and error.resp is not None:
+        return int(error.resp.status)
+
+    return None
+
+
+def get_error_reasons(error):
+    """
+    Retrieves the reasons listed in the body of a Google API error response (e.g. rateLimitExceeded).
+
+    :param error: googleapiclient HttpError.
+    :return: set of string reasons. empty if none could be parsed.
+    """
+    try:
+        content = error.content.decode("utf-8") if isinstance(error.content, bytes) else error.content
+        error_body = json.loads(content)["error"]
+    except (AttributeError, TypeError, ValueError, KeyError):
+        return set()
+
+    return {curr_error.get("reason") for curr_error in error_body.get("errors", [])} - {None}
+
+
+def is_rate_limit_error(error):
+    """
+    Classifies an error raised by a Google API request as a rate limit: a 429, or a 403 whose reason is a rate limit
+    rather than a permission problem.
+
+    :param error: exception raised by a request.
+    :return: boolean true if the request was rate limited.
+    """
+    status = get_error_status(error)
+    if status == 429:
+        return True
+    if status == 403:
+        return len(get_error_reasons(error) & RETRYABLE_403_REASONS) > 0
+
+    return False
+
+
+def is_retryable_error(error):
+    """
+    Classifies an error raised by a Google API request as retryable (rate limits, server errors, network errors)
+    or fatal (anything else, such as a missing file or a permission error).
+
+    :param error: exception raised by a request.
+    :return: boolean true if the request should be retried.
+    """
+    if isinstance(error, RETRYABLE_EXCEPTIONS):
+        return True
+
+    return get_error_status(error) in RETRYABLE_STATUSES or is_rate_limit_error(error)
+
+
+def get_retry_after(error):
+    """
+    Retrieves the number of seconds a server asked clients to wait through a Retry-After header.
+
+    :param error: exception raised by a request.
+    :return: float number of seconds to wait, or None if the error has no Retry-After header.
+    """
+    resp = getattr(error, "resp", None)
+    if resp is None or resp.get("retry-after") is None:
+        return None
+
+    from email.utils import parsedate_to_datetime
+
+    # Retry-After is either a number of seconds or an HTTP date
+    retry_after = resp.get("retry-after")
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Retries failed requests with jittered exponential backoff, up to a maximum number of attempts and a total
+    time budget per request. Counters are shared by every request made with the policy and are thread-safe.
+    """
+
+    def __init__(self, max_attempts=6, base_delay=1.0, max_delay=64.0, time_budget=300.0):
+        """
+        :param max_attempts: int maximum number of times to send a request, including the first attempt.
+        :param base_delay: float seconds to wait before the first retry. doubles with each attempt.
+        :param max_delay: float maximum seconds to wait between attempts, unless a server asks for longer.
+        :param time_budget: float maximum seconds to spend on a single request, including waits between attempts.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.time_budget = time_budget
+
+        # counts of attempts, retries, successes, and failures for all requests made with this policy
+        self.counters = Counter()
+        self._counters_lock = threading.Lock()
+
+    def record(self, counter_name, count=1):
+        """
+        Increments a counter for requests made with this policy.
+
+        :param counter_name: string name of counter to increment.
+        :param count: int amount to increment counter by.
+        :return: None
+        """
+        with self._counters_lock:
+            self.counters[counter_name] += count
+
+    def get_delay(self, attempt, error=None):
+        """
+        Computes how long to wait before the next attempt, honoring any Retry-After header in the error.
+
+        :param attempt: int number of attempts already made.
+        :param error: optional exception raised by the last attempt.
+        :return: float seconds to wait.
+        """
+        # full jitter spreads out retries from concurrent workers that were throttled at the same time
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return delay
+
+    def should_retry(self, error, attempt, started_at, delay=0.0, operation=None):
+        """
+        Determines whether a failed request should be retried, recording why if it should not be.
+
+        :param error: exception raised by the last attempt.
+        :param attempt: int number of attempts already made.
+        :param started_at: float time.monotonic() value when the first attempt was made.
+        :param delay: float seconds that will be waited before the next attempt.
+        :param operation: optional string name of the operation, to record retries in the run metrics under.
+        :return: boolean true if the request should be retried.
+        """
+        if not is_retryable_error(error):
+            self.record("fatal")
+            return False
+
+        if attempt >= self.max_attempts or time.monotonic() - started_at + delay > self.time_budget:
+            self.record("exhausted")
+            return False
+
+        self.record("retries")
+        if operation is not None:
+            metrics.record_retry(operation)
+        return True
+
+    def call(self, request_func, operation=None, find_result=None):
+        """
+        Calls request_func until it succeeds or should no longer be retried. If an operation is given, each attempt
+        first waits for the shared rate limit.
+
+        :param request_func: function that takes no arguments and sends a request, raising an exception on failure.
+        :param operation: optional string name of the operation, e.g. drive.files.copy, to record each attempt in the
+            run metrics under.
+        :param find_result: optional function that takes no arguments and looks up whether the request took effect,
+            returning its result, or None if it did not. once an attempt fails with a network error, every later
+            attempt calls it first, and only sends the request again if it returns None, so requests that are not
+            safe to repeat, e.g. copies, are not repeated if the server got them before the connection dropped.
+        :return: result of request_func, or of find_result.
+        :raises exception: the last exception raised by request_func or find_result if every attempt failed.
+        """
+        from googleapiclient import errors
+
+        started_at = time.monotonic()
+        attempt = 0
+        network_failed = False
+
+        while True:
+            attempt += 1
+            self.record("attempts")
+
+            try:
+                found_result = find_result() if network_failed and find_result is not None else None
+                if found_result is not None:
+                    result = found_result
+                elif operation is not None:
+                    rate_limit.acquire(operation)
+                    with metrics.timed(operation):
+                        result = request_func()
+                else:
+                    result = request_func()
+            except (errors.HttpError,) + RETRYABLE_EXCEPTIONS as error:
+                network_failed = network_failed or isinstance(error, RETRYABLE_EXCEPTIONS)
+                delay = self.get_delay(attempt, error)
+                if not self.should_retry(error, attempt, started_at, delay, operation):
+                    raise
+                time.sleep(delay)
+                continue
+
+            self.record("succeeded")
+            return result
+
+    async def call_async(self, request_coroutine_func, operation=None, find_result=None):
+        """
+        Awaits request_coroutine_func until it succeeds or should no longer be retried, like call, but waits between
+        attempts without blocking the event loop.
+
+        :param request_coroutine_func: function that takes no arguments and returns a coroutine that sends a request,
+            raising an exception on failure.
+        :param operation: optional string name of the operation, e.g. drive.files.copy, to record each attempt in the
+            run metrics under.
+        :param find_result: optional function that takes no arguments and returns a coroutine that looks up whether
+            the request took effect. see call.
+        :return: result of the coroutine, or of find_result.
+        :raises exception: the last exception raised by the coroutines if every attempt failed.
+        """
+        import asyncio
+        from googleapiclient import errors
+
+        started_at = time.monotonic()
+        attempt = 0
+        network_failed = False
+
+        while True:
+            attempt += 1
+            self.record("attempts")
+
+            try:
+                found_result = await find_result() if network_failed and find_result is not None else None
+                if found_result is not None:
+                    result = found_result
+                elif operation is not None:
+                    await rate_limit.acquire_async(operation)
+                    with metrics.timed(operation):
+                        result = await request_coroutine_func()
+                else:
+                    result = await request_coroutine_func()
+            except (errors.HttpError,) + RETRYABLE_EXCEPTIONS as error:
+                network_failed = network_failed or isinstance(error, RETRYABLE_EXCEPTIONS)
+                delay = self.get_delay(attempt, error)
+                if not self.should_retry(error, attempt, started_at, delay, operation):
+                    raise
+                await asyncio.sleep(delay)
+                continue
+
+            self.record("succeeded")
+            return result
+
+    def summary(self):
+        """
+        Formats the counters for this policy for printing at the end of a run.
+
+        :return: string summary of attempts, retries, and failures.
+        """
+        with self._counters_lock:
+            return ("{attempts} requests sent, {retries} retried, {succeeded} succeeded, "
+                    "{exhausted} failed after retrying, {fatal} failed with a non-retryable error"
+                    .format(attempts=self.counters["attempts"], retries=self.counters["retries"],
+                            succeeded=self.counters["succeeded"], exhausted=self.counters["exhausted"],
+                            fatal=self.counters["fatal"]))
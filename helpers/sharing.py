@@ -0,0 +1,164 @@
+"""
+This module includes sharing generated files with the people they are for. Every (file, person) pair is one
+permissions.create call, and calls are sent in Drive batch requests, so a whole cohort is shared with a few requests
+instead of one request (or a few clicks) per person.
+"""
+
+import json
+import threading
+from collections import namedtuple, Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.retry import RetryPolicy
+from copy_gdrive_file import execute_batch_calls, MAX_BATCH_SIZE, DEFAULT_MAX_WORKERS
+
+# roles files can be shared with. students fill in their own files, so they can edit them by default
+SHARE_ROLES = ["reader", "commenter", "writer"]
+DEFAULT_SHARE_ROLE = "writer"
+
+# only fetch the id of created permissions, to keep responses small
+PERMISSION_FIELDS = "id"
+
+# a single permission to create: id of the file to share, email address to share it with, and the role to give
+ShareGrant = namedtuple("ShareGrant", ["file_id", "email_address", "role"])
+
+# outcome of a grant: the grant, id of the created permission (None if failed), and error (None if successful)
+ShareResult = namedtuple("ShareResult", ["grant", "permission_id", "error"])
+
+# how generated files are shared: dict of each person's name to their email address (see load_email_directory), the
+# role they are given, and whether Drive emails them about it
+ShareSettings = namedtuple("ShareSettings", ["email_directory", "role", "send_notification_email"])
+
+
+def load_email_directory(directory_path):
+    """
+    Loads the email address of each person files can be shared with. The Studio Database only lists names, so the
+    directory is a json object of name to email address, e.g. {"Jane Doe": "jdoe@example.edu"}.
+
+    :param directory_path: string filepath of email directory json.
+    :return: dict of name to email address.
+    :raises exception: exception if the directory is not a json object of names to email addresses.
+    """
+    with open(directory_path, "r") as directory_file:
+        directory = json.load(directory_file)
+
+    if not isinstance(directory, dict) or not all(isinstance(email_address, str) and "@" in email_address
+                                                  for email_address in directory.values()):
+        raise Exception("Invalid email directory {}: expected a json object of names to email addresses."
+                        .format(directory_path))
+
+    return {name: email_address.strip() for name, email_address in directory.items()}
+
+
+def get_share_rounds(grants):
+    """
+    Splits grants into rounds that share each file at most once. Drive only applies the last of several concurrent
+    permission changes to the same file, so each round is sent after the previous one has finished.
+
+    :param grants: list of ShareGrant.
+    :return: list of lists of positions in grants, one list per round.
+    """
+    share_rounds = []
+    file_grant_counts = Counter()
+    for index, grant in enumerate(grants):
+        round_number = file_grant_counts[grant.file_id]
+        file_grant_counts[grant.file_id] += 1
+
+        if round_number == len(share_rounds):
+            share_rounds.append([])
+        share_rounds[round_number].append(index)
+
+    return share_rounds
+
+
+def create_permissions_request(service, grants, batch_size=MAX_BATCH_SIZE, retry_policy=None,
+                               send_notification_email=False):
+    """
+    Creates and executes batch requests to create a permission for each grant.
+    Permissions are sent and retried with copy_gdrive_file.execute_batch_calls.
+
+    :param service: Google Drive v3 authentication object.
+    :param grants: list of ShareGrant to create permissions for.
+    :param batch_size: int maximum number of permission requests to send in a single batch request.
+    :param retry_policy: optional RetryPolicy to retry failed requests with. a default policy is used if not given.
+    :param send_notification_email: boolean true to have Drive email each person that a file was shared with them.
+    :return: tuple of (dict of position in grants to created permission id, dict of position in grants to error).
+    """
+    def create_permission_call(batch_service, index):
+        permission_request_body = {
+            'type': 'user',
+            'role': grants[index].role,
+            'emailAddress': grants[index].email_address
+        }
+        return batch_service.permissions().create(fileId=grants[index].file_id, body=permission_request_body,
+                                                  sendNotificationEmail=send_notification_email,
+                                                  fields=PERMISSION_FIELDS)
+
+    permissions, share_errors = execute_batch_calls(service, create_permission_call, len(grants),
+                                                    "drive.permissions.create", batch_size=batch_size,
+                                                    retry_policy=retry_policy)
+
+    return {index: permission["id"] for index, permission in permissions.items()}, share_errors
+
+
+def share_files(grants, service_factory, max_workers=DEFAULT_MAX_WORKERS, batch_size=MAX_BATCH_SIZE,
+                retry_policy=None, send_notification_email=False):
+    """
+    Creates a permission for every grant on a pool of worker threads, using batch requests within each worker.
+    Grants are sent in rounds that share each file at most once (see get_share_rounds), so a file is never shared
+    with two people at the same time.
+
+    :param grants: list of ShareGrant to create permissions for.
+    :param service_factory: function that returns a new Google Drive v3 service object. called once per worker.
+    :param max_workers: int maximum number of worker threads.
+    :param batch_size: int maximum number of permission requests to send in a single batch request.
+    :param retry_policy: optional RetryPolicy shared by all workers. a default policy is used if not given.
+    :param send_notification_email: boolean true to have Drive email each person that a file was shared with them.
+    :return: list of ShareResult, in the same order as grants.
+    """
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
+    # each worker thread builds and reuses its own service, since service objects are not thread-safe
+    thread_state = threading.local()
+
+    def run_batch(grant_indices):
+        if not hasattr(thread_state, "service"):
+            thread_state.service = service_factory()
+
+        permission_ids, share_errors = create_permissions_request(thread_state.service,
+                                                                  [grants[index] for index in grant_indices],
+                                                                  batch_size, retry_policy, send_notification_email)
+        return [ShareResult(grants[index], permission_ids.get(position), share_errors.get(position))
+                for position, index in enumerate(grant_indices)]
+
+    # run the batches of each round concurrently, then put results back in grant order
+    results = [None] * len(grants)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for round_indices in get_share_rounds(grants):
+            batches = [round_indices[batch_start:batch_start + batch_size]
+                       for batch_start in range(0, len(round_indices), batch_size)]
+            for grant_indices, batch_results in zip(batches, executor.map(run_batch, batches)):
+                for index, result in zip(grant_indices, batch_results):
+                    results[index] = result
+
+    return results
+
+
+def report_share_results(share_results, retry_policy):
+    """
+    Prints any permissions that could not be created, and a summary of the Drive requests made.
+
+    :param share_results: list of ShareResult from share_files.
+    :param retry_policy: RetryPolicy the grants were sent with.
+    :return: None
+    """
+    for result in share_results:
+        if result.error is not None:
+            print('An error occurred sharing {} with {}: {}'.format(result.grant.file_id, result.grant.email_address,
+                                                                  result.error))
+
+    created_results = [result for result in share_results if result.error is None]
+    print('Shared {files} files with {permissions} permissions'.format(
+        files=len({result.grant.file_id for result in created_results}), permissions=len(created_results)))
+    print('Drive sharing requests: {}'.format(retry_policy.summary()))
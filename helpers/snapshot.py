@@ -0,0 +1,197 @@
+"""
+This module includes snapshots of the Studio Database each artifact was last generated from, and a structural diff
+between two Studio Databases, so mid-quarter runs only generate files for students and projects added since.
+"""
+
+import os
+import json
+from collections import namedtuple
+
+# default location of the snapshots, relative to the directory scripts are run from
+DEFAULT_SNAPSHOT_PATH = "studio_db_snapshots.json"
+
+# a project that disappeared is treated as renamed to a new project in the same SIG if they share at least this
+# fraction of their combined students
+RENAMED_PROJECT_OVERLAP = 0.5
+
+# changes between two Studio Databases, each a dict of SIG name to a list of student names, project names, or
+# (old project name, new project name) tuples for renamed projects
+StudioDbDiff = namedtuple("StudioDbDiff", ["new_students", "removed_students", "new_projects", "renamed_projects",
+                                           "removed_projects"])
+
+
+def get_snapshot_key(artifact_type, template_id, folder_id):
+    """
+    Generates the key of the snapshot for an artifact, so runs that copy the same template into the same folder share
+    a snapshot.
+
+    :param artifact_type: string artifact type.
+    :param template_id: string id of the template copied.
+    :param folder_id: string id of the folder files are copied to.
+    :return: string snapshot key.
+    """
+    return "{}/{}/{}".format(artifact_type, template_id, folder_id)
+
+
+def get_project_students(sig_info):
+    """
+    Lists the students on each project in a SIG, ignoring blank student names.
+
+    :param sig_info: dict of SIG information from a studio database dict.
+    :return: dict of project name to set of student names.
+    """
+    return {proj["project_name"]: {student.strip() for student in proj["students"] if student.strip() != ""}
+            for proj in sig_info["projects"]}
+
+
+def diff_studio_db(old_studio_db_dict, new_studio_db_dict):
+    """
+    Computes the students and projects added to, removed from, or renamed in each SIG between two Studio Databases.
+    A project is renamed if a project disappeared from its SIG and a new project shares most of its students.
+
+    :param old_studio_db_dict: dict of each SIG with all student and project information, from the last run.
+    :param new_studio_db_dict: dict of each SIG with all student and project information, from this run.
+    :return: StudioDbDiff of the changes.
+    """
+    diff = StudioDbDiff({}, {}, {}, {}, {})
+    empty_sig = {"students": [], "projects": []}
+
+    for sig_name in dict.fromkeys(list(new_studio_db_dict) + list(old_studio_db_dict)):
+        old_sig = old_studio_db_dict.get(sig_name, empty_sig)
+        new_sig = new_studio_db_dict.get(sig_name, empty_sig)
+
+        # compare students by name, keeping the order of the Studio Database
+        old_students = set(old_sig["students"])
+        new_students = set(new_sig["students"])
+        added_students = [student for student in dict.fromkeys(new_sig["students"]) if student not in old_students]
+        removed_students = [student for student in dict.fromkeys(old_sig["students"]) if student not in new_students]
+
+        # compare projects by name, then match projects that disappeared to new projects with the same students
+        old_projects = get_project_students(old_sig)
+        new_projects = get_project_students(new_sig)
+        added_projects = [proj_name for proj_name in new_projects if proj_name not in old_projects]
+        removed_projects = [proj_name for proj_name in old_projects if proj_name not in new_projects]
+
+        renamed_projects = []
+        for proj_name in list(added_projects):
+            best_match, best_overlap = None, 0.0
+            for old_proj_name in removed_projects:
+                all_students = old_projects[old_proj_name] | new_projects[proj_name]
+                overlap = len(old_projects[old_proj_name] & new_projects[proj_name]) / max(len(all_students), 1)
+                if overlap > best_overlap:
+                    best_match, best_overlap = old_proj_name, overlap
+
+            if best_match is not None and best_overlap >= RENAMED_PROJECT_OVERLAP:
+                renamed_projects.append((best_match, proj_name))
+                added_projects.remove(proj_name)
+                removed_projects.remove(best_match)
+
+        # only record SIGs that changed
+        for field, changes in [("new_students", added_students), ("removed_students", removed_students),
+                               ("new_projects", added_projects), ("renamed_projects", renamed_projects),
+                               ("removed_projects", removed_projects)]:
+            if len(changes) > 0:
+                getattr(diff, field)[sig_name] = changes
+
+    return diff
+
+
+def get_delta_studio_db(studio_db_dict, diff):
+    """
+    Creates a studio database dict with only the students and projects added or renamed since the last run, so
+    artifacts are only generated for them.
+
+    :param studio_db_dict: dict of each SIG with all student and project information, from this run.
+    :param diff: StudioDbDiff from the last run to this run.
+    :return: dict in the same format as a studio database dict. SIGs without new students or projects are left out.
+    """
+    output = {}
+    for sig_name, sig_info in studio_db_dict.items():
+        new_students = diff.new_students.get(sig_name, [])
+        new_project_names = set(diff.new_projects.get(sig_name, [])) | \
+            {new_name for _, new_name in diff.renamed_projects.get(sig_name, [])}
+        if len(new_students) == 0 and len(new_project_names) == 0:
+            continue
+
+        output[sig_name] = dict(sig_info,
+                                students=new_students,
+                                projects=[proj for proj in sig_info["projects"]
+                                          if proj["project_name"] in new_project_names])
+
+    return output
+
+
+def print_diff(display_name, diff):
+    """
+    Prints the changes to the Studio Database since an artifact was last generated.
+
+    :param display_name: string display name of the artifact.
+    :param diff: StudioDbDiff from the last run to this run.
+    :return: None
+    """
+    changes = [
+        ("new students", diff.new_students),
+        ("new projects", diff.new_projects),
+        ("renamed projects", {sig_name: ["{} -> {}".format(*names) for names in renamed]
+                              for sig_name, renamed in diff.renamed_projects.items()}),
+        ("removed students", diff.removed_students),
+        ("removed projects", diff.removed_projects)
+    ]
+
+    if all(len(sig_changes) == 0 for _, sig_changes in changes):
+        print("{}: no changes to the Studio Database since the last run.".format(display_name))
+        return
+
+    print("{}: changes to the Studio Database since the last run:".format(display_name))
+    for change_name, sig_changes in changes:
+        for sig_name, names in sig_changes.items():
+            print("    {change} in {sig}: {names}".format(change=change_name, sig=sig_name or "(no SIG)",
+                                                          names=", ".join(names)))
+
+    # files are never deleted or renamed, so removed students and projects keep their files
+    if len(diff.removed_students) > 0 or len(diff.removed_projects) > 0 or len(diff.renamed_projects) > 0:
+        print("    Files for removed or renamed students and projects are left as they are.")
+
+
+class StudioDbSnapshots:
+    """
+    The Studio Database each artifact was last generated from, keyed by get_snapshot_key and saved as json.
+    """
+
+    def __init__(self, snapshot_path=DEFAULT_SNAPSHOT_PATH):
+        """
+        :param snapshot_path: string filepath of the snapshots. created when a snapshot is first recorded.
+        """
+        self.snapshot_path = snapshot_path
+        self.snapshots = {}
+
+        if os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path, "r") as snapshot_file:
+                    self.snapshots = json.load(snapshot_file)
+            except (OSError, ValueError) as error:
+                print("Could not read Studio Database snapshots at {}, ignoring them: {}".format(snapshot_path, error))
+
+    def get(self, key):
+        """
+        Looks up the Studio Database an artifact was last generated from.
+
+        :param key: string snapshot key from get_snapshot_key.
+        :return: dict of each SIG with all student and project information, or None if there is no snapshot.
+        """
+        return self.snapshots.get(key)
+
+    def record(self, studio_db_dicts):
+        """
+        Records the Studio Database artifacts were generated from. The snapshots are replaced atomically, so an
+        interrupted write can't corrupt them.
+
+        :param studio_db_dicts: dict of snapshot key to studio database dict.
+        :return: None
+        """
+        self.snapshots.update(studio_db_dicts)
+
+        temp_snapshot_path = self.snapshot_path + ".tmp"
+        with open(temp_snapshot_path, "w") as snapshot_file:
+            json.dump(self.snapshots, snapshot_file)
+        os.replace(temp_snapshot_path, self.snapshot_path)
@@ -0,0 +1,95 @@
+"""
+This script is used to look up the archive of past runs, e.g. every Sprint Log a project has had across quarters, or
+which SIGs and projects a student was in each quarter, without searching Google Drive.
+"""
+
+import os
+import json
+import argparse
+
+from helpers.archive import StudioArchive, DEFAULT_ARCHIVE_PATH
+
+
+def print_query_results(query_type, results):
+    """
+    Prints the results of a query for people to read.
+
+    :param query_type: string type of query, "files" or "members".
+    :param results: list of dicts from StudioArchive.find_files or StudioArchive.find_members.
+    :return: None
+    """
+    if len(results) == 0:
+        print("Nothing in the archive matched.")
+        return
+
+    for result in results:
+        if query_type == "files":
+            print("{quarter} {type} ({sig}): {name}: {url}".format(quarter=result["quarter"] or "(no quarter)",
+                                                                   type=result["artifact_type"],
+                                                                   sig=result["sig_name"] or "(no SIG)",
+                                                                   name=result["file_name"], url=result["url"]))
+        else:
+            print("{quarter} {sig}: {project}: {student}".format(quarter=result["quarter"] or "(no quarter)",
+                                                                 sig=result["sig_name"] or "(no SIG)",
+                                                                 project=result["project_name"] or "(no project)",
+                                                                 student=result["student"] or "(no students)"))
+
+
+def main(archive_path, query_type, filters, print_json=False):
+    """
+    Looks up files or memberships in the archive, and prints the results.
+
+    :param archive_path: string filepath of the archive.
+    :param query_type: string type of query, "files" or "members".
+    :param filters: dict of keyword arguments for StudioArchive.find_files or StudioArchive.find_members.
+    :param print_json: boolean true to print results as json for other tools, instead of for people to read.
+    :return: list of dicts, one for each match.
+    :raises exception: exception if the archive does not exist, or query_type is not a supported type of query.
+    """
+    # opening the archive would create an empty one
+    if not os.path.exists(archive_path):
+        raise Exception("Invalid archive path '{}'. No run has been archived there yet.".format(archive_path))
+
+    archive = StudioArchive(archive_path)
+    try:
+        if query_type == "files":
+            results = archive.find_files(**filters)
+        elif query_type == "members":
+            results = archive.find_members(**filters)
+        else:
+            raise Exception("Invalid query type '{}'. Expected files or members.".format(query_type))
+    finally:
+        archive.close()
+
+    if print_json:
+        print(json.dumps(results, indent=4))
+    else:
+        print_query_results(query_type, results)
+
+    return results
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_PATH,
+                        help="filepath of the archive (default: %(default)s)")
+    parser.add_argument("--json", action="store_true", help="print results as json for other tools")
+
+    subparsers = parser.add_subparsers(dest="query_type", required=True)
+    files_parser = subparsers.add_parser("files", help="list files created for a student, project, SIG, or quarter")
+    files_parser.add_argument("--type", dest="artifact_type", help="artifact type, e.g. sprint_logs")
+    files_parser.add_argument("--for", dest="subject", help="name of the student or project files were created for")
+    members_parser = subparsers.add_parser("members", help="list which students were on which projects and SIGs")
+    members_parser.add_argument("--student", help="name of student")
+    members_parser.add_argument("--project", dest="project_name", help="name of project")
+    for subparser in [files_parser, members_parser]:
+        subparser.add_argument("--sig", dest="sig_name", help="name of SIG")
+        subparser.add_argument("--quarter", help="name of quarter, e.g. \"Fall 2020\"")
+    args = parser.parse_args()
+
+    # every argument other than the archive, output format, and query type filters the query
+    input_filters = {name: value for name, value in vars(args).items()
+                     if name not in ["archive", "json", "query_type"]}
+
+    main(args.archive, args.query_type, input_filters, print_json=args.json)
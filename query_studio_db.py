@@ -0,0 +1,124 @@
+"""
+This script is used to look up students, projects, and SIGs in the Studio Database, e.g. which SIG and projects a
+student is in, or who is on a project.
+"""
+
+import json
+import argparse
+
+import helpers.cli as cli
+import helpers.metrics as metrics
+import helpers.rate_limit as rate_limit
+import studio_db_to_json as studio_db
+
+
+def query_studio_db(studio_db_index, query_type, name):
+    """
+    Looks up a student, project, or SIG in an indexed Studio Database.
+
+    :param studio_db_index: StudioDbIndex of the Studio Database.
+    :param query_type: string type of query, "student", "project", or "sig".
+    :param name: string name of the student or project, or name or abbreviation of the SIG, to look up.
+    :return: list of json-serializable dicts, one for each match. empty if nothing matched.
+    :raises exception: exception if query_type is not a supported type of query.
+    """
+    if query_type == "student":
+        return [membership._asdict() for membership in studio_db_index.find_student(name)]
+
+    if query_type == "project":
+        return [membership._asdict() for membership in studio_db_index.find_project(name)]
+
+    if query_type == "sig":
+        sig_name = studio_db_index.find_sig(name)
+        if sig_name is None:
+            return []
+
+        return [studio_db.get_exported_sig(sig_name, studio_db_index.studio_db_dict[sig_name])]
+
+    raise Exception("Invalid query type '{}'. Expected student, project, or sig.".format(query_type))
+
+
+def print_query_results(query_type, name, results):
+    """
+    Prints the results of a query for people to read.
+
+    :param query_type: string type of query, "student", "project", or "sig".
+    :param name: string name that was looked up.
+    :param results: list of dicts from query_studio_db.
+    :return: None
+    """
+    if len(results) == 0:
+        print("No {} named {} in the Studio Database.".format(query_type, name))
+        return
+
+    for result in results:
+        if query_type == "student":
+            print("{sig}: {projects}".format(sig=result["sig_name"],
+                                             projects=", ".join(result["project_names"]) or "(no projects)"))
+        elif query_type == "project":
+            print("{project} ({sig}): {students}".format(project=result["project_name"], sig=result["sig_name"],
+                                                         students=", ".join(result["students"])))
+        else:
+            print("{name} ({abbreviation}): {students} students, {projects} projects".format(
+                name=result["name"], abbreviation=result["abbreviation"], students=len(result["students"]),
+                projects=len(result["projects"])))
+            print("    SIG Heads: {}".format(", ".join(result["sig_heads"])))
+            print("    Faculty Mentors: {}".format(", ".join(result["faculty_mentors"])))
+            for proj in result["projects"]:
+                print("    {project}: {students}".format(project=proj["project_name"],
+                                                         students=", ".join(proj["students"])))
+
+
+def main(studio_db_url, sig_info_sheet_name, proj_info_sheet_name, query_type, name, refresh_studio_db=False,
+         print_json=False):
+    """
+    Fetches Studio Database information, indexes it, and prints the results of a query.
+
+    :param studio_db_url: string url of Studio Database Google Spreadsheet
+    :param sig_info_sheet_name: string name of sheet where SIG information is stored.
+    :param proj_info_sheet_name: string name of sheet where Project information is stored.
+    :param query_type: string type of query, "student", "project", or "sig".
+    :param name: string name of the student or project, or name or abbreviation of the SIG, to look up.
+    :param refresh_studio_db: boolean true to re-fetch the Studio Database even if a cached copy is current.
+    :param print_json: boolean true to print results as json for other tools, instead of for people to read.
+    :return: list of json-serializable dicts, one for each match.
+    """
+    # generate studio database and index it once
+    loaded_studio_db = studio_db.load_studio_db(studio_db_url, sig_info_sheet_name, proj_info_sheet_name,
+                                                force_refresh=refresh_studio_db)
+
+    results = query_studio_db(loaded_studio_db.index, query_type, name)
+    if print_json:
+        print(json.dumps(results, indent=4))
+    else:
+        print_query_results(query_type, name, results)
+
+    return results
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser(description=__doc__)
+    cli.add_studio_db_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="print results as json for other tools")
+    cli.add_rate_limit_arguments(parser)
+    cli.add_metrics_arguments(parser)
+
+    subparsers = parser.add_subparsers(dest="query_type", required=True)
+    student_parser = subparsers.add_parser("student", help="list the SIGs and projects a student is in")
+    student_parser.add_argument("name", help="name of student")
+    project_parser = subparsers.add_parser("project", help="list the SIG and students of a project")
+    project_parser.add_argument("name", help="name of project")
+    sig_parser = subparsers.add_parser("sig", help="list the SIG Heads, Faculty Mentors, and projects of a SIG")
+    sig_parser.add_argument("name", help="name or abbreviation of SIG")
+    args = parser.parse_args()
+
+    # share the Drive and Sheets quota with other scripts running in this directory
+    rate_limit.configure(args.rate_limiter)
+
+    try:
+        main(args.studio_db_url, args.sig_info_sheet_name, args.proj_info_sheet_name, args.query_type, args.name,
+             refresh_studio_db=args.refresh_studio_db, print_json=args.json)
+    finally:
+        # write metrics even if the run failed, since that is when they are most useful
+        metrics.export_metrics(args.metrics)
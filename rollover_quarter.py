@@ -0,0 +1,76 @@
+"""
+This script is used to generate every quarterly artifact (Sprint Logs, The Weekly, Mid-Quarter Check-Ins, etc.) in a
+single run, given a quarter config listing the template and output directory for each artifact type.
+"""
+
+import json
+import argparse
+
+import helpers.cli as cli
+import helpers.artifacts as artifacts
+
+
+def load_quarter_config(config_path):
+    """
+    Loads and validates a quarter config.
+
+    :param config_path: string filepath of quarter config json.
+    :return: dict of quarter config.
+    :raises exception: exception if the config is missing a required field or lists an unknown artifact type.
+    """
+    with open(config_path, "r") as config_file:
+        quarter_config = json.load(config_file)
+
+    # check for required fields
+    for field in ["quarter", "studio_db", "artifacts"]:
+        if field not in quarter_config:
+            raise Exception("Invalid quarter config: expected field '{}' was not found.".format(field))
+
+    for field in ["url", "sig_info_sheet_name", "proj_info_sheet_name"]:
+        if field not in quarter_config["studio_db"]:
+            raise Exception("Invalid quarter config: expected field 'studio_db.{}' was not found.".format(field))
+
+    for artifact in quarter_config["artifacts"]:
+        for field in ["type", "template_url", "folder_url"]:
+            if field not in artifact:
+                raise Exception("Invalid quarter config: expected field '{}' was not found in artifact {}."
+                                .format(field, artifact))
+
+        if artifact["type"] not in artifacts.ARTIFACT_SPECS:
+            raise Exception("Invalid quarter config: unknown artifact type '{}'. Expected one of {}."
+                            .format(artifact["type"], sorted(artifacts.ARTIFACT_SPECS)))
+
+    return quarter_config
+
+
+def main(args):
+    """
+    Fetches Studio Database information once, and uses it to generate every artifact in a quarter config.
+
+    :param args: argparse.Namespace of command line args, with config_path the filepath of a quarter config json.
+    :return: list of CopyResult, one for each file. empty for a dry run.
+    """
+    quarter_config = load_quarter_config(args.config_path)
+
+    # plan every file to copy for every artifact, and copy them all on one shared pool of workers
+    artifact_list = [(artifact["type"], artifact["template_url"], artifact["folder_url"])
+                     for artifact in quarter_config["artifacts"]]
+    studio_db_config = quarter_config["studio_db"]
+    return artifacts.run_artifacts(args, artifact_list, quarter_config["quarter"],
+                                   studio_db_sheets=(studio_db_config["url"], studio_db_config["sig_info_sheet_name"],
+                                                     studio_db_config["proj_info_sheet_name"]))
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("config_path", help="filepath of quarter config json")
+    parser.add_argument("--refresh-studio-db", action="store_true",
+                        help="re-fetch the Studio Database even if a cached copy is current")
+    cli.add_copy_arguments(parser)
+    cli.add_write_links_arguments(parser)
+    cli.add_rate_limit_arguments(parser)
+    cli.add_metrics_arguments(parser)
+
+    # generate every artifact in the quarter config
+    main(parser.parse_args())
@@ -2,35 +2,93 @@
 This script is used to extract information from the Studio Database Google Spreadsheet for other scripts and tools.
 """
 
-import sys
+import os
 import json
-import helpers.imports as helpers
-
+import argparse
+import time
+from collections import namedtuple
 
-def fetch_sig_info(spreadsheet, sheet_name):
+import helpers.imports as helpers
+import helpers.cli as cli
+import helpers.metrics as metrics
+import helpers.rate_limit as rate_limit
+from helpers.retry import RetryPolicy
+
+# default location of the Studio Database cache, relative to the directory scripts are run from
+DEFAULT_CACHE_PATH = "studio_db_cache.json"
+
+# cached Studio Databases older than this many seconds are re-fetched even if the spreadsheet has not changed
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+# default location of the exported Studio Database json, relative to the directory scripts are run from
+DEFAULT_EXPORT_PATH = "studio_db.json"
+
+# formats the Studio Database can be exported in: indented json, json without whitespace, and one SIG per line
+EXPORT_FORMATS = ("pretty", "compact", "ndjson")
+
+# a column of a Studio Database worksheet: its header, the field it is parsed into, and whether it holds a
+# comma-separated list of people rather than a single value
+ColumnSpec = namedtuple("ColumnSpec", ["header", "field", "is_list"])
+
+# columns of the SIG information worksheet, in the order of the fields of a parsed SIG
+SIG_INFO_SCHEMA = (
+    ColumnSpec("SIG Name", "sig_name", False),
+    ColumnSpec("SIG Abbreviation", "abbreviation", False),
+    ColumnSpec("SIG Heads", "sig_heads", True),
+    ColumnSpec("Faculty Mentors", "faculty_mentors", True),
+    ColumnSpec("SIG Time", "sig_time", False),
+    ColumnSpec("SIG Office Hours Time", "sig_oh_time", False)
+)
+
+# columns of the project information worksheet, in the order of the fields of a parsed project
+PROJ_INFO_SCHEMA = (
+    ColumnSpec("SIG Name", "sig_name", False),
+    ColumnSpec("Students", "students", True),
+    ColumnSpec("Project Name", "project_name", False),
+    ColumnSpec("Sprint Log Link", "sprint_log", False),
+    ColumnSpec("PRC Link", "practical_research_canvas", False),
+    ColumnSpec("RRC Link", "research_research_canvas", False),
+    ColumnSpec("Compass Link", "compass", False)
+)
+
+# each worksheet's header mapping, from header to the field it is parsed into
+SIG_INFO_HEADER_MAPPING = {column.header: column.field for column in SIG_INFO_SCHEMA}
+PROJ_INFO_HEADER_MAPPING = {column.header: column.field for column in PROJ_INFO_SCHEMA}
+
+# a parsed row of each worksheet, with a field for each column in its schema
+SigInfo = namedtuple("SigInfo", [column.field for column in SIG_INFO_SCHEMA])
+ProjInfo = namedtuple("ProjInfo", [column.field for column in PROJ_INFO_SCHEMA])
+
+# where a student is in the studio database: a SIG, and the names of the student's projects in it
+StudentMembership = namedtuple("StudentMembership", ["sig_name", "project_names"])
+
+# where a project is in the studio database: its SIG, its name, and its students
+ProjectMembership = namedtuple("ProjectMembership", ["sig_name", "project_name", "students"])
+
+# a studio database ready to generate files from: dict of each SIG with all student and project information, a
+# StudioDbIndex over it, built once when the studio database is loaded, and the time it was fetched from the
+# spreadsheet in seconds since the epoch (None if it wasn't)
+LoadedStudioDb = namedtuple("LoadedStudioDb", ["studio_db", "index", "fetched_at"], defaults=[None])
+
+
+def quote_sheet_name(sheet_name):
     """
-    Fetches SIG information from Studio Database.
+    Quotes a worksheet name for use in an A1 range, e.g. 'Proj Info' or 'Proj Info'!D5.
 
-    :param spreadsheet: gspread spreadsheet object for the Studio Database.
-    :param sheet_name: string name of sheet where SIG information is stored.
-    :return: list of parsed SIG information.
+    :param sheet_name: string name of worksheet.
+    :return: string quoted worksheet name.
     """
-    # open correct worksheet and get all values to parse
-    studio_info_worksheet = spreadsheet.worksheet(sheet_name)
-    values = studio_info_worksheet.get_all_values()
+    return "'{}'".format(sheet_name.replace("'", "''"))
 
-    # create header mapping object
-    header = values[0]
-    header_mapping = {
-        "SIG Name": "sig_name",
-        "SIG Abbreviation": "abbreviation",
-        "SIG Heads": "sig_heads",
-        "Faculty Mentors": "faculty_mentors",
-        "SIG Time": "sig_time",
-        "SIG Office Hours Time": "sig_oh_time"
-    }
 
-    # create a header index to lookup header_mapping keys by index number
+def get_header_index(header, header_mapping):
+    """
+    Creates a header index to lookup header_mapping keys by column index.
+
+    :param header: list of string values in the header row of a worksheet.
+    :param header_mapping: dict of header to parsed field name.
+    :return: (dict of column index to header, list of headers not included in header_mapping) tuple.
+    """
     # track any header vals not including in mapping
     exclude_list = []
     header_index = {}
@@ -41,249 +99,620 @@ def fetch_sig_info(spreadsheet, sheet_name):
         else:
             exclude_list.append(curr_val)
 
+    return header_index, exclude_list
+
+
+def compile_worksheet_plan(header, schema):
+    """
+    Compiles a worksheet schema into a plan of the columns each field is extracted from, so each row can be parsed
+    without looking up its headers again.
+
+    :param header: list of string values in the header row of a worksheet.
+    :param schema: tuple of ColumnSpec for the worksheet.
+    :return: (list of (is_list, tuple of column indices) tuples, one for each column in schema,
+        list of headers not included in schema) tuple.
+    """
+    header_index, exclude_list = get_header_index(header, {column.header: column.field for column in schema})
+
+    plan = []
+    for column in schema:
+        column_indices = tuple(index for index, curr_header in header_index.items() if curr_header == column.header)
+
+        # list columns that appear more than once are combined, while the last of repeated single value columns wins
+        plan.append((column.is_list, column_indices if column.is_list else column_indices[-1:]))
+
+    return plan, exclude_list
+
+
+def parse_worksheet(values, schema, record_type):
+    """
+    Parses the values of a Studio Database worksheet into a record for each row. Single values are stripped of
+    whitespace, and lists of people are split on commas and each name is stripped. Columns missing from the
+    worksheet are parsed as empty.
+
+    :param values: list of rows in the worksheet, starting with the header row.
+    :param schema: tuple of ColumnSpec for the worksheet.
+    :param record_type: namedtuple type with a field for each column in schema, in the same order.
+    :return: list of record_type, one for each row.
+    """
+    # compile a plan for extracting each field once for the whole worksheet
+    plan, exclude_list = compile_worksheet_plan(values[0], schema)
+
     if len(exclude_list) > 0:
         print("The following columns were included in the Studio Database Spreadsheet, but not in the header_mapping. "
               "They will not be included in the parsed Studio Database: {}".format(exclude_list))
 
-    # iterate over each row and parse data
+    # iterate over each row and extract each field with the plan
     output = []
-    for sig in values[1:]:
-        # setup an object for holding current sig information
-        curr_sig = {
-            "sig_name": "",
-            "abbreviation": "",
-            "sig_heads": [],
-            "faculty_mentors": [],
-            "sig_time": "",
-            "sig_oh_time": ""
-        }
-
-        # parse each individual info field
-        for index, sig_info in enumerate(sig):
-            # check if index is in header_index before proceeding
-            if index not in header_index:
-                continue
-
-            # if SIG Heads or Faculty Mentors, parse list of people
-            if header_index[index] == "SIG Heads" or header_index[index] == "Faculty Mentors":
-                person_list = [person_name.strip() for person_name in sig_info.split(",")]
-                curr_sig[header_mapping[header_index[index]]].extend(person_list)
-            # else, add to appropriate field
+    for row in values[1:]:
+        row_length = len(row)
+        fields = []
+        for is_list, column_indices in plan:
+            # most fields come from a single column, which is the common case worth keeping fast
+            if len(column_indices) == 1 and column_indices[0] < row_length:
+                cell = row[column_indices[0]]
+                fields.append([person_name.strip() for person_name in cell.split(",")] if is_list else cell.strip())
+            elif is_list:
+                fields.append([person_name.strip() for index in column_indices if index < row_length
+                               for person_name in row[index].split(",")])
             else:
-                curr_sig[header_mapping[header_index[index]]] = sig_info.strip()
+                fields.append("")
 
-        # add to output
-        output.append(curr_sig)
+        output.append(record_type._make(fields))
 
-    # output data
     return output
 
 
-def fetch_proj_info(spreadsheet, sheet_name):
+def fetch_worksheet_values(gc, spreadsheet_id, sheet_names):
     """
-    Fetches project information from Studio Database.
+    Fetches all values of several worksheets in a single Google Sheets API request.
+    The spreadsheet is addressed by id, so no spreadsheet or worksheet metadata needs to be fetched first.
 
-    :param spreadsheet: gspread spreadsheet object for the Studio Database.
-    :param sheet_name: string name of sheet where Project information is stored.
-    :return: list of parsed project information.
+    :param gc: gspread authentication object.
+    :param spreadsheet_id: string id of spreadsheet to fetch values from.
+    :param sheet_names: list of string names of worksheets to fetch.
+    :return: list with a list of rows for each worksheet, in the same order as sheet_names.
     """
-    # open correct worksheet and get all values to parse
-    studio_info_worksheet = spreadsheet.worksheet(sheet_name)
-    values = studio_info_worksheet.get_all_values()
+    from gspread.urls import SPREADSHEET_VALUES_BATCH_URL
 
-    # create header mapping object
-    header = values[0]
-    header_mapping = {
-        "SIG Name": "sig_name",
-        "Students": "students",
-        "Project Name": "project_name",
-        "Sprint Log Link": "sprint_log",
-        "PRC Link": "practical_research_canvas",
-        "RRC Link": "research_research_canvas",
-        "Compass Link": "compass"
-    }
+    # quote sheet names so names with spaces or apostrophes are read as whole-sheet ranges
+    ranges = [quote_sheet_name(sheet_name) for sheet_name in sheet_names]
 
-    # create a header index to lookup header_mapping keys by index number
-    # track any header vals not including in mapping
-    exclude_list = []
-    header_index = {}
+    # gspread 6 moved request from the client to its http_client
+    http_client = getattr(gc, "http_client", gc)
+    rate_limit.acquire("sheets.values.batchGet")
+    with metrics.timed("sheets.values.batchGet"):
+        response = http_client.request("get", SPREADSHEET_VALUES_BATCH_URL % spreadsheet_id,
+                                       params={"ranges": ranges}).json()
 
-    for curr_index, curr_val in enumerate(header):
-        if curr_val in header_mapping:
-            header_index[curr_index] = curr_val
-        else:
-            exclude_list.append(curr_val)
+    # the API leaves out trailing empty cells, so pad rows to the same width like get_all_values does
+    output = []
+    for value_range in response["valueRanges"]:
+        rows = value_range.get("values", [])
+        width = max([len(row) for row in rows], default=0)
+        output.append([row + [""] * (width - len(row)) for row in rows])
 
-    if len(exclude_list) > 0:
-        print("The following columns were included in the Studio Database Spreadsheet, but not in the header_mapping. "
-              "They will not be included in the parsed Studio Database: {}".format(exclude_list))
+    return output
 
-    # iterate over each row and parse data
-    output = []
-    for proj in values[1:]:
-        # setup an object for holding current project information
-        curr_proj = {
-            "sig_name": "",
-            "students": [],
-            "project_name": "",
-            "sprint_log": "",
-            "practical_research_canvas": "",
-            "research_research_canvas": "",
-            "compass": ""
-        }
 
-        # parse each individual info field
-        for index, proj_info in enumerate(proj):
-            # check if index is in header_index before proceeding
-            if index not in header_index:
-                continue
+def parse_sig_info(values):
+    """
+    Parses SIG information from the values of the Studio Database SIG information worksheet.
 
-            # if Students, parse list of people
-            if header_index[index] == "Students":
-                person_list = [person_name.strip() for person_name in proj_info.split(",")]
-                curr_proj[header_mapping[header_index[index]]].extend(person_list)
-            # else, add to appropriate field
-            else:
-                curr_proj[header_mapping[header_index[index]]] = proj_info.strip()
+    :param values: list of rows in the SIG information worksheet, starting with the header row.
+    :return: list of SigInfo, one for each row.
+    """
+    return parse_worksheet(values, SIG_INFO_SCHEMA, SigInfo)
 
-        # add to output
-        output.append(curr_proj)
 
-    # output data
-    return output
+def parse_proj_info(values):
+    """
+    Parses project information from the values of the Studio Database project information worksheet.
+
+    :param values: list of rows in the project information worksheet, starting with the header row.
+    :return: list of ProjInfo, one for each row.
+    """
+    return parse_worksheet(values, PROJ_INFO_SCHEMA, ProjInfo)
 
 
 def create_studio_db_dict(sig_info_list, proj_info_list):
     """
     Creates a studio database dict that combines the parsed SIG and Project info worksheets.
 
-    :param sig_info_list: list of parsed SIG information from Studio Database.
-    :param proj_info_list: list of parsed Project information from Studio Database.
+    :param sig_info_list: list of SigInfo parsed from Studio Database.
+    :param proj_info_list: list of ProjInfo parsed from Studio Database.
     :return: dict of each SIG with all student and project information.
     """
     # create a placeholder output object
     output = {}
     for sig in sig_info_list:
-        # add placeholder for all students in SIG and projects
-        sig["students"] = []
-        sig["projects"] = []
-
-        # get current SIG name and remove from SIG object
-        curr_sig_name = sig.pop("sig_name", None)
+        # add every SIG field except its name, with placeholders for all students in SIG and projects
+        curr_sig = sig._asdict()
+        curr_sig_name = curr_sig.pop("sig_name")
+        curr_sig["students"] = []
+        curr_sig["projects"] = []
 
         # add to output dict
-        output[curr_sig_name] = sig
+        output[curr_sig_name] = curr_sig
 
     # add project information
     for proj in proj_info_list:
         # create some local vars
-        curr_sig_name = proj["sig_name"]
+        curr_sig_name = proj.sig_name
         curr_proj = {
-            "project_name": proj["project_name"],
-            "students": proj["students"],
+            "project_name": proj.project_name,
+            "students": proj.students,
             "documents": {
-                "sprint_log": proj["sprint_log"],
-                "practical_research_canvas": proj["practical_research_canvas"],
-                "research_research_canvas": proj["research_research_canvas"],
-                "compass": proj["compass"]
+                "sprint_log": proj.sprint_log,
+                "practical_research_canvas": proj.practical_research_canvas,
+                "research_research_canvas": proj.research_research_canvas,
+                "compass": proj.compass
             }
         }
 
         # add students and project
-        output[curr_sig_name]["students"].extend(proj["students"])
+        output[curr_sig_name]["students"].extend(proj.students)
         output[curr_sig_name]["projects"].append(curr_proj)
 
     # output studio database dict
     return output
 
 
-def export_studio_db_as_json(studio_db_dict, output_file):
+def get_index_key(name):
+    """
+    Normalizes a name for looking it up in a StudioDbIndex, so lookups ignore case and surrounding whitespace.
+
+    :param name: string name of a student, project, or SIG.
+    :return: string index key.
+    """
+    return name.strip().casefold()
+
+
+class StudioDbIndex:
+    """
+    Reverse indexes over a studio database dict, built once so students, projects, and SIGs can be looked up
+    without scanning every SIG. Lookups ignore case and surrounding whitespace.
+    """
+
+    def __init__(self, studio_db_dict):
+        """
+        :param studio_db_dict: dict of each SIG with all student and project information.
+        """
+        self.studio_db_dict = studio_db_dict
+
+        # student -> list of StudentMembership, project -> list of ProjectMembership, and SIG name or abbreviation
+        # -> SIG name. students and projects can appear in more than one SIG, so each maps to a list
+        self.students = {}
+        self.projects = {}
+        self.sigs = {}
+
+        for sig_name, sig_info in studio_db_dict.items():
+            self.sigs[get_index_key(sig_name)] = sig_name
+            if sig_info["abbreviation"] != "":
+                self.sigs.setdefault(get_index_key(sig_info["abbreviation"]), sig_name)
+
+            # list every student in the SIG once, skipping blank names
+            sig_memberships = {}
+            for student in sig_info["students"]:
+                student_key = get_index_key(student)
+                if student_key == "" or student_key in sig_memberships:
+                    continue
+
+                sig_memberships[student_key] = StudentMembership(sig_name, [])
+                self.students.setdefault(student_key, []).append(sig_memberships[student_key])
+
+            # then add each project to its students
+            for proj in sig_info["projects"]:
+                self.projects.setdefault(get_index_key(proj["project_name"]), []).append(
+                    ProjectMembership(sig_name, proj["project_name"], proj["students"]))
+
+                for student_key in dict.fromkeys(get_index_key(student) for student in proj["students"]):
+                    if student_key in sig_memberships:
+                        sig_memberships[student_key].project_names.append(proj["project_name"])
+
+    def find_student(self, student_name):
+        """
+        Looks up the SIGs and projects a student is in.
+
+        :param student_name: string name of student.
+        :return: list of StudentMembership, one for each SIG the student is in. empty if the student isn't found.
+        """
+        return self.students.get(get_index_key(student_name), [])
+
+    def find_project(self, project_name):
+        """
+        Looks up the SIG and students of a project.
+
+        :param project_name: string name of project.
+        :return: list of ProjectMembership, one for each SIG with a project of that name. empty if none is found.
+        """
+        return self.projects.get(get_index_key(project_name), [])
+
+    def find_sig(self, sig_name):
+        """
+        Looks up a SIG by its name or abbreviation.
+
+        :param sig_name: string name or abbreviation of SIG.
+        :return: string name of SIG, or None if it isn't found.
+        """
+        return self.sigs.get(get_index_key(sig_name))
+
+
+def get_exported_sig(sig_name, sig_info):
+    """
+    Formats a single SIG from a studio database dict for the exported json.
+
+    :param sig_name: string name of SIG.
+    :param sig_info: dict of SIG information from a studio database dict.
+    :return: dict of SIG information with correct formatting for external tools.
+    """
+    return {
+        "name": sig_name,
+        "abbreviation": sig_info["abbreviation"],
+        "sig_time": sig_info["sig_time"],
+        "sig_oh_time": sig_info["sig_oh_time"],
+        "sig_heads": sig_info["sig_heads"],
+        "faculty_mentors": sig_info["faculty_mentors"],
+        "students": sig_info["students"],
+        "projects": [{
+            "project_name": proj["project_name"],
+            "students": proj["students"],
+            "documents": {
+                "Sprint Log": proj["documents"]["sprint_log"],
+                "Practical Research Canvas": proj["documents"]["practical_research_canvas"],
+                "Research Research Canvas": proj["documents"]["research_research_canvas"],
+                "Compass": proj["documents"]["compass"]
+            }
+        } for proj in sig_info["projects"]]
+    }
+
+
+def get_json_encoder(export_format):
+    """
+    Gets a function that encodes a single SIG for an export format. Compact and NDJSON exports use orjson if it is
+    installed, which is several times faster than the json module. Pretty exports always use the json module, so
+    their indentation matches earlier exports.
+
+    :param export_format: string export format, one of EXPORT_FORMATS.
+    :return: function that takes a json-serializable object and returns utf-8 encoded bytes.
+    """
+    if export_format == "pretty":
+        return lambda obj: json.dumps(obj, indent=4).encode("utf-8")
+
+    try:
+        import orjson
+        return orjson.dumps
+    except ImportError:
+        return lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def iter_studio_db_json(studio_db_dict, export_format="pretty"):
     """
-    Exports Studio Database dict as a json object for other tools.
+    Encodes a Studio Database dict as json for other tools, SIG by SIG, so each SIG is serialized exactly once and
+    the whole document never has to be held in memory as one object.
     To support other tools, the exported json uses a list of SIGs rather than a dictionary where each SIG is a key.
 
     :param studio_db_dict: dict containing all information for the studio database
-    :param output_file: string filepath to output json to.
-    :return: json string of studio database dict with correct formatting for external tools.
+    :param export_format: string export format. "pretty" is an indented json list, "compact" is a json list without
+        whitespace, and "ndjson" is one SIG per line.
+    :return: generator of utf-8 encoded bytes chunks, which together form the exported document.
+    :raises exception: exception if export_format is not one of EXPORT_FORMATS.
     """
-    # create output object
-    output = []
+    if export_format not in EXPORT_FORMATS:
+        raise Exception("Invalid export format '{}'. Expected one of {}.".format(export_format, EXPORT_FORMATS))
 
-    for sig_name, sig_info in studio_db_dict.items():
-        # hold data for current sig
-        curr_sig = {
-            "name": sig_name,
-            "abbreviation": sig_info["abbreviation"],
-            "sig_time": sig_info["sig_time"],
-            "sig_oh_time": sig_info["sig_oh_time"],
-            "sig_heads": sig_info["sig_heads"],
-            "faculty_mentors": sig_info["faculty_mentors"],
-            "students": sig_info["students"],
-            "projects": [{
-                "project_name": proj["project_name"],
-                "students": proj["students"],
-                "documents": {
-                    "Sprint Log": proj["documents"]["sprint_log"],
-                    "Practical Research Canvas": proj["documents"]["practical_research_canvas"],
-                    "Research Research Canvas": proj["documents"]["research_research_canvas"],
-                    "Compass": proj["documents"]["compass"]
-                }
-            } for proj in sig_info["projects"]]
-        }
+    encode = get_json_encoder(export_format)
+
+    # NDJSON is just one encoded SIG per line
+    if export_format == "ndjson":
+        for sig_name, sig_info in studio_db_dict.items():
+            yield encode(get_exported_sig(sig_name, sig_info)) + b"\n"
+        return
+
+    # otherwise, write the list brackets and separators around each encoded SIG. pretty SIGs are indented one more
+    # level, so the output is identical to encoding the whole list at once with indent=4
+    separator, opening, closing = (b",\n", b"[\n", b"\n]") if export_format == "pretty" else (b",", b"[", b"]")
+    if len(studio_db_dict) == 0:
+        yield b"[]"
+        return
 
-        # add to output
-        output.append(curr_sig)
+    for index, (sig_name, sig_info) in enumerate(studio_db_dict.items()):
+        encoded_sig = encode(get_exported_sig(sig_name, sig_info))
+        if export_format == "pretty":
+            encoded_sig = b"\n".join(b"    " + line for line in encoded_sig.split(b"\n"))
 
-    # output json to specified file
-    with open(output_file, "w") as outfile:
-        json.dump(output, outfile, indent=4)
+        yield (opening if index == 0 else separator) + encoded_sig
 
-    # return json string
-    return json.dumps(output, indent=4)
+    yield closing
 
 
-def main(spreadsheet_url, sig_info_sheet_name, proj_info_sheet_name):
+def export_studio_db_as_json(studio_db_dict, output_file, export_format="pretty"):
+    """
+    Exports Studio Database dict as a json object for other tools, writing it SIG by SIG as it is encoded.
+
+    :param studio_db_dict: dict containing all information for the studio database
+    :param output_file: string filepath to output json to.
+    :param export_format: string export format, one of EXPORT_FORMATS.
+    :return: utf-8 encoded bytes of the exported json, with correct formatting for external tools.
+    """
+    # keep each chunk as it is written, so the returned document doesn't need to be encoded a second time
+    chunks = []
+    with open(output_file, "wb") as outfile:
+        for chunk in iter_studio_db_json(studio_db_dict, export_format):
+            outfile.write(chunk)
+            chunks.append(chunk)
+
+    return b"".join(chunks)
+
+
+def main(spreadsheet_url, sig_info_sheet_name, proj_info_sheet_name, gc=None):
     """
     Generates a Studio Database dict, given a Studio Database spreadsheet.
 
     :param spreadsheet_url: string url of Studio Database Google Spreadsheet
     :param sig_info_sheet_name: string name of sheet where SIG information is stored.
     :param proj_info_sheet_name: string name of sheet where Project information is stored.
+    :param gc: optional gspread authentication object to use, e.g. one pointed at a test server.
+        authenticates with auth_gsheets if not given.
     :return: dict of parsed studio database.
     """
     # authenticate gspread
-    gc = helpers.auth_gsheets()
+    if gc is None:
+        gc = helpers.auth_gsheets()
 
-    # get spreadsheet
-    curr_spreadsheet = gc.open_by_url(spreadsheet_url)
+    # fetch SIG and Project info worksheets together in one request
+    spreadsheet_id = helpers.get_file_id_from_url(spreadsheet_url)
+    sig_info_values, proj_info_values = fetch_worksheet_values(gc, spreadsheet_id,
+                                                               [sig_info_sheet_name, proj_info_sheet_name])
 
-    # fetch SIG and Project info
-    curr_sig_info = fetch_sig_info(curr_spreadsheet, sig_info_sheet_name)
-    curr_proj_info = fetch_proj_info(curr_spreadsheet, proj_info_sheet_name)
+    # parse SIG and Project info
+    with metrics.timed("parse.studio_db", "ok"):
+        curr_sig_info = parse_sig_info(sig_info_values)
+        curr_proj_info = parse_proj_info(proj_info_values)
 
     # create and output a studio database dict
     return create_studio_db_dict(curr_sig_info, curr_proj_info)
 
 
-if __name__ == '__main__':
-    # get command line args
-    arg_count = len(sys.argv) - 1
+def fetch_spreadsheet_version(gdrive_service, spreadsheet_id):
+    """
+    Fetches the last modified time and version of a spreadsheet, without downloading any of its contents.
 
-    # check for correct number of arguments
-    if arg_count != 3:
-        raise Exception("Invalid number of arguments. Expected 3 "
-                        "(Studio Database URL, SIG Info sheet name, Proj Info sheet name) got {}."
-                        .format(arg_count))
+    :param gdrive_service: Google Drive v3 authentication object.
+    :param spreadsheet_id: string id of spreadsheet to check.
+    :return: dict with the modified_time and version of the spreadsheet.
+    """
+    get_request = gdrive_service.files().get(fileId=spreadsheet_id, fields="modifiedTime,version")
+    file_metadata = RetryPolicy().call(get_request.execute, "drive.files.get")
 
-    # parse each argument
-    input_spreadsheet_url = sys.argv[1]
-    input_sig_info_sheet_name = sys.argv[2]
-    input_proj_info_sheet_name = sys.argv[3]
-    json_output_filepath = "studio_db.json"
+    return {
+        "modified_time": file_metadata.get("modifiedTime"),
+        "version": file_metadata.get("version")
+    }
+
+
+def load_studio_db_cache(cache_path):
+    """
+    Loads cached Studio Databases from disk.
+
+    :param cache_path: string filepath of the cache.
+    :return: dict of cache key to cache entry. empty if there is no cache or it can't be read.
+    """
+    if not os.path.exists(cache_path):
+        return {}
+
+    try:
+        with open(cache_path, "r") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError) as error:
+        print("Could not read Studio Database cache at {}, ignoring it: {}".format(cache_path, error))
+        return {}
+
+
+def save_studio_db_cache(cache, cache_path):
+    """
+    Saves cached Studio Databases to disk. The cache is replaced atomically, so an interrupted write can't corrupt it.
+
+    :param cache: dict of cache key to cache entry.
+    :param cache_path: string filepath of the cache.
+    :return: None
+    """
+    temp_cache_path = cache_path + ".tmp"
+    with open(temp_cache_path, "w") as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(temp_cache_path, cache_path)
+
+
+def fetch_studio_db_entry(spreadsheet_url, sig_info_sheet_name, proj_info_sheet_name,
+                          cache_path=DEFAULT_CACHE_PATH, cache_ttl=DEFAULT_CACHE_TTL, force_refresh=False,
+                          read_only=False):
+    """
+    Generates a Studio Database cache entry, reusing a cached copy if the spreadsheet has not changed since it was
+    fetched. The spreadsheet's Drive modifiedTime and version are checked on every call, which is much cheaper than
+    downloading both worksheets.
+    If read_only is set, a cached copy is used without checking the spreadsheet for changes, and a fetched one is not
+    cached, so the cache file is never written.
 
-    # generate studio database dict
-    studio_database_dict = main(input_spreadsheet_url, input_sig_info_sheet_name, input_proj_info_sheet_name)
+    :param spreadsheet_url: string url of Studio Database Google Spreadsheet
+    :param sig_info_sheet_name: string name of sheet where SIG information is stored.
+    :param proj_info_sheet_name: string name of sheet where Project information is stored.
+    :param cache_path: string filepath of the cache.
+    :param cache_ttl: float maximum age in seconds of a cached Studio Database before it is always re-fetched.
+    :param force_refresh: boolean true to always re-fetch the Studio Database, ignoring the cache.
+    :param read_only: boolean true to not check a cached copy for changes or write the cache, e.g. for a dry run.
+    :return: dict of the time the studio database was fetched ("fetched_at", in seconds since the epoch), the version
+        of the spreadsheet it was fetched from ("version"), and the parsed studio database ("studio_db").
+    """
+    # cache entries are keyed by spreadsheet and worksheets, since different sheets parse to different databases
+    spreadsheet_id = helpers.get_file_id_from_url(spreadsheet_url)
+    cache_key = "{}/{}/{}".format(spreadsheet_id, sig_info_sheet_name, proj_info_sheet_name)
+    cache = load_studio_db_cache(cache_path)
+    cached_entry = cache.get(cache_key)
+
+    # without checking for changes, use any fresh cached copy as is, and don't cache a fetched one
+    if read_only:
+        if not force_refresh and cached_entry is not None and time.time() - cached_entry["fetched_at"] < cache_ttl:
+            print("Using cached Studio Database without checking it for changes (fetched {})"
+                  .format(time.ctime(cached_entry["fetched_at"])))
+            return cached_entry
+
+        return {
+            "fetched_at": time.time(),
+            "version": None,
+            "studio_db": main(spreadsheet_url, sig_info_sheet_name, proj_info_sheet_name)
+        }
+
+    # check if the cached copy is still fresh and matches the current version of the spreadsheet
+    curr_version = fetch_spreadsheet_version(helpers.auth_gdrive_service_account(), spreadsheet_id)
+    if not force_refresh and cached_entry is not None \
+            and time.time() - cached_entry["fetched_at"] < cache_ttl \
+            and cached_entry["version"] == curr_version:
+        print("Using cached Studio Database (last modified {})".format(curr_version["modified_time"]))
+        return cached_entry
+
+    # otherwise, fetch and cache the studio database
+    studio_db_dict = main(spreadsheet_url, sig_info_sheet_name, proj_info_sheet_name)
+    cache[cache_key] = {
+        "fetched_at": time.time(),
+        "version": curr_version,
+        "studio_db": studio_db_dict
+    }
+    save_studio_db_cache(cache, cache_path)
+
+    return cache[cache_key]
+
+
+def load_studio_db(spreadsheet_url, sig_info_sheet_name, proj_info_sheet_name,
+                   cache_path=DEFAULT_CACHE_PATH, cache_ttl=DEFAULT_CACHE_TTL, force_refresh=False, read_only=False):
+    """
+    Fetches a Studio Database like fetch_studio_db_entry, and indexes it once, so students, projects, and SIGs can be
+    looked up without scanning every SIG for each lookup.
+
+    :param spreadsheet_url: string url of Studio Database Google Spreadsheet
+    :param sig_info_sheet_name: string name of sheet where SIG information is stored.
+    :param proj_info_sheet_name: string name of sheet where Project information is stored.
+    :param cache_path: string filepath of the cache.
+    :param cache_ttl: float maximum age in seconds of a cached Studio Database before it is always re-fetched.
+    :param force_refresh: boolean true to always re-fetch the Studio Database, ignoring the cache.
+    :param read_only: boolean true to not check a cached copy for changes or write the cache, e.g. for a dry run.
+    :return: LoadedStudioDb of the parsed studio database, its StudioDbIndex, and when it was fetched. a cached copy
+        keeps the time it was first fetched.
+    """
+    cache_entry = fetch_studio_db_entry(spreadsheet_url, sig_info_sheet_name, proj_info_sheet_name,
+                                        cache_path=cache_path, cache_ttl=cache_ttl, force_refresh=force_refresh,
+                                        read_only=read_only)
+    studio_db_dict = cache_entry["studio_db"]
+    return LoadedStudioDb(studio_db_dict, StudioDbIndex(studio_db_dict), cache_entry["fetched_at"])
+
+
+def write_proj_info_links(spreadsheet_url, proj_info_sheet_name, proj_links, gc=None):
+    """
+    Writes document links into the matching rows of the Studio Database project information worksheet, in a single
+    values:batchUpdate request. The worksheet is re-read first and rows are matched by SIG and project name, so links
+    are written to the right rows even if rows were added or reordered since the Studio Database was cached.
+    Cells that already hold their link are not written.
+
+    :param spreadsheet_url: string url of Studio Database Google Spreadsheet
+    :param proj_info_sheet_name: string name of sheet where Project information is stored.
+    :param proj_links: dict of (sig name, project name) to dict of column header to link,
+        e.g. {("DTR", "Orchestration Scripts"): {"Sprint Log Link": "https://..."}}.
+    :param gc: optional gspread authentication object to use. authenticates with auth_gsheets if not given.
+    :return: int number of cells written.
+    :raises exception: exception if the worksheet is missing a column that links are written to.
+    """
+    if len(proj_links) == 0:
+        return 0
+
+    from gspread.urls import SPREADSHEET_VALUES_BATCH_UPDATE_URL
+    from gspread.utils import rowcol_to_a1
+
+    # authenticate gspread
+    if gc is None:
+        gc = helpers.auth_gsheets()
+
+    # re-read the worksheet, and lookup the column of each header
+    spreadsheet_id = helpers.get_file_id_from_url(spreadsheet_url)
+    values = fetch_worksheet_values(gc, spreadsheet_id, [proj_info_sheet_name])[0]
+    header_index, _ = get_header_index(values[0] if len(values) > 0 else [], PROJ_INFO_HEADER_MAPPING)
+    column_index = {header: index for index, header in header_index.items()}
+
+    # check every column is in the worksheet before writing anything
+    link_headers = {header for links in proj_links.values() for header in links}
+    for header in ["SIG Name", "Project Name"] + sorted(link_headers):
+        if header not in column_index:
+            raise Exception("Invalid project information worksheet: expected column '{}' was not found."
+                            .format(header))
+
+    # create an update for each link that differs from the current value of its cell
+    data = []
+    found_projects = set()
+    for row_number, proj in enumerate(values[1:], start=2):
+        proj_key = (proj[column_index["SIG Name"]].strip(), proj[column_index["Project Name"]].strip())
+        if proj_key not in proj_links:
+            continue
+
+        found_projects.add(proj_key)
+        for header, link in proj_links[proj_key].items():
+            if proj[column_index[header]].strip() == link:
+                continue
 
-    # export as json and print exported json
-    export_studio_db_as_json(studio_database_dict, json_output_filepath)
-    print("Studio Database successfully parsed and exported to {}".format(json_output_filepath))
+            data.append({
+                "range": "{}!{}".format(quote_sheet_name(proj_info_sheet_name),
+                                        rowcol_to_a1(row_number, column_index[header] + 1)),
+                "values": [[link]]
+            })
+
+    missing_projects = [proj_key for proj_key in proj_links if proj_key not in found_projects]
+    if len(missing_projects) > 0:
+        print("The following projects were not found in the {} worksheet, so their links were not written: {}"
+              .format(proj_info_sheet_name, ["{} / {}".format(*proj_key) for proj_key in missing_projects]))
+
+    if len(data) == 0:
+        print("Every link in the {} worksheet is already up to date.".format(proj_info_sheet_name))
+        return 0
+
+    # write every link in one request. links are entered like they were typed in, so they are shown as links
+    http_client = getattr(gc, "http_client", gc)
+    rate_limit.acquire("sheets.values.batchUpdate")
+    with metrics.timed("sheets.values.batchUpdate"):
+        http_client.request("post", SPREADSHEET_VALUES_BATCH_UPDATE_URL % spreadsheet_id,
+                            json={"valueInputOption": "USER_ENTERED", "data": data})
+
+    print("Wrote {} links into the {} worksheet.".format(len(data), proj_info_sheet_name))
+    return len(data)
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("studio_db_url", help="url of Studio Database Google Spreadsheet")
+    parser.add_argument("sig_info_sheet_name", help="name of sheet where SIG information is stored")
+    parser.add_argument("proj_info_sheet_name", help="name of sheet where Project information is stored")
+    parser.add_argument("--output", default=DEFAULT_EXPORT_PATH,
+                        help="filepath to export the Studio Database to (default: %(default)s)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="pretty",
+                        help="pretty for indented json, compact for json without whitespace, or ndjson for one SIG "
+                             "per line. compact and ndjson use orjson if it is installed (default: %(default)s)")
+    cli.add_rate_limit_arguments(parser)
+    cli.add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    # parse each argument
+    input_spreadsheet_url = args.studio_db_url
+    input_sig_info_sheet_name = args.sig_info_sheet_name
+    input_proj_info_sheet_name = args.proj_info_sheet_name
+    json_output_filepath = args.output
+
+    # share the Drive and Sheets quota with other scripts running in this directory
+    rate_limit.configure(args.rate_limiter)
+
+    try:
+        # generate studio database dict
+        studio_database_dict = main(input_spreadsheet_url, input_sig_info_sheet_name, input_proj_info_sheet_name)
+
+        # export as json and print exported json
+        export_studio_db_as_json(studio_database_dict, json_output_filepath, args.format)
+        print("Studio Database successfully parsed and exported to {}".format(json_output_filepath))
+    finally:
+        # write metrics even if the run failed, since that is when they are most useful
+        metrics.export_metrics(args.metrics)
@@ -0,0 +1,8 @@
+"""
+Makes the scripts and helpers in the root of the repo importable from the tests, like they are from each other.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,89 @@
+"""
+Tests for classifying Google API errors and retrying requests.
+"""
+
+import json
+import socket
+
+import httplib2
+import pytest
+from googleapiclient import errors
+
+from helpers.retry import RetryPolicy, is_retryable_error
+
+
+def make_http_error(status, reasons=(), headers=None):
+    """
+    Creates the error googleapiclient raises for a failed response.
+
+    :param status: int HTTP status.
+    :param reasons: list of string reasons to list in the error body.
+    :param headers: optional dict of response headers.
+    :return: googleapiclient HttpError.
+    """
+    resp = httplib2.Response(dict(headers or {}, status=status))
+    content = json.dumps({"error": {"code": status, "errors": [{"reason": reason} for reason in reasons]}})
+    return errors.HttpError(resp, content.encode("utf-8"))
+
+
+@pytest.mark.parametrize("error, expected", [
+    (make_http_error(429), True),
+    (make_http_error(500), True),
+    (make_http_error(503), True),
+    (make_http_error(403, ["userRateLimitExceeded"]), True),
+    (make_http_error(403, ["sharingRateLimitExceeded"]), True),
+    (make_http_error(403, ["insufficientFilePermissions"]), False),
+    (make_http_error(404, ["notFound"]), False),
+    (make_http_error(400), False),
+    (ConnectionError("connection reset"), True),
+    (TimeoutError("timed out"), True),
+    (socket.timeout("timed out"), True),
+    (ValueError("not a request error"), False)
+])
+def test_is_retryable_error(error, expected):
+    assert is_retryable_error(error) == expected
+
+
+def test_is_retryable_error_of_403_without_reasons_is_fatal():
+    resp = httplib2.Response({"status": 403})
+
+    assert not is_retryable_error(errors.HttpError(resp, b"not json"))
+
+
+def test_call_retries_until_success():
+    attempts = []
+
+    def request():
+        attempts.append(len(attempts))
+        if len(attempts) < 3:
+            raise make_http_error(503)
+        return "done"
+
+    policy = RetryPolicy(base_delay=0.0)
+
+    assert policy.call(request) == "done"
+    assert policy.counters["attempts"] == 3 and policy.counters["retries"] == 2
+
+
+def test_call_raises_fatal_errors_without_retrying():
+    def request():
+        raise make_http_error(404, ["notFound"])
+
+    policy = RetryPolicy(base_delay=0.0)
+
+    with pytest.raises(errors.HttpError):
+        policy.call(request)
+    assert policy.counters["attempts"] == 1 and policy.counters["fatal"] == 1
+
+
+def test_call_looks_for_the_result_before_repeating_after_a_network_error():
+    sent = []
+
+    def request():
+        sent.append(True)
+        raise ConnectionError("connection dropped after the request was sent")
+
+    policy = RetryPolicy(base_delay=0.0)
+
+    assert policy.call(request, find_result=lambda: {"id": "copied"}) == {"id": "copied"}
+    assert len(sent) == 1
@@ -0,0 +1,30 @@
+"""
+Tests for splitting permission grants into batch rounds.
+"""
+
+from helpers.sharing import ShareGrant, get_share_rounds
+
+
+def test_get_share_rounds_shares_each_file_once_per_round():
+    grants = [ShareGrant("file-1", "a@example.edu", "writer"),
+              ShareGrant("file-1", "b@example.edu", "writer"),
+              ShareGrant("file-2", "a@example.edu", "writer"),
+              ShareGrant("file-1", "c@example.edu", "writer"),
+              ShareGrant("file-3", "c@example.edu", "writer")]
+
+    share_rounds = get_share_rounds(grants)
+
+    assert share_rounds == [[0, 2, 4], [1], [3]]
+    for round_indices in share_rounds:
+        file_ids = [grants[index].file_id for index in round_indices]
+        assert len(file_ids) == len(set(file_ids))
+
+
+def test_get_share_rounds_of_distinct_files_is_a_single_round():
+    grants = [ShareGrant("file-{}".format(index), "a@example.edu", "reader") for index in range(5)]
+
+    assert get_share_rounds(grants) == [[0, 1, 2, 3, 4]]
+
+
+def test_get_share_rounds_of_no_grants_is_empty():
+    assert get_share_rounds([]) == []
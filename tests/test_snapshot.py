@@ -0,0 +1,74 @@
+"""
+Tests for diffing Studio Databases between runs.
+"""
+
+from helpers.snapshot import diff_studio_db
+
+
+def make_sig(projects):
+    """
+    Creates the studio database dict entry of a SIG with the given projects.
+
+    :param projects: dict of project name to list of student names.
+    :return: dict of SIG information.
+    """
+    return {
+        "students": [student for students in projects.values() for student in students],
+        "projects": [{"project_name": proj_name, "students": students} for proj_name, students in projects.items()]
+    }
+
+
+OLD_STUDIO_DB = {
+    "ARS": make_sig({"Scripts": ["Jane Doe", "John Smith"], "Compass": ["Alex Smith", "Sam Lee", "Kim Park"]}),
+    "NetOrch": make_sig({"Path": ["Pat Kim"]})
+}
+
+
+def test_diff_studio_db_of_unchanged_studio_db_is_empty():
+    diff = diff_studio_db(OLD_STUDIO_DB, OLD_STUDIO_DB)
+
+    assert diff == ({}, {}, {}, {}, {})
+
+
+def test_diff_studio_db_finds_added_and_removed_students_and_projects():
+    new_studio_db = {
+        "ARS": make_sig({"Scripts": ["Jane Doe", "John Smith", "Lee Chen"],
+                         "Compass": ["Alex Smith", "Sam Lee", "Kim Park"],
+                         "Canvas": ["Ana Diaz"]}),
+        "NetOrch": make_sig({})
+    }
+
+    diff = diff_studio_db(OLD_STUDIO_DB, new_studio_db)
+
+    assert diff.new_students == {"ARS": ["Lee Chen", "Ana Diaz"]}
+    assert diff.removed_students == {"NetOrch": ["Pat Kim"]}
+    assert diff.new_projects == {"ARS": ["Canvas"]}
+    assert diff.removed_projects == {"NetOrch": ["Path"]}
+    assert diff.renamed_projects == {}
+
+
+def test_diff_studio_db_matches_renamed_projects_by_students():
+    new_studio_db = {
+        "ARS": make_sig({"Orchestration Scripts": ["Jane Doe", "John Smith"],
+                         "Compass 2": ["Alex Smith"]}),
+        "NetOrch": OLD_STUDIO_DB["NetOrch"]
+    }
+
+    diff = diff_studio_db(OLD_STUDIO_DB, new_studio_db)
+
+    # Compass 2 only keeps one of Compass's three students, too few to be the same project
+    assert diff.renamed_projects == {"ARS": [("Scripts", "Orchestration Scripts")]}
+    assert diff.new_projects == {"ARS": ["Compass 2"]}
+    assert diff.removed_projects == {"ARS": ["Compass"]}
+    assert diff.removed_students == {"ARS": ["Sam Lee", "Kim Park"]}
+
+
+def test_diff_studio_db_includes_added_and_removed_sigs():
+    new_studio_db = {"ARS": OLD_STUDIO_DB["ARS"], "Design": make_sig({"Kiosk": ["Ana Diaz"]})}
+
+    diff = diff_studio_db(OLD_STUDIO_DB, new_studio_db)
+
+    assert diff.new_students == {"Design": ["Ana Diaz"]}
+    assert diff.new_projects == {"Design": ["Kiosk"]}
+    assert diff.removed_students == {"NetOrch": ["Pat Kim"]}
+    assert diff.removed_projects == {"NetOrch": ["Path"]}
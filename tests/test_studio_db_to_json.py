@@ -0,0 +1,94 @@
+"""
+Tests for parsing the Studio Database worksheets.
+"""
+
+import pytest
+
+import studio_db_to_json as studio_db
+from studio_db_to_json import SIG_INFO_SCHEMA, PROJ_INFO_SCHEMA, SigInfo, ProjInfo
+
+
+def parse_rows_like_baseline(values, schema):
+    """
+    Parses worksheet values the way fetch_sig_info and fetch_proj_info did before parse_worksheet replaced them,
+    so the two can be compared row by row.
+
+    :param values: list of rows in the worksheet, starting with the header row.
+    :param schema: tuple of ColumnSpec for the worksheet.
+    :return: list of dicts of field to parsed value, one for each row.
+    """
+    header_mapping = {column.header: column.field for column in schema}
+    list_headers = {column.header for column in schema if column.is_list}
+
+    header_index = {curr_index: curr_val for curr_index, curr_val in enumerate(values[0])
+                    if curr_val in header_mapping}
+
+    output = []
+    for row in values[1:]:
+        curr_row = {column.field: [] if column.is_list else "" for column in schema}
+
+        for index, cell in enumerate(row):
+            if index not in header_index:
+                continue
+
+            if header_index[index] in list_headers:
+                curr_row[header_mapping[header_index[index]]].extend(name.strip() for name in cell.split(","))
+            else:
+                curr_row[header_mapping[header_index[index]]] = cell.strip()
+
+        output.append(curr_row)
+
+    return output
+
+
+# the SIG information worksheet as the Studio Database lays it out
+SIG_INFO_VALUES = [
+    ["SIG Name", "SIG Abbreviation", "SIG Heads", "Faculty Mentors", "SIG Time", "SIG Office Hours Time"],
+    ["Agile Research Studios", "ARS", "Jane Doe, John Smith", "Haoqi Zhang", "Mon 2pm", "Wed 3pm"],
+    ["Networked Orchestration", " NetOrch ", "Alex Smith,Sam Lee", "", "Tue 1pm ", ""],
+    ["", "", "", "", "", ""]
+]
+
+# the project information worksheet, with a column the parser ignores, a row without its trailing cells, and an
+# empty students cell
+PROJ_INFO_VALUES = [
+    ["SIG Name", "Students", "Project Name", "Notes", "Sprint Log Link", "PRC Link", "RRC Link", "Compass Link"],
+    ["Agile Research Studios", "Jane Doe, John Smith ", "Orchestration Scripts", "ignored", "https://sl", "", "",
+     "https://compass"],
+    ["Networked Orchestration", "Alex Smith", " Path ", "", "https://sl2"],
+    ["Networked Orchestration", "", "Unstaffed", "", "", "", "", ""]
+]
+
+
+@pytest.mark.parametrize("values, schema, record_type", [
+    (SIG_INFO_VALUES, SIG_INFO_SCHEMA, SigInfo),
+    (PROJ_INFO_VALUES, PROJ_INFO_SCHEMA, ProjInfo),
+    # columns in a different order, with one missing
+    ([["Project Name", "SIG Name", "Students"], ["Path", "NetOrch", "Alex Smith, Sam Lee"]], PROJ_INFO_SCHEMA,
+     ProjInfo),
+    # a list column that appears twice is combined, and the last of a repeated single value column wins
+    ([["SIG Name", "SIG Heads", "SIG Name", "SIG Heads"], ["First", "Jane Doe", "Second", "John Smith, Sam Lee"]],
+     SIG_INFO_SCHEMA, SigInfo),
+    # a header row and nothing else
+    ([SIG_INFO_VALUES[0]], SIG_INFO_SCHEMA, SigInfo)
+])
+def test_parse_worksheet_matches_baseline(values, schema, record_type):
+    records = studio_db.parse_worksheet(values, schema, record_type)
+
+    assert [record._asdict() for record in records] == parse_rows_like_baseline(values, schema)
+
+
+def test_parse_worksheet_reports_unknown_columns(capsys):
+    studio_db.parse_worksheet(PROJ_INFO_VALUES, PROJ_INFO_SCHEMA, ProjInfo)
+
+    assert "['Notes']" in capsys.readouterr().out
+
+
+def test_create_studio_db_dict_groups_projects_by_sig():
+    studio_db_dict = studio_db.create_studio_db_dict(studio_db.parse_sig_info(SIG_INFO_VALUES[:3]),
+                                                     studio_db.parse_proj_info(PROJ_INFO_VALUES))
+
+    assert list(studio_db_dict) == ["Agile Research Studios", "Networked Orchestration"]
+    assert studio_db_dict["Agile Research Studios"]["students"] == ["Jane Doe", "John Smith"]
+    assert [proj["project_name"] for proj in studio_db_dict["Networked Orchestration"]["projects"]] == \
+        ["Path", "Unstaffed"]